@@ -0,0 +1,14 @@
+"""
+Benchmarks for the time taken to import Tax-Brain in a new process
+"""
+
+
+class Import:
+    def timeraw_import_taxbrain(self):
+        return "import taxbrain"
+
+    def timeraw_import_taxbrain_class(self):
+        return "from taxbrain import TaxBrain"
+
+    def timeraw_import_report(self):
+        return "from taxbrain import report"
@@ -0,0 +1,100 @@
+"""
+Benchmarks for creating reports, running the command line interface end to
+end, and the Compute Studio `run_model` function
+"""
+
+import shutil
+import subprocess
+import sys
+import tempfile
+from taxbrain import figures, report
+from .common import START_YEAR, TIMEOUT, make_taxbrain, warm_up
+
+# Compute Studio inputs for run_model
+ADJUSTMENT = {
+    "policy": {
+        "STD": [{"MARS": "mjoint", "year": START_YEAR, "value": 30000}],
+        "EITC_c": [{"EIC": "0kids", "year": START_YEAR, "value": 1000.0}],
+    },
+    "behavior": {"sub": [{"value": 0.25}]},
+}
+
+
+class Report:
+    params = ["md", "html", "pdf"]
+    param_names = ["format"]
+    timeout = TIMEOUT
+
+    def setup_cache(self):
+        tb = make_taxbrain(3)
+        tb.run()
+        return tb
+
+    def setup(self, tb, format):
+        if format == "pdf" and shutil.which("pandoc") is None:
+            # asv skips benchmarks whose setup raises NotImplementedError
+            raise NotImplementedError("pandoc is not installed")
+
+    def time_report(self, tb, format):
+        self.report(tb, format)
+
+    def peakmem_report(self, tb, format):
+        self.report(tb, format)
+
+    def report(self, tb, format):
+        # start without the tables and figures cached by earlier repeats
+        tb.clear_cache()
+        figures.clear_figure_cache()
+        report(tb, clean=True, formats=[format], num_workers=1)
+
+
+class CommandLine:
+    timeout = TIMEOUT
+    number = 1
+    repeat = (1, 3, 600)
+
+    def setup(self):
+        self.outdir = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.outdir)
+
+    def time_cli(self):
+        # includes starting Python and compiling Tax-Calculator's functions
+        subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "taxbrain.cli",
+                str(START_YEAR),
+                str(START_YEAR + 1),
+                "--data",
+                "CPS",
+                "--outdir",
+                self.outdir,
+                "--name",
+                "benchmark",
+            ],
+            check=True,
+            capture_output=True,
+        )
+
+
+class ComputeStudio:
+    timeout = TIMEOUT
+    number = 1
+    repeat = (1, 3, 600)
+
+    def setup(self):
+        try:
+            from cs_config import functions
+        except ImportError:
+            raise NotImplementedError("cs-config is not installed")
+        self.run_model = functions.run_model
+        warm_up()
+
+    def time_run_model(self):
+        self.run_model({"data_source": "CPS", "year": START_YEAR}, ADJUSTMENT)
+
+    def peakmem_run_model(self):
+        self.run_model({"data_source": "CPS", "year": START_YEAR}, ADJUSTMENT)
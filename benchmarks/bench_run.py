@@ -0,0 +1,104 @@
+"""
+Benchmarks for TaxBrain.run over budget windows of different lengths and on
+synthetic microdata of different sizes
+"""
+
+import time
+from taxbrain import TaxBrain
+from taxbrain.synthetic import synthetic_microdata
+from .common import (
+    BEHAVIOR,
+    REFORM,
+    START_YEAR,
+    TIMEOUT,
+    WINDOWS,
+    make_taxbrain,
+    num_records,
+    warm_up,
+)
+
+
+class StaticRun:
+    params = WINDOWS
+    param_names = ["years"]
+    timeout = TIMEOUT
+    number = 1
+    repeat = (1, 3, 600)
+
+    def setup(self, years):
+        warm_up()
+        self.tb = make_taxbrain(years, **self.options())
+
+    def options(self):
+        return {}
+
+    def time_run(self, years):
+        self.tb.run()
+
+    def peakmem_run(self, years):
+        self.tb.run()
+
+    def track_records_per_second(self, years):
+        start = time.perf_counter()
+        self.tb.run()
+        seconds = time.perf_counter() - start
+        return num_records(self.tb) * years / seconds
+
+    track_records_per_second.unit = "records/s"
+
+
+class DynamicRun(StaticRun):
+    def options(self):
+        return {"behavior": BEHAVIOR}
+
+
+class StackedRun(StaticRun):
+    def options(self):
+        return {"stacked": True}
+
+
+class CorporateIncidenceRun(StaticRun):
+    def options(self):
+        return {"corporate": True}
+
+
+class DynamicCorporateIncidenceRun(StaticRun):
+    params = [WINDOWS[0]]
+
+    def options(self):
+        return {"behavior": BEHAVIOR, "corporate": True}
+
+
+class SyntheticRun:
+    """
+    Static run on synthetic microdata with a multiple of the number of
+    records in the CPS
+    """
+
+    params = [1, 5, 10]
+    param_names = ["scale"]
+    timeout = TIMEOUT
+    number = 1
+    repeat = (1, 3, 600)
+
+    def setup(self, scale):
+        warm_up()
+        self.tb = TaxBrain(
+            START_YEAR,
+            START_YEAR,
+            microdata=synthetic_microdata(scale),
+            reform=REFORM,
+        )
+
+    def time_run(self, scale):
+        self.tb.run()
+
+    def peakmem_run(self, scale):
+        self.tb.run()
+
+    def track_records_per_second(self, scale):
+        start = time.perf_counter()
+        self.tb.run()
+        return num_records(self.tb) / (time.perf_counter() - start)
+
+    track_records_per_second.unit = "records/s"
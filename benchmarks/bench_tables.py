@@ -0,0 +1,77 @@
+"""
+Benchmarks for the TaxBrain table methods and the plots in taxbrain.utils.
+The analysis they use is run once and shared by every benchmark.
+"""
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+from taxbrain import utils
+from .common import START_YEAR, TIMEOUT, make_taxbrain
+
+YEARS = 3
+TABLES = {
+    "weighted_totals": ("combined",),
+    "multi_var_table": (["iitax", "payrolltax", "combined"], "reform"),
+    "distribution_table": (
+        START_YEAR,
+        "weighted_deciles",
+        "expanded_income",
+        "reform",
+    ),
+    "differences_table": (START_YEAR, "weighted_deciles", "combined"),
+    "inequality_table": (),
+}
+PLOTS = {
+    "distribution_plot": (START_YEAR,),
+    "differences_plot": ("combined",),
+    "lorenz_curve": (START_YEAR,),
+    "volcano_plot": (START_YEAR,),
+    "revenue_plot": (),
+}
+
+
+def run_analysis():
+    tb = make_taxbrain(YEARS)
+    tb.run()
+    return tb
+
+
+class Tables:
+    params = list(TABLES)
+    param_names = ["method"]
+    timeout = TIMEOUT
+
+    def setup_cache(self):
+        return run_analysis()
+
+    def time_table(self, tb, method):
+        # tables are cached on the TaxBrain object after the first call
+        tb.clear_cache()
+        getattr(tb, method)(*TABLES[method])
+
+    def peakmem_table(self, tb, method):
+        tb.clear_cache()
+        getattr(tb, method)(*TABLES[method])
+
+
+class Plots:
+    params = list(PLOTS)
+    param_names = ["plot"]
+    timeout = TIMEOUT
+
+    def setup_cache(self):
+        return run_analysis()
+
+    def teardown(self, tb, plot):
+        plt.close("all")
+
+    def time_plot(self, tb, plot):
+        tb.clear_cache()
+        getattr(utils, plot)(tb, *PLOTS[plot])
+
+    def peakmem_plot(self, tb, plot):
+        tb.clear_cache()
+        getattr(utils, plot)(tb, *PLOTS[plot])
@@ -0,0 +1,86 @@
+"""
+Inputs shared by the benchmarks. Every benchmark uses the CPS file that is
+installed with Tax-Calculator, so the suite runs offline.
+"""
+
+from taxbrain import TaxBrain
+
+START_YEAR = 2021
+# numbers of years in the budget windows that are benchmarked
+WINDOWS = [1, 3, 10]
+# seconds a benchmark, including its setup, may take
+TIMEOUT = 1800
+
+REFORM = {
+    "SS_Earnings_thd": {2021: 400000},
+    "FICA_ss_trt_employee": {2022: 0.0625, 2023: 0.065},
+    "STD-indexed": {2021: False},
+}
+BEHAVIOR = {"sub": 0.25, "inc": -0.1}
+STACKED_REFORMS = {
+    "Payroll Threshold Increase": """{"SS_Earnings_thd": {"2021": 400000}}""",
+    "Capital Gains Tax Changes": """{
+        "CG_brk3": {"2021": [1000000, 1000000, 1000000, 1000000, 1000000]},
+        "CG_rt4": {"2021": 0.396}
+    }""",
+}
+# corporate income tax revenue raised in each year
+CORP_REVENUE = 100_000_000_000
+# whether Tax-Calculator's functions have been compiled in this process
+_warm = False
+
+
+def make_taxbrain(
+    years: int = 1,
+    behavior: dict = None,
+    stacked: bool = False,
+    corporate: bool = False,
+):
+    """
+    Create a TaxBrain object for a budget window starting in START_YEAR
+
+    Parameters
+    ----------
+    years: int
+        number of years in the budget window
+    behavior: dict
+        behavioral assumptions for a dynamic run
+    stacked: bool
+        whether to use the stacked reforms
+    corporate: bool
+        whether to distribute corporate income tax revenue to individuals
+
+    Returns
+    -------
+    TaxBrain object
+    """
+    reform = STACKED_REFORMS if stacked else REFORM
+    corp_revenue = [CORP_REVENUE] * years if corporate else None
+    return TaxBrain(
+        START_YEAR,
+        START_YEAR + years - 1,
+        microdata="CPS",
+        reform=reform,
+        behavior=behavior,
+        stacked=stacked,
+        corp_revenue=corp_revenue,
+    )
+
+
+def warm_up():
+    """
+    Run a one year analysis so that the time Tax-Calculator spends
+    compiling its functions isn't counted in the benchmarks. This is only
+    done once in each process.
+    """
+    global _warm
+    if not _warm:
+        make_taxbrain(1).run()
+        _warm = True
+
+
+def num_records(tb) -> int:
+    """
+    Number of records in the results of a run
+    """
+    return len(tb.base_data[tb.start_year])
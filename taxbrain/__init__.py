@@ -1,9 +1,106 @@
-from taxbrain.taxbrain import *
-from taxbrain.utils import *
-from taxbrain.cli import *
-from taxbrain.report import *
-from taxbrain.report_utils import *
+import importlib
+import sys
+import types
 
 __version__ = "2.8.0"
 __min_python3_version__ = 11
 __max_python3_version__ = 13
+
+# Public names and the modules that define them. Each module is imported the
+# first time one of its names is used so that importing Tax-Brain, or
+# starting the CLI, does not load Tax-Calculator, Dask, Matplotlib, or the
+# reporting libraries until they are needed.
+_SUBMODULE_ATTRS = {
+    "taxbrain": ["TaxBrain", "DIST_VARIABLES", "DIFF_VARIABLES"],
+    "utils": [
+        "weighted_sum",
+        "WINNERS_LOSERS_GROUPS",
+        "WINNERS_LOSERS_LABELS",
+        "hash_inputs",
+        "winners_losers_data",
+        "DIFFERENCES_PLOT_VARS",
+        "distribution_plot",
+        "draw_distribution_plot",
+        "differences_plot",
+        "draw_differences_plot",
+        "update_policy",
+        "is_paramtools_format",
+        "lorenz_data",
+        "lorenz_curve",
+        "volcano_plot",
+        "revenue_plot",
+    ],
+    "quantiles": [
+        "LORENZ_BINS",
+        "sort_order",
+        "weighted_percentiles",
+        "lorenz_points",
+        "lorenz_value",
+        "gini",
+        "theil",
+        "top_share",
+        "bottom_share",
+        "palma",
+        "poverty_rate",
+        "poverty_gap",
+        "STATISTICS",
+        "POVERTY_STATISTICS",
+        "distribution_stats",
+        "sorted_data",
+    ],
+    "comparison": ["compare", "compare_frames"],
+    "cli": ["make_tables", "cli_core", "cli_main", "cli_serve"],
+    "report": ["report", "report_many", "areport"],
+    "report_utils": [
+        "PDF_ARGS",
+        "notable_vars",
+        "DIFF_TABLE_ROW_NAMES",
+        "md_to_pdf",
+        "md_to_pdf_bytes",
+        "md_to_html",
+        "data_uri",
+        "convert_table",
+        "policy_table",
+        "write_text",
+        "load_template",
+        "date",
+        "form_intro",
+        "form_baseline_intro",
+        "largest_tax_change",
+        "notable_changes",
+        "behavioral_assumptions",
+        "consumption_assumptions",
+        "growth_assumptions",
+        "convert_params",
+        "dollar_str_formatting",
+    ],
+}
+_ATTR_SUBMODULES = {
+    attr: submodule
+    for submodule, attrs in _SUBMODULE_ATTRS.items()
+    for attr in attrs
+}
+
+
+def __getattr__(name):
+    if name not in _ATTR_SUBMODULES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(f"{__name__}.{_ATTR_SUBMODULES[name]}")
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_ATTR_SUBMODULES))
+
+
+class _Package(types.ModuleType):
+    def __setattr__(self, name, value):
+        # importing the report module must not hide the report function
+        if name == "report" and isinstance(value, types.ModuleType):
+            value = value.report
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
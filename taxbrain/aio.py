@@ -0,0 +1,110 @@
+"""
+Helpers for using Tax-Brain from asyncio applications. Long computations
+run in a separate process that is stopped if the awaiting task is
+cancelled or times out, so the event loop is never blocked. A new process
+is started for each call rather than taken from a pool because a pool's
+workers can't be stopped one at a time, so a cancelled computation would
+keep running until it finished.
+"""
+
+import asyncio
+import inspect
+import multiprocessing
+from taxbrain.jobs import START_METHOD
+
+# seconds between checks for messages from the worker process
+POLL_INTERVAL = 0.05
+
+
+async def run_in_process(
+    func, *args, timeout: float = None, progress=None, **kwargs
+):
+    """
+    Call a function in a new process and wait for its result without
+    blocking the event loop
+
+    Parameters
+    ----------
+    func: function
+        module-level function to call
+    args: positional arguments
+        arguments passed to `func`
+    timeout: float
+        seconds to wait for the result. If the function hasn't finished by
+        then, its process is stopped and TimeoutError is raised
+    progress: function
+        if given, `func` is passed a `progress` argument that sends events
+        back to this process, where `progress` is called with each one. It
+        may be a coroutine function
+    kwargs: keyword arguments
+        additional arguments passed to `func`
+
+    Returns
+    -------
+    value returned by `func`. Exceptions raised by `func` are raised here.
+    """
+    context = multiprocessing.get_context(START_METHOD)
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(
+        target=_call,
+        args=(func, args, kwargs, sender, receiver, progress is not None),
+    )
+    process.start()
+    sender.close()
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+    try:
+        while True:
+            while receiver.poll():
+                try:
+                    kind, value = receiver.recv()
+                except EOFError:
+                    raise RuntimeError(f"{func.__name__} process exited")
+                if kind == "done":
+                    return value
+                if kind == "failed":
+                    raise value
+                result = progress(value)
+                if inspect.isawaitable(result):
+                    await result
+            if not process.is_alive() and not receiver.poll():
+                raise RuntimeError(
+                    f"{func.__name__} process exited with code "
+                    f"{process.exitcode}"
+                )
+            if deadline is not None and loop.time() > deadline:
+                raise TimeoutError(
+                    f"{func.__name__} did not finish in {timeout} seconds"
+                )
+            await asyncio.sleep(POLL_INTERVAL)
+    finally:
+        if process.is_alive():
+            process.terminate()
+        # wait for the process to exit without blocking the event loop
+        while process.is_alive():
+            await asyncio.sleep(POLL_INTERVAL)
+        process.join()
+        receiver.close()
+
+
+def _call(func, args, kwargs, conn, receiver, send_progress):
+    """
+    Call a function and send its progress and result back through a pipe
+    """
+    # close the read end inherited from the parent so that sending fails,
+    # rather than blocking, if the parent process exits
+    receiver.close()
+    try:
+        if send_progress:
+            kwargs["progress"] = lambda event: conn.send(("progress", event))
+        value = func(*args, **kwargs)
+    except BaseException as e:
+        try:
+            conn.send(("failed", e))
+        except Exception:
+            # the exception can't be pickled
+            conn.send(("failed", RuntimeError(repr(e))))
+    else:
+        conn.send(("done", value))
+    finally:
+        conn.close()
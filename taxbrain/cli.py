@@ -3,7 +3,7 @@ Command line interface for the Tax-Brain package
 """
 
 import argparse
-from taxbrain import TaxBrain, report
+import sys
 from pathlib import Path
 from datetime import datetime
 
@@ -86,6 +86,8 @@ def cli_core(
     None
         reports saved to disk at path specified by outdir
     """
+    from taxbrain import TaxBrain, report
+
     tb = TaxBrain(
         start_year=startyear,
         end_year=endyear,
@@ -131,8 +133,12 @@ def cli_main():
     -------
     None
     """
+    if sys.argv[1:2] == ["serve"]:
+        cli_serve(sys.argv[2:])
+        return
     parser_description = (
-        "This is the command line interface for the taxbrain package."
+        "This is the command line interface for the taxbrain package. Use "
+        "`taxbrain serve` to start a scoring server."
     )
     parser = argparse.ArgumentParser(
         prog="taxbrain", description=parser_description
@@ -140,13 +146,11 @@ def cli_main():
     parser.add_argument(
         "startyear",
         help=("startyear is the first year of the analysis you want to run."),
-        default=TaxBrain.FIRST_BUDGET_YEAR,
         type=int,
     )
     parser.add_argument(
         "endyear",
         help=("endyear is the last year of the analysis you want to run."),
-        default=TaxBrain.LAST_BUDGET_YEAR,
         type=int,
     )
     parser.add_argument(
@@ -224,7 +228,6 @@ def cli_main():
         args.startyear,
         args.endyear,
         args.data,
-        args.usecps,
         args.reform,
         args.behavior,
         args.assump,
@@ -232,6 +235,96 @@ def cli_main():
         args.outdir,
         args.name,
         args.report,
+        args.author,
+    )
+
+
+def cli_serve(argv=None):
+    """
+    Command line interface to start a scoring server
+
+    Parameters
+    ----------
+    argv: list
+        command line arguments after `taxbrain serve`
+
+    Returns
+    -------
+    None
+    """
+    from taxbrain.server import serve, MICRODATA, BASELINE_CACHE_SIZE
+
+    parser = argparse.ArgumentParser(
+        prog="taxbrain serve",
+        description=(
+            "Start a scoring server that keeps microdata loaded between "
+            "TaxBrain runs."
+        ),
+    )
+    parser.add_argument(
+        "--host", help="Address to listen on.", default="127.0.0.1"
+    )
+    parser.add_argument(
+        "--port", help="Port to listen on.", default=8000, type=int
+    )
+    parser.add_argument(
+        "--workers",
+        help="Number of jobs to run at once.",
+        default=1,
+        type=int,
+    )
+    parser.add_argument(
+        "--microdata",
+        help="Microdata sources to load before taking jobs.",
+        nargs="*",
+        choices=MICRODATA,
+        default=["CPS"],
+    )
+    parser.add_argument(
+        "--threads",
+        help=(
+            "including --threads will run jobs in threads of the server "
+            "process instead of worker processes."
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--results-dir",
+        help="Directory to save the full results of each job in.",
+        default=None,
+    )
+    parser.add_argument(
+        "--job-ttl",
+        help="Seconds to keep the results of a finished job.",
+        default=3600,
+        type=float,
+    )
+    parser.add_argument(
+        "--max-jobs",
+        help="Maximum number of finished jobs to keep.",
+        default=1000,
+        type=int,
+    )
+    parser.add_argument(
+        "--baseline-cache-size",
+        help=(
+            "Years of baseline results each worker keeps for later static "
+            "jobs. A year of CPS results takes about 51 MB."
+        ),
+        default=BASELINE_CACHE_SIZE,
+        type=int,
+    )
+    args = parser.parse_args(argv)
+    serve(
+        args.host,
+        args.port,
+        args.workers,
+        args.microdata,
+        not args.threads,
+        args.results_dir,
+        args.job_ttl,
+        args.max_jobs,
+        args.baseline_cache_size,
     )
 
 
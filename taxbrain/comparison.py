@@ -0,0 +1,181 @@
+"""
+Functions for comparing the results of two TaxBrain runs record by record
+"""
+
+import numpy as np
+import pandas as pd
+from taxbrain.storage import YearPartitions
+
+
+def compare(
+    tb_a,
+    tb_b,
+    variables: list = None,
+    years: list = None,
+    top_k: int = 10,
+) -> dict:
+    """
+    Compare the results of two TaxBrain runs. Records are aligned by their
+    index and the baseline and reform data are compared one year at a time
+    so that only a single year of each run needs to be in memory. Years
+    loaded from saved results are released once they have been compared.
+
+    Parameters
+    ----------
+    tb_a: TaxBrain object
+        first set of results
+    tb_b: TaxBrain object
+        second set of results, compared against the first
+    variables: list
+        variables to compare. Defaults to every variable in both runs
+    years: list
+        years to compare. Defaults to every year in both runs
+    top_k: int
+        number of records with the largest absolute difference to report
+        for each variable, year, and calculator
+
+    Returns
+    -------
+    results: dict
+        'summary': DataFrame indexed by calculator, year, and variable
+        with the maximum absolute and relative differences, number of
+        records that changed, and weighted totals in each run.
+        'records': DataFrame with the records that changed the most.
+        'unmatched': DataFrame with the number of records found in only
+        one of the runs for each calculator and year.
+    """
+    if not (tb_a.has_run and tb_b.has_run):
+        raise ValueError("Both TaxBrain objects must be run before comparing")
+    if years is None:
+        start_year = max(tb_a.start_year, tb_b.start_year)
+        end_year = min(tb_a.end_year, tb_b.end_year)
+        years = range(start_year, end_year + 1)
+    summaries = []
+    records = []
+    unmatched = {}
+    for calc in ["base", "reform"]:
+        data_a = getattr(tb_a, f"{calc}_data")
+        data_b = getattr(tb_b, f"{calc}_data")
+        for year in years:
+            release_a = _should_release(data_a, year)
+            release_b = _should_release(data_b, year)
+            summary, top, n_unmatched = compare_frames(
+                data_a[year], data_b[year], variables, top_k
+            )
+            if release_a:
+                data_a.release(year)
+            if release_b:
+                data_b.release(year)
+            summaries.append(summary.assign(calc=calc, year=year))
+            records.append(top.assign(calc=calc, year=year))
+            unmatched[(calc, year)] = n_unmatched
+    summary = pd.concat(summaries).set_index(["calc", "year", "variable"])
+    records = pd.concat(records, ignore_index=True)
+    records = records[
+        ["calc", "year", "variable", "record", "a", "b", "abs_diff"]
+    ]
+    unmatched = pd.DataFrame.from_dict(
+        unmatched, orient="index", columns=["only_a", "only_b"]
+    )
+    unmatched.index = pd.MultiIndex.from_tuples(
+        unmatched.index, names=["calc", "year"]
+    )
+    return {"summary": summary, "records": records, "unmatched": unmatched}
+
+
+def compare_frames(df_a, df_b, variables: list = None, top_k: int = 10):
+    """
+    Compare one year of data from two runs
+
+    Parameters
+    ----------
+    df_a: Pandas DataFrame
+        data from the first run
+    df_b: Pandas DataFrame
+        data from the second run
+    variables: list
+        variables to compare. Defaults to every variable in both frames
+    top_k: int
+        number of records with the largest absolute difference to report
+        for each variable
+
+    Returns
+    -------
+    summary: Pandas DataFrame
+        maximum absolute and relative differences, number of records
+        that changed, and weighted totals for each variable
+    records: Pandas DataFrame
+        records with the largest absolute difference in each variable
+    unmatched: tuple
+        number of records only in the first and only in the second frame
+    """
+    if variables is None:
+        variables = [col for col in df_a.columns if col in df_b.columns]
+    missing = set(variables) - (set(df_a.columns) & set(df_b.columns))
+    if missing:
+        raise ValueError(f"Variable(s) {missing} not found in both runs")
+    # weighted totals use every record in each run
+    total_a = df_a["s006"].to_numpy() @ df_a[variables].to_numpy(float)
+    total_b = df_b["s006"].to_numpy() @ df_b[variables].to_numpy(float)
+    if df_a.index.equals(df_b.index):
+        index = df_a.index
+        values_a = df_a[variables].to_numpy(float)
+        values_b = df_b[variables].to_numpy(float)
+        unmatched = (0, 0)
+    else:
+        index = df_a.index.intersection(df_b.index, sort=False)
+        values_a = df_a.loc[index, variables].to_numpy(float)
+        values_b = df_b.loc[index, variables].to_numpy(float)
+        unmatched = (len(df_a) - len(index), len(df_b) - len(index))
+    abs_diff = np.abs(values_b - values_a)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rel_diff = abs_diff / np.abs(values_a)
+    # records that are zero in both runs haven't changed
+    rel_diff[abs_diff == 0] = 0
+    changed = abs_diff > 0
+    summary = pd.DataFrame(
+        {
+            "variable": variables,
+            "max_abs_diff": abs_diff.max(axis=0, initial=0),
+            "max_rel_diff": rel_diff.max(axis=0, initial=0),
+            "n_changed": changed.sum(axis=0),
+            "weighted_total_a": total_a,
+            "weighted_total_b": total_b,
+            "weighted_delta": total_b - total_a,
+        }
+    )
+    top = []
+    k = min(top_k, len(index))
+    for i, var in enumerate(variables):
+        n_changed = summary["n_changed"].iat[i]
+        if n_changed == 0 or k == 0:
+            continue
+        var_k = min(k, n_changed)
+        idx = np.argpartition(abs_diff[:, i], -var_k)[-var_k:]
+        idx = idx[np.argsort(abs_diff[idx, i])[::-1]]
+        top.append(
+            pd.DataFrame(
+                {
+                    "variable": var,
+                    "record": index[idx],
+                    "a": values_a[idx, i],
+                    "b": values_b[idx, i],
+                    "abs_diff": abs_diff[idx, i],
+                }
+            )
+        )
+    if top:
+        records = pd.concat(top, ignore_index=True)
+    else:
+        records = pd.DataFrame(
+            columns=["variable", "record", "a", "b", "abs_diff"]
+        )
+    return summary, records, unmatched
+
+
+def _should_release(data, year) -> bool:
+    """
+    Whether a year should be released from memory once it has been
+    compared. Only years read from disk for the comparison are released.
+    """
+    return isinstance(data, YearPartitions) and not data.is_loaded(year)
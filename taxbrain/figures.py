@@ -0,0 +1,216 @@
+"""
+Functions for rendering figures to image bytes concurrently, with a cache
+keyed by the data and options used to draw each figure
+"""
+
+import io
+import os
+import matplotlib
+import matplotlib.pyplot as plt
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from taxbrain.timing import stage, worker_options, worker_call, worker_result
+from taxbrain.utils import hash_inputs
+
+# number of rendered figures kept in memory by each process
+MEMORY_CACHE_SIZE = 32
+_memory_cache = OrderedDict()
+
+
+def figure_spec(draw, data, **options) -> dict:
+    """
+    Describe a figure to render with `render_figures`
+
+    Parameters
+    ----------
+    draw: function
+        module-level function that takes the data and options and returns
+        a Matplotlib figure
+    data: Pandas DataFrame
+        data used to draw the figure
+    options: keyword arguments
+        additional arguments passed to `draw`
+
+    Returns
+    -------
+    dict
+        specification of the figure
+    """
+    return {"draw": draw, "data": data, "options": options}
+
+
+def figure_key(spec: dict, dpi: int, format: str) -> str:
+    """
+    Hash the function, data, and options used to draw a figure along with
+    the resolution and image format it is rendered in
+
+    Parameters
+    ----------
+    spec: dict
+        figure specification created by `figure_spec`
+    dpi: int
+        resolution of the image in dots per inch
+    format: str
+        image format
+
+    Returns
+    -------
+    str
+        key identifying the rendered figure
+    """
+    draw = spec["draw"]
+    inputs = {
+        "draw": f"{draw.__module__}.{draw.__qualname__}",
+        "data": spec["data"],
+        "options": spec["options"],
+        "dpi": dpi,
+        "format": format,
+        "matplotlib": matplotlib.__version__,
+    }
+    return hash_inputs(inputs)
+
+
+def render_figure(spec: dict, dpi: int = 1200, format: str = "png") -> bytes:
+    """
+    Draw a figure and save it to bytes
+
+    Parameters
+    ----------
+    spec: dict
+        figure specification created by `figure_spec`
+    dpi: int
+        resolution of the image in dots per inch
+    format: str
+        image format. Any format supported by Matplotlib
+
+    Returns
+    -------
+    bytes
+        rendered image
+    """
+    with stage("render_figure", figure=spec["draw"].__name__):
+        fig = spec["draw"](spec["data"], **spec["options"])
+        buffer = io.BytesIO()
+        try:
+            fig.savefig(buffer, format=format, dpi=dpi, bbox_inches="tight")
+        finally:
+            plt.close(fig)
+    return buffer.getvalue()
+
+
+def render_figures(
+    specs: dict,
+    dpi: int = 1200,
+    format: str = "png",
+    num_workers: int = None,
+    cache_dir=None,
+) -> dict:
+    """
+    Render a set of figures. Figures that were already rendered with the
+    same data and options are taken from the cache and the rest are drawn
+    concurrently in separate processes.
+
+    Parameters
+    ----------
+    specs: dict
+        figure specifications created by `figure_spec`, keyed by name
+    dpi: int
+        resolution of the images in dots per inch
+    format: str
+        image format. Any format supported by Matplotlib
+    num_workers: int
+        number of processes used to draw figures. If 1, figures are drawn
+        in the current process. If None, one process is used per figure,
+        up to the number of CPUs
+    cache_dir: str or Path
+        directory to cache rendered figures in so that they can be reused
+        by other processes. Figures are always cached in memory
+
+    Returns
+    -------
+    figures: dict
+        rendered image bytes keyed by the names in `specs`
+    """
+    keys = {
+        name: figure_key(spec, dpi, format) for name, spec in specs.items()
+    }
+    figures = {}
+    missing = []
+    for name, key in keys.items():
+        image = _cache_get(key, cache_dir)
+        if image is None:
+            missing.append(name)
+        else:
+            figures[name] = image
+    if num_workers is None:
+        num_workers = min(len(missing), os.cpu_count() or 1)
+    if len(missing) > 1 and num_workers > 1:
+        options = worker_options()
+        with ProcessPoolExecutor(max_workers=num_workers) as pool:
+            futures = {
+                name: pool.submit(
+                    worker_call,
+                    options,
+                    render_figure,
+                    specs[name],
+                    dpi,
+                    format,
+                )
+                for name in missing
+            }
+            rendered = {
+                name: worker_result(fut.result())
+                for name, fut in futures.items()
+            }
+    else:
+        rendered = {
+            name: render_figure(specs[name], dpi, format) for name in missing
+        }
+    for name, image in rendered.items():
+        _cache_set(keys[name], image, cache_dir)
+        figures[name] = image
+    return figures
+
+
+def clear_figure_cache():
+    """
+    Remove every figure from the in-memory cache
+    """
+    _memory_cache.clear()
+
+
+def _cache_get(key, cache_dir):
+    """
+    Look up a rendered figure in memory and then in the cache directory
+    """
+    if key in _memory_cache:
+        _memory_cache.move_to_end(key)
+        return _memory_cache[key]
+    if cache_dir is not None:
+        path = Path(cache_dir, key)
+        if path.exists():
+            image = path.read_bytes()
+            _memory_set(key, image)
+            return image
+    return None
+
+
+def _cache_set(key, image, cache_dir):
+    """
+    Save a rendered figure in memory and in the cache directory
+    """
+    _memory_set(key, image)
+    if cache_dir is not None:
+        path = Path(cache_dir, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{key}.tmp")
+        tmp_path.write_bytes(image)
+        os.replace(tmp_path, path)
+
+
+def _memory_set(key, image):
+    _memory_cache[key] = image
+    _memory_cache.move_to_end(key)
+    while len(_memory_cache) > MEMORY_CACHE_SIZE:
+        _memory_cache.popitem(last=False)
@@ -0,0 +1,417 @@
+"""
+Job scheduler for TaxBrain runs. Jobs are kept in a local SQLite queue so
+that they survive restarts, run in priority order subject to a concurrency
+limit for each priority class and an overall limit, and identical jobs that are already queued
+or running are only run once.
+"""
+
+import json
+import multiprocessing
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from taxbrain.utils import hash_inputs
+
+# priority classes, from highest to lowest priority, and the number of jobs
+# in each that may run at once
+DEFAULT_LIMITS = {"interactive": 2, "batch": 1}
+# statuses of jobs that are queued or running
+IN_FLIGHT = ("pending", "running")
+# forked job processes start with the modules, records, and compiled
+# functions already loaded by the scheduler's process
+START_METHOD = (
+    "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    input_hash TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    status TEXT NOT NULL,
+    job TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    submitted TEXT NOT NULL,
+    started TEXT,
+    finished TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, submitted);
+CREATE INDEX IF NOT EXISTS jobs_input_hash ON jobs (input_hash, status);
+"""
+
+
+class JobScheduler:
+    """
+    Queue of scoring jobs run in separate processes
+    """
+
+    def __init__(
+        self,
+        path="taxbrain_jobs.db",
+        limits: dict = DEFAULT_LIMITS,
+        runner=None,
+        poll_interval: float = 0.1,
+        max_workers: int = None,
+    ):
+        """
+        Parameters
+        ----------
+        path: str or Path
+            location of the queue's database file. It will be created if it
+            doesn't exist. Jobs that were queued or running when a previous
+            scheduler stopped are run again
+        limits: dict
+            number of jobs that may run at once in each priority class.
+            Classes are listed from highest to lowest priority
+        runner: function
+            module-level function that takes a job and returns its results
+            as a JSON serializable dict. Defaults to
+            `taxbrain.server.run_job`, in which case jobs are checked with
+            `taxbrain.server.validate_job` when they are submitted
+        poll_interval: float
+            seconds between checks for finished jobs and free slots
+        max_workers: int
+            number of jobs that may run at once in all classes together.
+            Free slots go to higher priority classes first, so lower
+            priority jobs only start when higher priority jobs that can
+            run have been started. Defaults to the largest class limit
+
+        Returns
+        -------
+        None
+        """
+        if not limits or min(limits.values()) < 1:
+            raise ValueError("Each priority class must allow at least 1 job")
+        if max_workers is None:
+            max_workers = max(limits.values())
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if runner is None:
+            from taxbrain.server import run_job, validate_job
+
+            runner = run_job
+            self._validate = validate_job
+        else:
+            self._validate = dict
+        self.path = path
+        self.limits = dict(limits)
+        self.max_workers = max_workers
+        self.runner = runner
+        self.poll_interval = poll_interval
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        # processes of running jobs and the pipes their results arrive on
+        self._running = {}
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET status = 'pending', started = NULL "
+                "WHERE status = 'running'"
+            )
+        self._stop = threading.Event()
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Stop the scheduler. Running jobs are stopped and will be run again
+        by the next scheduler that opens the queue.
+        """
+        self._stop.set()
+        self._dispatcher.join()
+        for process, _ in self._running.values():
+            process.terminate()
+            process.join()
+        self._running = {}
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET status = 'pending', started = NULL "
+                "WHERE status = 'running'"
+            )
+        self.conn.close()
+
+    def submit(self, job: dict, priority: str = None) -> str:
+        """
+        Add a job to the queue. If an identical job is already queued or
+        running, its ID is returned instead of adding a new job.
+
+        Parameters
+        ----------
+        job: dict
+            job passed to the runner
+        priority: str
+            priority class of the job. Defaults to the lowest priority class
+
+        Returns
+        -------
+        job_id: str
+            ID used to look up the job
+        """
+        if priority is None:
+            priority = list(self.limits)[-1]
+        if priority not in self.limits:
+            raise ValueError(
+                f"priority must be one of {list(self.limits)}, not {priority}"
+            )
+        job = self._validate(job)
+        from taxbrain import __version__
+
+        input_hash = hash_inputs(
+            {
+                "job": job,
+                "runner": f"{self.runner.__module__}.{self.runner.__name__}",
+                "taxbrain": __version__,
+            }
+        )
+        with self._lock, self.conn:
+            row = self.conn.execute(
+                "SELECT job_id FROM jobs WHERE input_hash = ? AND status IN "
+                f"{IN_FLIGHT}",
+                (input_hash,),
+            ).fetchone()
+            if row is not None:
+                return row[0]
+            job_id = uuid.uuid4().hex
+            self.conn.execute(
+                "INSERT INTO jobs (job_id, input_hash, priority, status, job, "
+                "submitted) VALUES (?, ?, ?, 'pending', ?, ?)",
+                (job_id, input_hash, priority, json.dumps(job), _now()),
+            )
+        return job_id
+
+    def status(self, job_id: str) -> dict:
+        """
+        Status of a job
+
+        Parameters
+        ----------
+        job_id: str
+            ID returned by `submit`
+
+        Returns
+        -------
+        status: dict
+            "id", "priority", "status" (one of "pending", "running", "done",
+            "failed", or "cancelled"), the times the job was submitted,
+            started, and finished, and its error if it failed
+        """
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT job_id, priority, status, submitted, started, "
+                "finished, error FROM jobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            raise KeyError(f"Unknown job {job_id}")
+        keys = [
+            "id",
+            "priority",
+            "status",
+            "submitted",
+            "started",
+            "finished",
+            "error",
+        ]
+        return dict(zip(keys, row))
+
+    def result(self, job_id: str, timeout: float = None) -> dict:
+        """
+        Wait for a job to finish and return its results
+
+        Parameters
+        ----------
+        job_id: str
+            ID returned by `submit`
+        timeout: float
+            seconds to wait. If None, wait until the job finishes
+
+        Returns
+        -------
+        result: dict
+            results returned by the runner
+        """
+        start = time.monotonic()
+        while True:
+            status = self.status(job_id)["status"]
+            if status not in IN_FLIGHT:
+                break
+            if timeout is not None and time.monotonic() - start > timeout:
+                raise TimeoutError(f"Job {job_id} is still {status}")
+            time.sleep(self.poll_interval)
+        with self._lock:
+            result, error = self.conn.execute(
+                "SELECT result, error FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if status == "cancelled":
+            raise RuntimeError(f"Job {job_id} was cancelled")
+        if status == "failed":
+            raise RuntimeError(f"Job {job_id} failed: {error}")
+        return json.loads(result)
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a job. Queued jobs are removed from the queue and running
+        jobs are stopped.
+
+        Parameters
+        ----------
+        job_id: str
+            ID returned by `submit`
+
+        Returns
+        -------
+        bool
+            whether the job was cancelled. Jobs that have already finished
+            can't be cancelled
+        """
+        self.status(job_id)
+        with self._lock, self.conn:
+            cancelled = self.conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ? "
+                f"WHERE job_id = ? AND status IN {IN_FLIGHT}",
+                (_now(), job_id),
+            ).rowcount
+            if job_id in self._running:
+                process, _ = self._running.pop(job_id)
+                process.terminate()
+                process.join()
+        return bool(cancelled)
+
+    def jobs(self, status: str = None) -> list:
+        """
+        Status of every job in the queue
+
+        Parameters
+        ----------
+        status: str
+            only include jobs with this status
+
+        Returns
+        -------
+        list
+            status of each job, as returned by `status`, in the order they
+            were submitted
+        """
+        query = "SELECT job_id FROM jobs"
+        args = ()
+        if status is not None:
+            query += " WHERE status = ?"
+            args = (status,)
+        with self._lock:
+            rows = self.conn.execute(
+                query + " ORDER BY submitted, rowid", args
+            ).fetchall()
+        return [self.status(row[0]) for row in rows]
+
+    def _dispatch(self):
+        """
+        Collect finished jobs and start queued jobs in free slots until the
+        scheduler is closed
+        """
+        while not self._stop.is_set():
+            with self._lock:
+                self._collect()
+                self._start_jobs()
+            self._stop.wait(self.poll_interval)
+
+    def _collect(self):
+        """
+        Save the results of finished jobs
+        """
+        for job_id, (process, conn) in list(self._running.items()):
+            # check whether the process has exited before checking for its
+            # result, so that a result sent just before it exited is found
+            exited = not process.is_alive()
+            if conn.poll():
+                try:
+                    status, value = conn.recv()
+                except EOFError:
+                    status, value = "failed", "Job process exited"
+            elif exited:
+                status = "failed"
+                value = f"Job process exited with code {process.exitcode}"
+            else:
+                continue
+            process.join()
+            conn.close()
+            del self._running[job_id]
+            with self.conn:
+                self.conn.execute(
+                    "UPDATE jobs SET status = ?, result = ?, error = ?, "
+                    "finished = ? WHERE job_id = ? AND status = 'running'",
+                    (
+                        status,
+                        json.dumps(value) if status == "done" else None,
+                        value if status == "failed" else None,
+                        _now(),
+                        job_id,
+                    ),
+                )
+
+    def _start_jobs(self):
+        """
+        Start the highest priority queued jobs that fit within the limits
+        """
+        counts = dict(
+            self.conn.execute(
+                "SELECT priority, COUNT(*) FROM jobs WHERE status = 'running' "
+                "GROUP BY priority"
+            ).fetchall()
+        )
+        total_free = self.max_workers - sum(counts.values())
+        for priority, limit in self.limits.items():
+            free = min(limit - counts.get(priority, 0), total_free)
+            if free < 1:
+                continue
+            rows = self.conn.execute(
+                "SELECT job_id, job FROM jobs WHERE status = 'pending' AND "
+                "priority = ? ORDER BY submitted, rowid LIMIT ?",
+                (priority, free),
+            ).fetchall()
+            for job_id, job in rows:
+                self._start_job(job_id, json.loads(job))
+            total_free -= len(rows)
+
+    def _start_job(self, job_id, job):
+        """
+        Run a job in a new process
+        """
+        context = multiprocessing.get_context(START_METHOD)
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_run, args=(self.runner, job, sender))
+        process.start()
+        sender.close()
+        self._running[job_id] = (process, receiver)
+        with self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET status = 'running', started = ? "
+                "WHERE job_id = ?",
+                (_now(), job_id),
+            )
+
+
+def _run(runner, job, conn):
+    """
+    Run a job and send its results or error back to the scheduler
+    """
+    try:
+        conn.send(("done", runner(job)))
+    except Exception as e:
+        conn.send(("failed", repr(e)))
+    finally:
+        conn.close()
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
@@ -0,0 +1,131 @@
+"""
+Index of Tax-Calculator policy parameter metadata and current law values
+used to describe reforms in reports without creating a Policy object
+"""
+
+import json
+import os
+import numpy as np
+import taxcalc as tc
+from functools import lru_cache
+from pathlib import Path
+from types import MappingProxyType
+
+# environment variable naming a directory to cache the index in
+CACHE_DIR_VARIABLE = "TAXBRAIN_CACHE_DIR"
+# value keys used for parameters that vary by filing status, etc.
+VI_NAMES = ["MARS", "idedtype", "EIC"]
+# NumPy types for each Tax-Calculator parameter type
+PARAM_TYPES = {"float": float, "int": int, "bool": bool}
+
+
+def policy_metadata(cache_dir=None) -> dict:
+    """
+    Index of the metadata and current law value in each year of every
+    policy parameter. The index is built once per process for each
+    version of Tax-Calculator. If a cache directory is given, or named by
+    the TAXBRAIN_CACHE_DIR environment variable, the index is also saved
+    there and read back by other processes. The index is shared by every
+    caller, so it is returned as a read-only mapping.
+
+    Parameters
+    ----------
+    cache_dir: str or Path
+        directory to cache the index in
+
+    Returns
+    -------
+    index: mapping
+        for each parameter, its title, sections, type, whether it is
+        indexed, the name of the variable its values vary by (if any) and
+        the labels of that variable, and its current law value in each year
+    """
+    if cache_dir is None:
+        cache_dir = os.environ.get(CACHE_DIR_VARIABLE)
+    if cache_dir is not None:
+        cache_dir = str(Path(cache_dir).resolve())
+    return _policy_metadata(tc.__version__, cache_dir)
+
+
+def param_default(param: str, year: int) -> np.ndarray:
+    """
+    Current law value of a policy parameter in a given year, in the same
+    form as the parameter's attribute on a Policy object set to that year
+
+    Parameters
+    ----------
+    param: str
+        name of the parameter
+    year: int
+        year of the value
+
+    Returns
+    -------
+    Numpy array
+        current law value
+    """
+    meta = policy_metadata()[param]
+    value = meta["values"][str(year)]
+    return np.array([value], dtype=PARAM_TYPES[meta["type"]])
+
+
+@lru_cache(maxsize=None)
+def _policy_metadata(taxcalc_version: str, cache_dir: str) -> MappingProxyType:
+    """
+    Read the index from the cache or build it
+    """
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = Path(cache_dir, f"policy_metadata-{taxcalc_version}.json")
+        if cache_path.exists():
+            return _freeze(json.loads(cache_path.read_text()))
+    index = _build_index()
+    if cache_path is not None:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_name(f".{cache_path.name}.{os.getpid()}")
+        tmp_path.write_text(json.dumps(index))
+        os.replace(tmp_path, cache_path)
+    return _freeze(index)
+
+
+def _freeze(value):
+    """
+    Read-only copy of the index, with dictionaries wrapped in mapping
+    proxies and lists converted to tuples
+    """
+    if isinstance(value, dict):
+        return MappingProxyType(
+            {key: _freeze(val) for key, val in value.items()}
+        )
+    elif isinstance(value, list):
+        return tuple(_freeze(val) for val in value)
+    return value
+
+
+def _build_index() -> dict:
+    """
+    Build the index from a current law Policy object
+    """
+    pol = tc.Policy()
+    years = range(pol.JSON_START_YEAR, pol.LAST_BUDGET_YEAR + 1)
+    index = {}
+    for param, meta in pol.metadata().items():
+        values = getattr(pol, f"_{param}")
+        vi_name = None
+        for vi in VI_NAMES:
+            if vi in meta["value"][0]:
+                vi_name = vi
+                break
+        index[param] = {
+            "title": meta["title"],
+            "section_1": meta["section_1"],
+            "section_2": meta["section_2"],
+            "type": meta["type"],
+            "indexed": meta["indexed"],
+            "vi_name": vi_name,
+            "vi_labels": pol.label_grid.get(vi_name),
+            "values": {
+                str(year): values[i].tolist() for i, year in enumerate(years)
+            },
+        }
+    return index
@@ -0,0 +1,137 @@
+"""
+Progress events for TaxBrain runs. A run is split into tasks, one for each
+year and calculator, or for each year and provision of a stacked reform,
+and an event is sent when each task starts and finishes.
+"""
+
+import time
+from contextlib import contextmanager
+
+
+class ProgressTracker:
+    """
+    Send events with the elapsed time and an estimate of the time remaining
+    as the tasks in a run start and finish
+    """
+
+    def __init__(self, callback=None, total: int = 0):
+        """
+        Parameters
+        ----------
+        callback: function
+            called with each event. If None, no events are sent
+        total: int
+            number of tasks in the run
+
+        Returns
+        -------
+        None
+        """
+        self.callback = callback
+        self.total = total
+        self.completed = 0
+        # time taken by each task that was run
+        self.durations = []
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def task(self, **fields):
+        """
+        Send "start" and "finish" events around a task, or an "error" event
+        if it raises an exception
+
+        Parameters
+        ----------
+        fields: keyword arguments
+            fields identifying the task, such as "year", "side", and
+            "provision", that are included in each event
+
+        Returns
+        -------
+        None
+        """
+        self._send("start", fields)
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self._send("error", fields)
+            raise
+        self.durations.append(time.perf_counter() - start)
+        self.completed += 1
+        self._send("finish", fields, duration=self.durations[-1])
+
+    def skip(self, **fields):
+        """
+        Send a "skip" event for a task that didn't need to be run, such as
+        a year read from a checkpoint
+
+        Parameters
+        ----------
+        fields: keyword arguments
+            fields identifying the task
+
+        Returns
+        -------
+        None
+        """
+        self.completed += 1
+        self._send("skip", fields)
+
+    def eta(self) -> float:
+        """
+        Estimate of the seconds until the run finishes, based on the
+        average time taken by the tasks run so far
+
+        Returns
+        -------
+        float
+            seconds remaining, or None before any task has finished
+        """
+        if not self.durations:
+            return None
+        mean = sum(self.durations) / len(self.durations)
+        return mean * (self.total - self.completed)
+
+    def _send(self, event, fields, **extra):
+        if self.callback is None:
+            return
+        self.callback(
+            {
+                "event": event,
+                **fields,
+                **extra,
+                "completed": self.completed,
+                "total": self.total,
+                "elapsed": time.perf_counter() - self._start,
+                "eta": self.eta(),
+            }
+        )
+
+
+def print_progress(event: dict):
+    """
+    Progress callback that prints a line for each finished or skipped task
+
+    Parameters
+    ----------
+    event: dict
+        progress event
+
+    Returns
+    -------
+    None
+    """
+    verbs = {"finish": "finished", "skip": "skipped"}
+    if event["event"] not in verbs:
+        return
+    task = " ".join(
+        str(event[key])
+        for key in ["provision", "side", "year"]
+        if key in event
+    )
+    eta = "" if event["eta"] is None else f", about {event['eta']:.0f}s left"
+    print(
+        f"[{event['completed']}/{event['total']}] {task} "
+        f"{verbs[event['event']]} after {event['elapsed']:.1f}s{eta}"
+    )
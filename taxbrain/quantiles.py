@@ -0,0 +1,436 @@
+"""
+Weighted quantile engine used for Lorenz curves and inequality statistics
+"""
+
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+# number of equal-population bins used for Lorenz curves
+LORENZ_BINS = 100
+
+
+def sort_order(tb, year: int, var: str, calc: str = "base") -> np.ndarray:
+    """
+    Return the permutation that sorts a variable in ascending order. The
+    permutation is cached on the TaxBrain object so that every caller
+    working with the same year, variable, and calculator shares one sort.
+
+    Parameters
+    ----------
+    tb: TaxBrain object
+        TaxBrain object for analysis
+    year: int
+        year of data to use
+    var: str
+        name of the variable to sort on
+    calc: str
+        which calculator's data to sort, 'base' or 'reform'
+
+    Returns
+    -------
+    order: Numpy array
+        indices that sort the variable in ascending order
+    """
+    calc = calc.lower()
+    key = (year, var, calc)
+    if key not in tb._sort_orders:
+        data = _calc_data(tb, year, calc)
+        tb._sort_orders[key] = np.argsort(data[var].to_numpy(), kind="stable")
+    return tb._sort_orders[key]
+
+
+def weighted_percentiles(values, weights, percentiles) -> np.ndarray:
+    """
+    Find weighted percentiles of data that is already sorted in ascending
+    order
+
+    Parameters
+    ----------
+    values: Numpy array
+        sorted values
+    weights: Numpy array
+        weights that line up with values
+    percentiles: float or list
+        percentile(s) to find, expressed between 0 and 100
+
+    Returns
+    -------
+    Numpy array
+        value at each percentile
+    """
+    cum_weight = np.cumsum(weights)
+    targets = np.asarray(percentiles, dtype=float) / 100 * cum_weight[-1]
+    idx = np.searchsorted(cum_weight, targets, side="left")
+    return values[np.clip(idx, 0, len(values) - 1)]
+
+
+def lorenz_points(values, weights, bins: int = LORENZ_BINS):
+    """
+    Compute the points on a Lorenz curve for data that is already sorted.
+    Records are split into bins that each hold an equal share of the
+    population and the cumulative share of the total held by each bin is
+    returned. Bins with a negative total are counted as zero.
+
+    Parameters
+    ----------
+    values: Numpy array
+        values sorted by the ranking variable
+    weights: Numpy array
+        weights that line up with values
+    bins: int
+        number of equal-population bins
+
+    Returns
+    -------
+    population: Numpy array
+        cumulative population share at the top of each bin
+    share: Numpy array
+        cumulative share of the total at the top of each bin
+    """
+    total_weight = weights.sum()
+    weighted_values = values * weights
+    percentile = np.cumsum(weights) / total_weight
+    edges = np.linspace(0, 1, bins + 1)
+    # bins are closed on the right, matching pd.cut
+    idx = np.searchsorted(edges, percentile, side="left") - 1
+    valid = (idx >= 0) & (idx < bins)
+    bin_totals = np.bincount(
+        idx[valid], weights=weighted_values[valid], minlength=bins
+    )
+    bin_pop = np.bincount(idx[valid], weights=weights[valid], minlength=bins)
+    bin_totals = np.where(bin_totals < 0, 0, bin_totals)
+    population = bin_pop.cumsum() / total_weight
+    share = bin_totals.cumsum() / weighted_values.sum()
+    return population, share
+
+
+def lorenz_value(values, weights, population_share) -> float:
+    """
+    Share of the total held by the bottom `population_share` of the
+    population, interpolating within the record at the boundary
+
+    Parameters
+    ----------
+    values: Numpy array
+        sorted values
+    weights: Numpy array
+        weights that line up with values
+    population_share: float
+        population share, between 0 and 1
+
+    Returns
+    -------
+    float
+        cumulative share of the total
+    """
+    weighted_values = values * weights
+    population = np.concatenate(([0.0], np.cumsum(weights) / weights.sum()))
+    share = np.concatenate(
+        ([0.0], np.cumsum(weighted_values) / weighted_values.sum())
+    )
+    return float(np.interp(population_share, population, share))
+
+
+def gini(values, weights) -> float:
+    """
+    Weighted Gini coefficient of data that is already sorted
+
+    Parameters
+    ----------
+    values: Numpy array
+        sorted values
+    weights: Numpy array
+        weights that line up with values
+
+    Returns
+    -------
+    float
+        Gini coefficient
+    """
+    weighted_values = values * weights
+    cum_values = np.cumsum(weighted_values)
+    # area under the Lorenz curve using the trapezoid rule
+    area = (weights * (2 * cum_values - weighted_values)).sum()
+    return float(1 - area / (weights.sum() * cum_values[-1]))
+
+
+def theil(values, weights) -> float:
+    """
+    Weighted Theil T index. Only positive values are included.
+
+    Parameters
+    ----------
+    values: Numpy array
+        values
+    weights: Numpy array
+        weights that line up with values
+
+    Returns
+    -------
+    float
+        Theil T index
+    """
+    positive = values > 0
+    values = values[positive]
+    weights = weights[positive]
+    ratio = values / np.average(values, weights=weights)
+    return float((weights * ratio * np.log(ratio)).sum() / weights.sum())
+
+
+def top_share(values, weights, share: float = 0.01) -> float:
+    """
+    Share of the total held by the top `share` of the population
+
+    Parameters
+    ----------
+    values: Numpy array
+        sorted values
+    weights: Numpy array
+        weights that line up with values
+    share: float
+        population share at the top of the distribution
+
+    Returns
+    -------
+    float
+        share of the total
+    """
+    return 1 - lorenz_value(values, weights, 1 - share)
+
+
+def bottom_share(values, weights, share: float = 0.4) -> float:
+    """
+    Share of the total held by the bottom `share` of the population
+
+    Parameters
+    ----------
+    values: Numpy array
+        sorted values
+    weights: Numpy array
+        weights that line up with values
+    share: float
+        population share at the bottom of the distribution
+
+    Returns
+    -------
+    float
+        share of the total
+    """
+    return lorenz_value(values, weights, share)
+
+
+def palma(values, weights) -> float:
+    """
+    Palma ratio: the share of the total held by the top 10% of the
+    population divided by the share held by the bottom 40%
+
+    Parameters
+    ----------
+    values: Numpy array
+        sorted values
+    weights: Numpy array
+        weights that line up with values
+
+    Returns
+    -------
+    float
+        Palma ratio
+    """
+    return top_share(values, weights, 0.1) / bottom_share(values, weights, 0.4)
+
+
+def poverty_rate(values, weights, poverty_line: float) -> float:
+    """
+    Weighted share of tax units with a value below the poverty line
+
+    Parameters
+    ----------
+    values: Numpy array
+        values
+    weights: Numpy array
+        weights that line up with values
+    poverty_line: float
+        poverty threshold
+
+    Returns
+    -------
+    float
+        poverty rate
+    """
+    return float(weights[values < poverty_line].sum() / weights.sum())
+
+
+def poverty_gap(values, weights, poverty_line: float) -> float:
+    """
+    Poverty gap index: the weighted average shortfall from the poverty
+    line, expressed as a share of the line. Tax units above the line have
+    no shortfall and the shortfall is capped at the full poverty line.
+
+    Parameters
+    ----------
+    values: Numpy array
+        values
+    weights: Numpy array
+        weights that line up with values
+    poverty_line: float
+        poverty threshold
+
+    Returns
+    -------
+    float
+        poverty gap index
+    """
+    gap = np.clip((poverty_line - values) / poverty_line, 0, 1)
+    return float((gap * weights).sum() / weights.sum())
+
+
+# statistics available in distribution_stats. Each function takes values
+# and weights sorted in ascending order
+STATISTICS = {
+    "gini": gini,
+    "theil": theil,
+    "top_1_share": partial(top_share, share=0.01),
+    "top_10_share": partial(top_share, share=0.1),
+    "bottom_40_share": partial(bottom_share, share=0.4),
+    "palma": palma,
+}
+# statistics that also require a poverty line
+POVERTY_STATISTICS = {
+    "poverty_rate": poverty_rate,
+    "poverty_gap": poverty_gap,
+}
+
+
+def distribution_stats(
+    tb,
+    var: str = "aftertax_income",
+    stats: list = ["gini", "theil", "top_1_share", "top_10_share"],
+    percentiles: list = [],
+    years: list = None,
+    poverty_line: float = None,
+    num_workers: int = 1,
+) -> pd.DataFrame:
+    """
+    Compute inequality and percentile statistics for the baseline and
+    reform in every year in a single batch. Each year and calculator is
+    sorted at most once.
+
+    Parameters
+    ----------
+    tb: TaxBrain object
+        TaxBrain object for analysis
+    var: str
+        name of the variable to use
+    stats: list
+        statistics to compute. Options are the keys of STATISTICS and
+        POVERTY_STATISTICS
+    percentiles: list
+        percentiles, between 0 and 100, to include in the table
+    years: list
+        years to include. Defaults to every year in the analysis
+    poverty_line: float
+        poverty threshold used by the statistics in POVERTY_STATISTICS
+    num_workers: int
+        number of threads used to compute the years in parallel. If None,
+        the Python default for a thread pool is used
+
+    Returns
+    -------
+    table: Pandas DataFrame
+        table with a row for the baseline value, reform value, and
+        difference of each statistic and a column for each year
+    """
+    functions = {}
+    for stat in stats:
+        if stat in STATISTICS:
+            functions[stat] = STATISTICS[stat]
+        elif stat in POVERTY_STATISTICS:
+            if poverty_line is None:
+                msg = f"'poverty_line' must be specified to compute '{stat}'"
+                raise ValueError(msg)
+            functions[stat] = partial(
+                POVERTY_STATISTICS[stat], poverty_line=poverty_line
+            )
+        else:
+            options = list(STATISTICS.keys()) + list(POVERTY_STATISTICS.keys())
+            msg = f"'{stat}' is not a valid statistic. Options are {options}"
+            raise ValueError(msg)
+    if years is None:
+        years = range(tb.start_year, tb.end_year + 1)
+    names = list(stats) + [f"p{p:g}" for p in percentiles]
+
+    def year_stats(year):
+        """
+        Compute all of the statistics for a single year
+        """
+        calc_stats = {}
+        for calc in ["base", "reform"]:
+            values, weights = sorted_data(tb, year, var, calc)
+            stat_values = [
+                func(values, weights) for func in functions.values()
+            ]
+            if percentiles:
+                stat_values += list(
+                    weighted_percentiles(values, weights, percentiles)
+                )
+            calc_stats[calc] = np.array(stat_values)
+        diff = calc_stats["reform"] - calc_stats["base"]
+        return np.column_stack(
+            [calc_stats["base"], calc_stats["reform"], diff]
+        ).ravel()
+
+    # the heavy lifting is done in numpy, which releases the GIL
+    if num_workers == 1:
+        results = [year_stats(year) for year in years]
+    else:
+        with ThreadPoolExecutor(max_workers=num_workers) as pool:
+            results = list(pool.map(year_stats, years))
+    index = pd.MultiIndex.from_product(
+        [names, ["Base", "Reform", "Difference"]]
+    )
+    table = pd.DataFrame(dict(zip(years, results)), index=index)
+    return table
+
+
+def sorted_data(tb, year: int, var: str, calc: str = "base"):
+    """
+    Return a variable and the weights for a given year and calculator
+    sorted in ascending order of the variable
+
+    Parameters
+    ----------
+    tb: TaxBrain object
+        TaxBrain object for analysis
+    year: int
+        year of data to use
+    var: str
+        name of the variable to use
+    calc: str
+        which calculator's data to use, 'base' or 'reform'
+
+    Returns
+    -------
+    values: Numpy array
+        sorted values
+    weights: Numpy array
+        weights that line up with values
+    """
+    data = _calc_data(tb, year, calc)
+    order = sort_order(tb, year, var, calc)
+    values = data[var].to_numpy()[order]
+    weights = data["s006"].to_numpy()[order]
+    return values, weights
+
+
+def _calc_data(tb, year, calc):
+    """
+    Pull the data for a given year and calculator from a TaxBrain object
+    """
+    if calc.lower() == "base":
+        return tb.base_data[year]
+    elif calc.lower() == "reform":
+        return tb.reform_data[year]
+    else:
+        raise ValueError("calc must be either BASE or REFORM")
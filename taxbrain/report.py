@@ -1,9 +1,17 @@
-import shutil
+import json
+import os
 import pandas as pd
 import behresp
 import taxbrain
 import taxcalc as tc
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from .figures import figure_spec, render_figures
+from .utils import (
+    draw_distribution_plot,
+    draw_differences_plot,
+    DIFFERENCES_PLOT_VARS,
+)
 from .report_utils import (
     form_intro,
     form_baseline_intro,
@@ -17,14 +25,23 @@ from .report_utils import (
     convert_table,
     growth_assumptions,
     md_to_pdf,
+    md_to_pdf_bytes,
+    md_to_html,
+    data_uri,
     DIFF_TABLE_ROW_NAMES,
     dollar_str_formatting,
+    load_template,
 )
+from .policy_metadata import policy_metadata
+from .aio import run_in_process
+from .timing import stage, timed, worker_options, worker_call, worker_result
 
 
 CUR_PATH = Path(__file__).resolve().parent
+TEMPLATE_PATH = Path(CUR_PATH, "report_files", "report_template.md")
 
 
+@timed("report")
 def report(
     tb,
     name=None,
@@ -35,6 +52,11 @@ def report(
     css=None,
     verbose=False,
     clean=False,
+    dpi=1200,
+    figure_format="png",
+    num_workers=None,
+    figure_cache_dir=None,
+    formats=["md", "pdf"],
 ):
     """
     Create a PDF report based on TaxBrain results
@@ -60,14 +82,31 @@ def report(
         boolean indicating whether or not to write progress as report is
         created
     clean: bool
-        boolean indicating whether all of the files written to create the
-        report should be deleated and a byte representation of the PDF returned
+        boolean indicating whether the report should be built in memory,
+        without writing any files, and the markdown text and PDF bytes
+        returned. Figures are embedded in the markdown as data URIs
+    dpi: int
+        resolution of the figures in dots per inch
+    figure_format: str
+        image format of the figures. SVG figures do not render correctly
+        in the PDF version of the report
+    num_workers: int
+        number of processes used to draw the figures. If 1, figures are
+        drawn in the current process
+    figure_cache_dir: str
+        directory used to cache rendered figures so that figures whose
+        data and options haven't changed aren't drawn again
+    formats: list
+        formats to create the report in. Options are 'md', 'pdf', and
+        'html'. The HTML report is a single file with the figures
+        embedded and is much faster to create than the PDF
 
     Returns
     --------
     files or None: dict or None
         returns either None (reports saved to disk) or dictionary with
-        string of bytes for markdown and pdf versions of the report
+        the text of the markdown and HTML versions of the report and the
+        bytes of the PDF version, keyed by file name
 
     """
 
@@ -101,14 +140,14 @@ def report(
             )
         return df
 
-    def export_plot(plot, graph):
+    def export_plot(image, graph):
         """
-        Export plot as a PNG
+        Write a rendered plot to the output directory
 
         Parameters
         -----------
-        plot: Matplolib.pyplot plot object
-            plot to export
+        image: bytes
+            rendered plot
         graph: str
             str to use in file name of plot to save
 
@@ -117,15 +156,18 @@ def report(
         str
             full filename indicating where plot is saved
         """
-        # export graph as a PNG
         # we could get a higher quality image with an SVG, but the SVG plots
         # do not render correctly in the PDF document
-        filename = f"{graph}_graph.png"
-        full_filename = Path(output_path, filename)
-        plot.savefig(full_filename, dpi=1200, bbox_inches="tight")
+        filename = f"{graph}_graph.{figure_format}"
+        Path(output_path, filename).write_bytes(image)
 
         return filename
 
+    invalid_formats = set(formats) - {"md", "pdf", "html"}
+    if invalid_formats:
+        msg = f"Invalid report format(s) {invalid_formats}. "
+        msg += "Options are 'md', 'pdf', and 'html'"
+        raise ValueError(msg)
     if not tb.has_run:
         tb.run()
     if not name:
@@ -136,7 +178,7 @@ def report(
         author = f"Report Prepared by {author.title()}"
     # create directory to hold report contents
     output_path = Path(outdir)
-    if not output_path.exists():
+    if not clean and not output_path.exists():
         output_path.mkdir()
     # dictionary to hold pieces of the final text
     text_args = {
@@ -157,8 +199,7 @@ def report(
     if verbose:
         print("Writing Introduction")
     # find policy areas used in the reform
-    pol = tc.Policy()
-    pol_meta = pol.metadata()
+    pol_meta = policy_metadata()
     pol_areas = set()
     for var in tb.params["policy"].keys():
         # catch "{}-indexed" parameter changes
@@ -248,21 +289,25 @@ def report(
     agg_diff = format_table(agg_diff, list(agg_diff.columns), [])
     text_args["agg_tax_type"] = convert_table(agg_diff)
 
-    # summary of policy changes
-    text_args["reform_summary"] = policy_table(tb.params["policy"])
+    with stage("policy_table"):
+        # summary of policy changes
+        text_args["reform_summary"] = policy_table(tb.params["policy"])
 
-    # policy baseline
-    if tb.params["base_policy"]:
-        text_args["policy_baseline"] = policy_table(tb.params["base_policy"])
-    else:
-        text_args["policy_baseline"] = (
-            f"This report is based on current law as of {date()}."
-        )
+        # policy baseline
+        if tb.params["base_policy"]:
+            text_args["policy_baseline"] = policy_table(
+                tb.params["base_policy"]
+            )
+        else:
+            text_args["policy_baseline"] = (
+                f"This report is based on current law as of {date()}."
+            )
 
     # notable changes
     if verbose:
         print("Finding notable changes")
-    text_args["notable_changes"] = notable_changes(tb, change_threshold)
+    with stage("notable_changes"):
+        text_args["notable_changes"] = notable_changes(tb, change_threshold)
 
     # behavioral assumptions
     if verbose:
@@ -283,41 +328,223 @@ def report(
     # create graphs
     if verbose:
         print("Creating graphs")
-    dist_graph = taxbrain.distribution_plot(
-        tb,
-        tb.start_year,
-        (5, 4),
-        f"Fig. 2: Percentage Change in After-Tax Income - {tb.start_year}",
-    )
-    text_args["distribution_graph"] = export_plot(dist_graph, "dist")
-
-    # differences graph
-    diff_graph = taxbrain.differences_plot(
-        tb,
-        "combined",
-        (6, 3),
-        title="Fig. 1: Change in Aggregate Combined Tax Liability",
+    with stage("figure_data"):
+        dist_data = taxbrain.winners_losers_data(tb, [tb.start_year])
+        agg_base = tb.multi_var_table(DIFFERENCES_PLOT_VARS, "base")
+        agg_reform = tb.multi_var_table(DIFFERENCES_PLOT_VARS, "reform")
+    figure_specs = {
+        "dist": figure_spec(
+            draw_distribution_plot,
+            dist_data.loc[tb.start_year],
+            year=tb.start_year,
+            figsize=(5, 4),
+            title=(
+                "Fig. 2: Percentage Change in After-Tax Income - "
+                f"{tb.start_year}"
+            ),
+        ),
+        "difference": figure_spec(
+            draw_differences_plot,
+            agg_reform - agg_base,
+            tax_type="combined",
+            figsize=(6, 3),
+            title="Fig. 1: Change in Aggregate Combined Tax Liability",
+        ),
+    }
+    figures = render_figures(
+        figure_specs, dpi, figure_format, num_workers, figure_cache_dir
     )
-    text_args["agg_graph"] = export_plot(diff_graph, "difference")
+    if clean or "html" in formats:
+        # images embedded in reports built in memory and HTML reports
+        logo = Path(text_args["taxbrain"]).read_bytes()
+        images = {
+            "taxbrain": data_uri(logo, "png"),
+            "distribution_graph": data_uri(figures["dist"], figure_format),
+            "agg_graph": data_uri(figures["difference"], figure_format),
+        }
+    if clean:
+        text_args.update(images)
+    else:
+        text_args["distribution_graph"] = export_plot(figures["dist"], "dist")
+        text_args["agg_graph"] = export_plot(
+            figures["difference"], "difference"
+        )
 
     # fill in the report template
     if verbose:
         print("Compiling report")
-    template_path = Path(CUR_PATH, "report_files", "report_template.md")
-    report_md = write_text(template_path, **text_args)
-
-    # write PDF, markdown files
+    template_path = TEMPLATE_PATH
     filename = name.replace(" ", "-").replace(",", "")
-    pdf_path = Path(output_path, f"{filename}.pdf")
-    md_path = Path(output_path, f"{filename}.md")
-    md_path.write_text(report_md)
-    md_to_pdf(report_md, str(pdf_path))
+    files = {}
+    if "md" in formats or "pdf" in formats:
+        report_md = write_text(template_path, **text_args)
+    if "md" in formats:
+        files[f"{filename}.md"] = report_md
+    if "html" in formats:
+        # keep the large data URIs out of the markdown conversion
+        placeholders = {key: f"{key}-image" for key in images}
+        html_md = write_text(template_path, **{**text_args, **placeholders})
+        with stage("html"):
+            files[f"{filename}.html"] = md_to_html(
+                html_md,
+                css,
+                {placeholders[key]: uri for key, uri in images.items()},
+            )
+    if "pdf" in formats:
+        if verbose:
+            print("Creating PDF")
+        with stage("pdf"):
+            if clean:
+                files[f"{filename}.pdf"] = md_to_pdf_bytes(report_md)
+            else:
+                md_to_pdf(
+                    report_md, str(Path(output_path, f"{filename}.pdf"))
+                )
 
     if clean:
-        # return PDF as bytes and the markdown text
-        byte_pdf = pdf_path.read_bytes()
-        files = {f"{filename}.md": report_md, f"{filename}.pdf": byte_pdf}
-        # remove directory where everything was saved
-        shutil.rmtree(output_path)
-        assert not output_path.exists()
+        # return PDF as bytes and the markdown and HTML text
         return files
+
+    # write markdown and HTML files
+    for file_name, text in files.items():
+        Path(output_path, file_name).write_text(text)
+
+
+def report_many(
+    tbs: list,
+    names: list = None,
+    outdir=".",
+    num_workers: int = None,
+    **kwargs,
+):
+    """
+    Create reports for many sets of TaxBrain results in parallel. Each
+    worker process loads the report template and the policy parameter
+    metadata once and reuses them for every report it creates.
+
+    Parameters
+    ----------
+    tbs: list
+        TaxBrain objects, or paths to results saved with TaxBrain.save,
+        to create reports for. Passing paths avoids copying the results
+        to the worker processes
+    names: list
+        name of each report. Defaults to 'Policy Report 1',
+        'Policy Report 2', etc.
+    outdir: str
+        directory that holds a subdirectory for each report along with
+        an index of all of the reports
+    num_workers: int
+        number of processes used to create reports. If 1, reports are
+        created in the current process. If None, the number of CPUs is
+        used
+    kwargs: keyword arguments
+        other arguments passed to `report`. `clean` is not supported
+
+    Returns
+    -------
+    index: list
+        dictionary for each report with its name, directory, and files,
+        in the same order as `tbs`
+    """
+    if kwargs.get("clean"):
+        raise ValueError("report_many does not support clean=True")
+    if names is None:
+        names = [f"Policy Report {i + 1}" for i in range(len(tbs))]
+    if len(names) != len(tbs):
+        raise ValueError("A name must be given for each report")
+    outdir = Path(outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+    # the figures are rendered by the report workers themselves
+    kwargs.setdefault("num_workers", 1)
+    jobs = [
+        (tb, name, str(Path(outdir, name.replace(" ", "-").replace(",", ""))))
+        for tb, name in zip(tbs, names)
+    ]
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    num_workers = min(num_workers, len(jobs))
+    if num_workers > 1:
+        options = worker_options()
+        with ProcessPoolExecutor(
+            max_workers=num_workers, initializer=_init_report_worker
+        ) as pool:
+            futures = [
+                pool.submit(worker_call, options, _report_job, *job, kwargs)
+                for job in jobs
+            ]
+            index = [worker_result(future.result()) for future in futures]
+    else:
+        index = [_report_job(*job, kwargs) for job in jobs]
+    _write_index(index, outdir)
+    return index
+
+
+async def areport(tb, timeout: float = None, **kwargs):
+    """
+    Create a report in a separate process without blocking the event loop.
+    If the awaiting task is cancelled or the timeout passes, the process is
+    stopped.
+
+    Parameters
+    ----------
+    tb: TaxBrain object
+        TaxBrain object that has been run
+    timeout: float
+        seconds to wait for the report before raising TimeoutError
+    kwargs: keyword arguments
+        arguments passed to `report`
+
+    Returns
+    -------
+    value returned by `report`
+    """
+    # stages timed in the worker process are added to the current timer
+    result = await run_in_process(
+        worker_call,
+        worker_options(),
+        report,
+        tb,
+        timeout=timeout,
+        **kwargs,
+    )
+    return worker_result(result)
+
+
+def _init_report_worker():
+    """
+    Load the resources shared by every report a worker process creates
+    """
+    load_template(str(TEMPLATE_PATH))
+    policy_metadata()
+
+
+def _report_job(tb, name, report_dir, kwargs):
+    """
+    Create a single report for report_many
+    """
+    if isinstance(tb, (str, Path)):
+        tb = taxbrain.TaxBrain.load(tb)
+    report(tb, name=name, outdir=report_dir, **kwargs)
+    files = sorted(path.name for path in Path(report_dir).iterdir())
+    return {"name": name, "directory": report_dir, "files": files}
+
+
+def _write_index(index, outdir):
+    """
+    Write an index of the reports created by report_many as JSON and as a
+    Markdown table linking to each report
+    """
+    Path(outdir, "index.json").write_text(json.dumps(index, indent=2))
+    rows = [["Report", "Files"]]
+    for entry in index:
+        directory = Path(entry["directory"]).relative_to(outdir)
+        links = [
+            f"[{file}]({directory.as_posix()}/{file})"
+            for file in entry["files"]
+            if "_graph." not in file
+        ]
+        rows.append([entry["name"], ", ".join(links)])
+    Path(outdir, "index.md").write_text(
+        "# Reports\n\n" + convert_table(rows) + "\n"
+    )
@@ -2,7 +2,13 @@
 Helper Functions for creating the automated reports
 """
 
+import base64
+import html
 import json
+import markdown
+import mimetypes
+import re
+import subprocess
 import pypandoc
 import numpy as np
 import pandas as pd
@@ -12,11 +18,15 @@ from pathlib import Path
 from datetime import datetime
 from tabulate import tabulate
 from collections import defaultdict, deque
+from functools import lru_cache
 from .utils import is_paramtools_format
+from .policy_metadata import policy_metadata, param_default, PARAM_TYPES
 from typing import Union
 
 
 CUR_PATH = Path(__file__).resolve().parent
+# arguments passed to pandoc when creating a PDF
+PDF_ARGS = ["-V", "geometry:margin=1.5cm", "--pdf-engine", "pdflatex"]
 
 notable_vars = {
     "c00100": "AGI",
@@ -81,10 +91,131 @@ def md_to_pdf(md_text, outputfile_path):
         "pdf",
         format="md",
         outputfile=outputfile_path,
-        extra_args=["-V", "geometry:margin=1.5cm", "--pdf-engine", "pdflatex"],
+        extra_args=PDF_ARGS,
     )
 
 
+def md_to_pdf_bytes(md_text) -> bytes:
+    """
+    Convert Markdown version of report to a PDF without writing either to
+    disk. The Markdown is piped to pandoc and the PDF is read from its
+    output. Images must be embedded in the Markdown as data URIs.
+
+    Parameters
+    ----------
+    md_text: str
+        report template written in markdown
+
+    Returns
+    -------
+    bytes
+        contents of the PDF
+    """
+    # pypandoc can only write binary formats to a file, so call pandoc
+    # directly with its output sent to stdout
+    args = [pypandoc.get_pandoc_path(), "-f", "markdown", "-t", "pdf"]
+    args += ["-o", "-"] + PDF_ARGS
+    result = subprocess.run(args, input=md_text.encode(), capture_output=True)
+    if result.returncode != 0:
+        msg = f"Pandoc died with exitcode {result.returncode} "
+        msg += f"during conversion: {result.stderr.decode()}"
+        raise RuntimeError(msg)
+    return result.stdout
+
+
+def md_to_html(md_text, css: str = None, images: dict = None) -> str:
+    """
+    Convert Markdown version of report to a standalone HTML document.
+    Pandoc-specific syntax used in the report template, such as the title
+    block, LaTeX commands, and inline footnotes, is converted or removed
+    first.
+
+    Parameters
+    ----------
+    md_text: str
+        report template written in markdown
+    css: str
+        path to a CSS file to embed in the document. Defaults to the
+        report's style sheet
+    images: dict
+        image sources to replace in the HTML, such as placeholders to
+        replace with data URIs. Large data URIs are substituted after
+        conversion to keep the conversion fast
+
+    Returns
+    -------
+    str
+        HTML document
+    """
+    lines = md_text.splitlines()
+    # pandoc title block: title, author, and date lines starting with %
+    title_block = []
+    while lines and lines[0].startswith("%"):
+        title_block.append(lines.pop(0)[1:].strip())
+    body_lines = []
+    for line in lines:
+        if line.strip() == "\\pagebreak":
+            body_lines.append('<div class="pagebreak"></div>')
+        elif line.strip() in ["\\vfill", "\\"]:
+            continue
+        else:
+            body_lines.append(line)
+    body = "\n".join(body_lines)
+    # pandoc attributes on images
+    body = re.sub(r"(!\[[^\]]*\]\([^)]*\))\{[^}]*\}", r"\1", body)
+    # convert inline footnotes to footnotes with a separate definition
+    notes = []
+
+    def footnote(match):
+        notes.append(match.group(1))
+        return f"[^{len(notes)}]"
+
+    body = re.sub(r"\^\[([^\]]*)\]", footnote, body)
+    for i, note in enumerate(notes, start=1):
+        body += f"\n\n[^{i}]: {note}"
+    body_html = markdown.markdown(
+        body, extensions=["tables", "footnotes", "sane_lists"]
+    )
+    for src, replacement in (images or {}).items():
+        body_html = body_html.replace(f'src="{src}"', f'src="{replacement}"')
+    header = []
+    for tag, text in zip(["h1", "p", "p"], title_block):
+        if text:
+            header.append(f"<{tag}>{html.escape(text)}</{tag}>")
+    title = html.escape(title_block[0]) if title_block else ""
+    if css is None:
+        css = Path(CUR_PATH, "report_files", "report_style.css")
+    style = Path(css).read_text()
+    header_html = "\n".join(header)
+    return (
+        "<!DOCTYPE html>\n"
+        '<html>\n<head>\n<meta charset="utf-8">\n'
+        f"<title>{title}</title>\n<style>\n{style}\n</style>\n</head>\n"
+        f"<body>\n{header_html}\n{body_html}\n</body>\n</html>\n"
+    )
+
+
+def data_uri(image: bytes, format: str = "png") -> str:
+    """
+    Encode an image as a data URI so that it can be embedded in a report
+
+    Parameters
+    ----------
+    image: bytes
+        image to encode
+    format: str
+        image format
+
+    Returns
+    -------
+    str
+        data URI for the image
+    """
+    mime_type = mimetypes.guess_type(f"image.{format}")[0]
+    encoded = base64.b64encode(image).decode()
+    return f"data:{mime_type};base64,{encoded}"
+
+
 def convert_table(df, tablefmt: str = "pipe") -> str:
     """
     Convert pandas DataFrame to Markdown style table
@@ -145,7 +276,8 @@ def policy_table(params):
     reform_by_year = defaultdict(lambda: deque())
     if is_paramtools_format(params):
         params = convert_params(params)
-    pol = tc.Policy()  # policy object used for getting original value
+    # metadata and current law values used for getting original value
+    pol_metadata = policy_metadata()
     # loop through all of the policy parameters in a given reform
     for param, meta in params.items():
         # find all the years the parameter is updated
@@ -153,10 +285,9 @@ def policy_table(params):
         reform_years = reform_years.union(years)
         for yr in years:
             # find default information
-            pol.set_year(yr)
             if param.endswith("-indexed"):
                 _param = param.split("-")[0]
-                pol_meta = pol.metadata()[_param]
+                pol_meta = pol_metadata[_param]
                 default_indexed = pol_meta["indexed"]
                 new_indexed = meta[yr]
                 name = pol_meta["title"]
@@ -168,9 +299,9 @@ def policy_table(params):
                     ]
                 )
                 continue
-            pol_meta = pol.metadata()[param]
+            pol_meta = pol_metadata[param]
             name = pol_meta["title"]
-            default_val = getattr(pol, param)
+            default_val = param_default(param, yr)
             new_val = meta[yr]
             # skip any duplicated policy parameters
             if np.all(default_val == new_val):
@@ -179,11 +310,7 @@ def policy_table(params):
             # think parameters that vary by marital status, number of kids, etc
             if len(default_val.shape) != 1:
                 # first find the indexed parameter we're working with
-                for vi in vi_map.keys():
-                    if vi in pol_meta["value"][0].keys():
-                        vi_name = vi
-                        break
-                vi_list = vi_map[vi_name]
+                vi_list = vi_map[pol_meta["vi_name"]]
                 for i, val in enumerate(default_val[0]):
                     # print(name, val, param, default_val)
                     _name = f"{name} - {vi_list[i]}"
@@ -221,13 +348,31 @@ def write_text(template_path, **kwargs):
     rendered: str
         rendered template
     """
-    template_str = Path(template_path).open("r").read()
-    template = Template(template_str)
+    template = load_template(str(template_path))
     rendered = template.render(**kwargs)
 
     return rendered
 
 
+@lru_cache(maxsize=None)
+def load_template(template_path: str) -> Template:
+    """
+    Read and compile a report template. Each template is only read once
+    per process.
+
+    Parameters
+    ----------
+    template_path: str
+        path to read template from
+
+    Returns
+    -------
+    Jinja2 Template
+        compiled template
+    """
+    return Template(Path(template_path).read_text())
+
+
 def date():
     """
     Return formatted date
@@ -379,38 +524,15 @@ def notable_changes(tb, threshold: float) -> str:
         text for section on notable changes
     """
     notable_dict = defaultdict(list)
-    # loop through all of the notable variables and see if there is a year
-    # where they change more than the given threshold
+    base, reform = _notable_aggregates(tb)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct_change = ((reform - base) / base).fillna(0.0)
+    # find the year with the largest change in each notable variable
+    max_pct_changes = pct_change.max()
+    max_years = pct_change.idxmax()
     for var, desc in notable_vars.items():
-        if var.startswith("count_"):
-            # count number of filers with a non-zero value for a given variable
-            totals = []
-            years = []
-            for year in range(tb.start_year, tb.end_year + 1):
-                _var = var.split("_")[1]
-                base = tb.base_data[year]
-                reform = tb.reform_data[year]
-                base_total = np.where(base[_var] != 0, base["s006"], 0).sum()
-                reform_total = np.where(
-                    reform[_var] != 0, reform["s006"], 0
-                ).sum()
-                diff = reform_total - base_total
-                totals.append(
-                    {
-                        "Base": base_total,
-                        "Reform": reform_total,
-                        "Difference": diff,
-                    }
-                )
-                years.append(year)
-            totals = pd.DataFrame(totals)
-            totals.index = years
-        else:
-            totals = tb.weighted_totals(var).transpose()
-        totals["pct_change"] = totals["Difference"] / totals["Base"]
-        totals = totals.fillna(0.0)
-        max_pct_change = max(totals["pct_change"])
-        max_yr = totals[totals["pct_change"] == max_pct_change].index.values[0]
+        max_pct_change = max_pct_changes[var]
+        max_yr = max_years[var]
         if abs(max_pct_change) >= threshold:
             if max_pct_change < 0:
                 direction = "decreases"
@@ -431,6 +553,54 @@ def notable_changes(tb, threshold: float) -> str:
     return section
 
 
+def _notable_aggregates(tb):
+    """
+    Compute the weighted total of every notable variable, or the weighted
+    number of tax units with a non-zero value for "count_" variables, in
+    a single pass over each year of data
+
+    Parameters
+    ----------
+    tb: TaxBrain object
+        instance of TaxBrain object for analysis
+
+    Returns
+    -------
+    aggregates: list
+        Pandas DataFrames for the baseline and reform with a row for each
+        year and a column for each notable variable
+    """
+    total_vars = [var for var in notable_vars if not var.startswith("count_")]
+    count_vars = [
+        var.split("_")[1] for var in notable_vars if var.startswith("count_")
+    ]
+    used_vars = set(total_vars + count_vars + ["s006"])
+    years = list(range(tb.start_year, tb.end_year + 1))
+    aggregates = []
+    for data in [tb.base_data, tb.reform_data]:
+        totals = np.zeros((len(years), len(total_vars)))
+        counts = np.zeros((len(years), len(count_vars)))
+        for i, year in enumerate(years):
+            # work on the underlying arrays to avoid copying the columns
+            columns = {var: data[year][var].to_numpy() for var in used_vars}
+            weight = columns["s006"]
+            totals[i] = [weight @ columns[var] for var in total_vars]
+            counts[i] = [weight @ (columns[var] != 0) for var in count_vars]
+        table = pd.concat(
+            [
+                pd.DataFrame(totals, index=years, columns=total_vars),
+                pd.DataFrame(
+                    counts,
+                    index=years,
+                    columns=[f"count_{var}" for var in count_vars],
+                ),
+            ],
+            axis=1,
+        )
+        aggregates.append(table[list(notable_vars.keys())])
+    return aggregates
+
+
 def behavioral_assumptions(tb):
     """
     Return list of behavioral assumptions used
@@ -589,7 +759,10 @@ def growth_assumptions(tb):
 def convert_params(params):
     """
     Convert ParamTools style parameter inputs to traditional taxcalc style
-    parameters for report policy table creation
+    parameters for report policy table creation. Values are read from the
+    reform itself when it sets every element of a parameter in a year. A
+    Policy object is only created when it doesn't, because the elements it
+    leaves out may have been changed by the reform in an earlier year.
 
     Parameters
     ----------
@@ -601,34 +774,64 @@ def convert_params(params):
     reform: dict
         a dictionary in traditional taxcalc style
     """
-    pol = tc.Policy()
-    pol.adjust(params)
+    pol_metadata = policy_metadata()
     indexed_params = []
     reform = defaultdict(dict)
-    first_yr = pol.LAST_BUDGET_YEAR
-    for param in params.keys():
-        yrs = []
+    partial = {}
+    for param, adjustments in params.items():
         if param.endswith("-indexed"):
             indexed_params.append(param)
             continue
-        for adj in params[param]:
-            yrs.append(adj["year"])
-        yrs = set(yrs)
-        values = getattr(pol, f"_{param}")
-        for yr in yrs:
-            idx = yr - pol.JSON_START_YEAR
-            vals = values[idx]
-            if isinstance(vals, np.ndarray):
-                vals = list(vals)
-            first_yr = min(yr, first_yr)
-            reform[param][yr] = vals
+        by_year = defaultdict(list)
+        for adj in adjustments:
+            by_year[adj["year"]].append(adj)
+        for yr, adjs in by_year.items():
+            vals = _adjusted_value(pol_metadata[param], adjs)
+            if vals is None:
+                partial[param] = adjustments
+            else:
+                reform[param][yr] = vals
+    if partial:
+        pol = tc.Policy()
+        pol.adjust(params)
+        for param, adjustments in partial.items():
+            values = getattr(pol, f"_{param}")
+            for yr in {adj["year"] for adj in adjustments}:
+                vals = values[yr - pol.JSON_START_YEAR]
+                if isinstance(vals, np.ndarray):
+                    vals = list(vals)
+                reform[param][yr] = vals
     # add indexed parameters as being implemented in first year of reform
+    first_yr = min(
+        [yr for years in reform.values() for yr in years],
+        default=tc.Policy.LAST_BUDGET_YEAR,
+    )
     for param in indexed_params:
         val = params[param][0]["value"]
         reform[param][first_yr] = val
     return reform
 
 
+def _adjusted_value(meta, adjustments: list):
+    """
+    Value of a parameter in one year of a reform, or None if the reform
+    doesn't set all of its elements in that year
+    """
+    cast = PARAM_TYPES[meta["type"]]
+    if meta["vi_name"] is None:
+        return cast(adjustments[-1]["value"])
+    labels = meta["vi_labels"]
+    vals = [None] * len(labels)
+    for adj in adjustments:
+        if meta["vi_name"] in adj:
+            vals[labels.index(adj[meta["vi_name"]])] = cast(adj["value"])
+        else:
+            vals = [cast(adj["value"])] * len(labels)
+    if None in vals:
+        return None
+    return vals
+
+
 def dollar_str_formatting(val: Union[int, float]) -> str:
     """
     Format dollar figures into $val trillion, $val billion, etc.
@@ -0,0 +1,389 @@
+"""
+Local SQLite database of summary results from many TaxBrain runs. Runs are
+indexed by a hash of their inputs, a hash of the reform alone, the
+microdata, the years covered, and the model versions so that results can be
+compared across runs without re-running them.
+"""
+
+import json
+import sqlite3
+import pandas as pd
+from datetime import datetime, timezone
+from pathlib import Path
+from taxbrain.utils import hash_inputs
+
+# variables stored in the aggregates table by default
+AGGREGATE_VARS = ["iitax", "payrolltax", "combined"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    name TEXT,
+    reform_hash TEXT NOT NULL,
+    microdata TEXT,
+    start_year INTEGER NOT NULL,
+    end_year INTEGER NOT NULL,
+    taxbrain_version TEXT,
+    taxcalc_version TEXT,
+    behresp_version TEXT,
+    created TEXT NOT NULL,
+    params TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_reform ON runs (reform_hash);
+CREATE INDEX IF NOT EXISTS runs_microdata ON runs (microdata);
+CREATE INDEX IF NOT EXISTS runs_versions
+    ON runs (taxbrain_version, taxcalc_version, behresp_version);
+CREATE TABLE IF NOT EXISTS run_params (
+    run_id TEXT NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    section TEXT NOT NULL,
+    param TEXT NOT NULL,
+    PRIMARY KEY (run_id, section, param)
+);
+CREATE INDEX IF NOT EXISTS run_params_param ON run_params (param);
+CREATE TABLE IF NOT EXISTS aggregates (
+    run_id TEXT NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    year INTEGER NOT NULL,
+    variable TEXT NOT NULL,
+    base REAL,
+    reform REAL,
+    difference REAL,
+    PRIMARY KEY (run_id, variable, year)
+);
+CREATE INDEX IF NOT EXISTS aggregates_variable_year
+    ON aggregates (variable, year);
+CREATE TABLE IF NOT EXISTS distribution (
+    run_id TEXT NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    year INTEGER NOT NULL,
+    tax TEXT NOT NULL,
+    groupby TEXT NOT NULL,
+    income_group TEXT NOT NULL,
+    statistic TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (run_id, year, tax, groupby, income_group, statistic)
+);
+"""
+
+
+class ResultsDB:
+    """
+    SQLite database holding the per-year aggregates and differences tables
+    of many TaxBrain runs
+    """
+
+    def __init__(self, path=":memory:"):
+        """
+        Parameters
+        ----------
+        path: str or Path
+            location of the database file. It will be created if it
+            doesn't exist. Defaults to an in-memory database
+
+        Returns
+        -------
+        None
+        """
+        self.path = path
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path))
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Close the connection to the database
+        """
+        self.conn.close()
+
+    def add_run(
+        self,
+        tb,
+        name: str = None,
+        variables: list = AGGREGATE_VARS,
+        groupby: list = ["weighted_deciles"],
+        replace: bool = False,
+    ) -> str:
+        """
+        Add the results of a TaxBrain run to the database. The weighted
+        total of each variable and the differences table for each year
+        and tax are stored.
+
+        Parameters
+        ----------
+        tb: TaxBrain object
+            TaxBrain object that has been run
+        name: str
+            name used to identify the run
+        variables: list
+            variables to store weighted totals for
+        groupby: list
+            groupings to store differences tables for. Options are those
+            accepted by TaxBrain.differences_table
+        replace: bool
+            if True, results already stored for a run with the same inputs
+            are replaced. Otherwise they are kept and nothing is added
+
+        Returns
+        -------
+        run_id: str
+            hash of the run's inputs used to identify it in the database
+        """
+        # imported here to avoid a circular import
+        from taxbrain import __version__
+
+        if not tb.has_run:
+            raise ValueError("TaxBrain.run() must be called before adding")
+        run_id = tb.input_hash()
+        exists = self.conn.execute(
+            "SELECT 1 FROM runs WHERE run_id = ?", (run_id,)
+        ).fetchone()
+        if exists and not replace:
+            return run_id
+        microdata = tb.microdata if isinstance(tb.microdata, str) else None
+        run_row = (
+            run_id,
+            name,
+            hash_inputs(tb.params["policy"]),
+            microdata,
+            tb.start_year,
+            tb.end_year,
+            __version__,
+            tb.VERSIONS.get("Tax-Calculator"),
+            tb.VERSIONS.get("Behavioral-Responses"),
+            datetime.now(timezone.utc).isoformat(),
+            json.dumps(tb.params, default=str),
+        )
+        param_rows = [
+            (run_id, section, param)
+            for section, param in sorted(_changed_params(tb.params))
+        ]
+        aggregate_rows = []
+        for var in variables:
+            table = tb.weighted_totals(var)
+            for year in table.columns:
+                aggregate_rows.append(
+                    (
+                        run_id,
+                        int(year),
+                        var,
+                        float(table.at["Base", year]),
+                        float(table.at["Reform", year]),
+                        float(table.at["Difference", year]),
+                    )
+                )
+        distribution_rows = []
+        for year in range(tb.start_year, tb.end_year + 1):
+            for tax in ["iitax", "payrolltax", "combined"]:
+                for group in groupby:
+                    table = tb.differences_table(year, group, tax)
+                    for stat in table.columns:
+                        for income_group, value in table[stat].items():
+                            distribution_rows.append(
+                                (
+                                    run_id,
+                                    year,
+                                    tax,
+                                    group,
+                                    str(income_group),
+                                    stat,
+                                    float(value),
+                                )
+                            )
+        with self.conn:
+            self.conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+            self.conn.execute(
+                "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                run_row,
+            )
+            self.conn.executemany(
+                "INSERT INTO run_params VALUES (?, ?, ?)", param_rows
+            )
+            self.conn.executemany(
+                "INSERT INTO aggregates VALUES (?, ?, ?, ?, ?, ?)",
+                aggregate_rows,
+            )
+            self.conn.executemany(
+                "INSERT INTO distribution VALUES (?, ?, ?, ?, ?, ?, ?)",
+                distribution_rows,
+            )
+        return run_id
+
+    def runs(self, param: str = None, microdata: str = None) -> pd.DataFrame:
+        """
+        List the runs in the database
+
+        Parameters
+        ----------
+        param: str
+            only include runs that change this parameter
+        microdata: str
+            only include runs that use this microdata
+
+        Returns
+        -------
+        Pandas DataFrame
+            one row for each run, indexed by run_id
+        """
+        where, args = _run_filter(param, microdata)
+        sql = (
+            "SELECT run_id, name, reform_hash, microdata, start_year, "
+            "end_year, taxbrain_version, taxcalc_version, behresp_version, "
+            f"created FROM runs{where} ORDER BY created"
+        )
+        return self.query(sql, args).set_index("run_id")
+
+    def revenue_change(
+        self,
+        variable: str = "combined",
+        start_year: int = None,
+        end_year: int = None,
+        param: str = None,
+        microdata: str = None,
+    ) -> pd.DataFrame:
+        """
+        Change in the weighted total of a variable in each year for every
+        matching run
+
+        Parameters
+        ----------
+        variable: str
+            variable to report
+        start_year: int
+            first year to include
+        end_year: int
+            last year to include
+        param: str
+            only include runs that change this parameter
+        microdata: str
+            only include runs that use this microdata
+
+        Returns
+        -------
+        table: Pandas DataFrame
+            one row for each run and a column for each year, along with
+            the total over all the years included
+        """
+        where, args = _run_filter(param, microdata)
+        where += " AND " if where else " WHERE "
+        where += "a.variable = ?"
+        args.append(variable)
+        if start_year is not None:
+            where += " AND a.year >= ?"
+            args.append(start_year)
+        if end_year is not None:
+            where += " AND a.year <= ?"
+            args.append(end_year)
+        sql = (
+            "SELECT a.run_id, runs.name, a.year, a.difference "
+            "FROM aggregates AS a JOIN runs ON a.run_id = runs.run_id"
+            f"{where}"
+        )
+        data = self.query(sql, args)
+        table = data.pivot(
+            index=["run_id", "name"], columns="year", values="difference"
+        )
+        table.columns.name = None
+        table["Total"] = table.sum(axis=1)
+        return table
+
+    def differences_table(
+        self,
+        run_id: str,
+        year: int,
+        tax_to_diff: str = "combined",
+        groupby: str = "weighted_deciles",
+    ) -> pd.DataFrame:
+        """
+        Rebuild a differences table stored for a run
+
+        Parameters
+        ----------
+        run_id: str
+            ID of the run
+        year: int
+            year of the table
+        tax_to_diff: str
+            which tax the table shows the difference of
+        groupby: str
+            grouping used in the table
+
+        Returns
+        -------
+        Pandas DataFrame
+            differences table
+        """
+        sql = (
+            "SELECT income_group, statistic, value FROM distribution "
+            "WHERE run_id = ? AND year = ? AND tax = ? AND groupby = ? "
+            "ORDER BY rowid"
+        )
+        data = self.query(sql, [run_id, year, tax_to_diff, groupby])
+        if data.empty:
+            raise KeyError(f"No differences table for run {run_id} in {year}")
+        table = data.pivot(
+            index="income_group", columns="statistic", values="value"
+        )
+        # restore the original row and column order
+        table = table.loc[
+            data["income_group"].unique(), data["statistic"].unique()
+        ]
+        table.index.name = None
+        table.columns.name = None
+        return table
+
+    def query(self, sql: str, params: list = ()) -> pd.DataFrame:
+        """
+        Run a SQL query against the database
+
+        Parameters
+        ----------
+        sql: str
+            query to run
+        params: list
+            values for any placeholders in the query
+
+        Returns
+        -------
+        Pandas DataFrame
+            query results
+        """
+        return pd.read_sql_query(sql, self.conn, params=list(params))
+
+
+def _changed_params(params: dict) -> set:
+    """
+    Find the section and name of every parameter changed in a set of
+    TaxBrain parameters. Changes to whether a parameter is indexed are
+    counted as changes to the parameter itself.
+    """
+    changed = set()
+    for section, values in params.items():
+        if not isinstance(values, dict):
+            continue
+        for param in values:
+            changed.add((section, str(param).replace("-indexed", "")))
+    return changed
+
+
+def _run_filter(param: str, microdata: str):
+    """
+    Create the WHERE clause used to filter runs
+    """
+    clauses = []
+    args = []
+    if param is not None:
+        clauses.append(
+            "runs.run_id IN (SELECT run_id FROM run_params WHERE param = ?)"
+        )
+        args.append(param)
+    if microdata is not None:
+        clauses.append("runs.microdata = ?")
+        args.append(microdata)
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    return where, args
@@ -0,0 +1,521 @@
+"""
+A long running scoring server. It keeps the microdata records, current law
+policies, compiled Tax-Calculator functions, and recent baseline results in
+memory so that each job only pays for its own calculations.
+
+Jobs are JSON objects posted to the server:
+
+- POST /jobs submits a job and returns its ID. Add ?wait=1 to wait for
+  the results instead.
+- GET /jobs/<id> returns the job's status and, once it is done, its
+  results or error.
+- DELETE /jobs/<id> cancels a job that hasn't started.
+- GET /health reports that the server is running.
+
+Finished jobs are kept for `job_ttl` seconds, and only the `max_jobs` most
+recently finished jobs are kept, so their results must be collected before
+then.
+
+Each worker keeps the baseline results of up to `baseline_cache_size` years.
+With the default variables a year of CPS results takes about 51 MB, so the
+default of 20 years can use about 1 GB in each worker.
+"""
+
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+from taxbrain.utils import is_paramtools_format
+
+# tables that can be requested for a job
+TABLES = ["weighted_totals", "differences_table", "distribution_table"]
+# tax variables reported in the tables
+TAX_TYPES = ["iitax", "payrolltax", "combined"]
+# microdata sources the server can keep in memory
+MICRODATA = ["CPS", "PUF", "TMD"]
+# default number of years of baseline results each worker keeps for later
+# static jobs. A year of CPS results takes about 51 MB
+BASELINE_CACHE_SIZE = 20
+# records and current law policies created by this process
+_records_cache = {}
+
+
+class _LRUCache(OrderedDict):
+    """
+    Dictionary that drops the least recently used items once it holds more
+    than `maxsize` of them
+    """
+
+    def __init__(self, maxsize: int):
+        super().__init__()
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        with self._lock:
+            self.move_to_end(key)
+            return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        """
+        Look up and mark an item as recently used in one step, so that it
+        can't be dropped by another thread in between
+        """
+        with self._lock:
+            if key not in self:
+                return default
+            self.move_to_end(key)
+            return super().__getitem__(key)
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            super().__setitem__(key, value)
+            self.move_to_end(key)
+            while len(self) > self.maxsize:
+                self.popitem(last=False)
+
+
+# baseline results of earlier static jobs run by this process
+_baseline_cache = _LRUCache(BASELINE_CACHE_SIZE)
+
+
+def validate_job(job: dict) -> dict:
+    """
+    Check a scoring job and fill in its defaults
+
+    Parameters
+    ----------
+    job: dict
+        start_year (required), end_year, microdata, reform, behavior,
+        assump, base_policy, and tables to create. `microdata` must be one
+        of "CPS", "PUF", or "TMD" and `tables` a list of names in TABLES.
+
+    Returns
+    -------
+    job: dict
+        the job with default values added
+    """
+    if not isinstance(job, dict):
+        raise ValueError("A job must be a JSON object")
+    unknown = set(job) - {
+        "start_year",
+        "end_year",
+        "microdata",
+        "reform",
+        "behavior",
+        "assump",
+        "base_policy",
+        "tables",
+    }
+    if unknown:
+        raise ValueError(f"Unknown job fields: {sorted(unknown)}")
+    if not isinstance(job.get("start_year"), int):
+        raise ValueError("start_year must be an integer")
+    job = dict(job)
+    job.setdefault("end_year", job["start_year"])
+    job.setdefault("microdata", "CPS")
+    job.setdefault("tables", ["weighted_totals"])
+    if job["microdata"] not in MICRODATA:
+        raise ValueError(f"microdata must be one of {MICRODATA}")
+    unknown = set(job["tables"]) - set(TABLES)
+    if unknown:
+        raise ValueError(f"Unknown tables: {sorted(unknown)}")
+    return job
+
+
+def run_job(job: dict, results_dir=None, job_id: str = None) -> dict:
+    """
+    Run a scoring job and create the requested tables. Records, and the
+    baseline results of static jobs, are reused from earlier jobs run by the
+    same process.
+
+    Parameters
+    ----------
+    job: dict
+        job checked by `validate_job`
+    results_dir: str or Path
+        if given, the full results are also saved to a directory named
+        after the job in `results_dir` so they can be opened with
+        TaxBrain.load
+    job_id: str
+        ID of the job, used to name its results directory
+
+    Returns
+    -------
+    results: dict
+        tables in the "split" format of `DataFrame.to_json`. Weighted
+        totals are keyed by tax, differences tables by year, and
+        distribution tables by year and calculator. If the results were
+        saved, "path" is the directory they were saved to.
+    """
+    from taxbrain import TaxBrain
+
+    assump = job.get("assump")
+    if isinstance(assump, dict):
+        assump = json.dumps(assump)
+    tb = TaxBrain(
+        job["start_year"],
+        job["end_year"],
+        microdata=job["microdata"],
+        reform=_policy_json(job.get("reform")),
+        behavior=job.get("behavior"),
+        assump=assump,
+        base_policy=_policy_json(job.get("base_policy")),
+    )
+    tb.run(records_cache=_records_cache, baseline_cache=_baseline_cache)
+    years = range(tb.start_year, tb.end_year + 1)
+    results = {}
+    if "weighted_totals" in job["tables"]:
+        results["weighted_totals"] = {
+            tax: _frame_json(tb.weighted_totals(tax)) for tax in TAX_TYPES
+        }
+    if "differences_table" in job["tables"]:
+        results["differences_table"] = {
+            str(year): _frame_json(
+                tb.differences_table(year, "weighted_deciles", "combined")
+            )
+            for year in years
+        }
+    if "distribution_table" in job["tables"]:
+        results["distribution_table"] = {
+            str(year): {
+                calc: _frame_json(
+                    tb.distribution_table(
+                        year, "weighted_deciles", "expanded_income", calc
+                    )
+                )
+                for calc in ["base", "reform"]
+            }
+            for year in years
+        }
+    if results_dir is not None:
+        path = Path(results_dir, job_id)
+        tb.save(path)
+        results["path"] = str(path)
+    return results
+
+
+class ScoringServer(ThreadingHTTPServer):
+    """
+    HTTP server that runs scoring jobs on a pool of warm workers
+    """
+
+    def __init__(
+        self,
+        address: tuple = ("127.0.0.1", 8000),
+        num_workers: int = 1,
+        microdata: list = ["CPS"],
+        processes: bool = True,
+        results_dir=None,
+        job_ttl: float = 3600,
+        max_jobs: int = 1000,
+        baseline_cache_size: int = BASELINE_CACHE_SIZE,
+    ):
+        """
+        Parameters
+        ----------
+        address: tuple
+            host and port to listen on. Use port 0 to pick a free port
+        num_workers: int
+            number of jobs to run at once
+        microdata: list
+            microdata sources each worker loads before taking jobs
+        processes: bool
+            if True, jobs run in worker processes. Otherwise they run in
+            threads of the server process
+        results_dir: str or Path
+            directory to save the full results of each job in
+        job_ttl: float
+            seconds a finished job and its results are kept
+        max_jobs: int
+            maximum number of finished jobs to keep. The jobs that finished
+            first are dropped once there are more
+        baseline_cache_size: int
+            number of years of baseline results each worker keeps for later
+            static jobs. A year of CPS results takes about 51 MB with the
+            default variables. Use 0 to keep none
+        """
+        if baseline_cache_size < 0:
+            raise ValueError("baseline_cache_size can't be negative")
+        super().__init__(address, ScoringHandler)
+        pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        self.executor = pool(
+            num_workers,
+            initializer=_init_worker,
+            initargs=(microdata, baseline_cache_size),
+        )
+        # start the workers now so they are warm when the first job arrives
+        for _ in range(num_workers):
+            self.executor.submit(int)
+        self.results_dir = results_dir
+        self.job_ttl = job_ttl
+        self.max_jobs = max_jobs
+        self.jobs = {}
+        # time each finished job finished, from the first to the last
+        self._finished = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, job: dict) -> str:
+        """
+        Check a job and add it to the queue
+
+        Parameters
+        ----------
+        job: dict
+            scoring job. See `validate_job`
+
+        Returns
+        -------
+        job_id: str
+            ID used to look up the job
+        """
+        job = validate_job(job)
+        job_id = uuid.uuid4().hex
+        self._drop_finished()
+        future = self.executor.submit(run_job, job, self.results_dir, job_id)
+        with self._lock:
+            self.jobs[job_id] = future
+        future.add_done_callback(lambda _: self._job_done(job_id))
+        return job_id
+
+    def status(self, job_id: str, block: bool = False) -> dict:
+        """
+        Status of a job, with its results or error once it is done
+
+        Parameters
+        ----------
+        job_id: str
+            ID returned by `submit`
+        block: bool
+            whether to wait for the job to finish
+
+        Returns
+        -------
+        status: dict
+            "id", "status" (one of "pending", "running", "done", "failed",
+            or "cancelled"), and "result" or "error"
+        """
+        future = self.jobs[job_id]
+        if block:
+            wait([future])
+        status = {"id": job_id}
+        if future.cancelled():
+            status["status"] = "cancelled"
+        elif not future.done():
+            status["status"] = "running" if future.running() else "pending"
+        elif future.exception() is not None:
+            status["status"] = "failed"
+            status["error"] = repr(future.exception())
+        else:
+            status["status"] = "done"
+            status["result"] = future.result()
+        return status
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a job that hasn't started
+
+        Parameters
+        ----------
+        job_id: str
+            ID returned by `submit`
+
+        Returns
+        -------
+        bool
+            whether the job was cancelled
+        """
+        return self.jobs[job_id].cancel()
+
+    def _job_done(self, job_id: str):
+        """
+        Record when a job finished
+        """
+        with self._lock:
+            self._finished[job_id] = time.monotonic()
+        self._drop_finished()
+
+    def _drop_finished(self):
+        """
+        Drop the finished jobs that have expired or are over the limit
+        """
+        expired = time.monotonic() - self.job_ttl
+        with self._lock:
+            while self._finished and (
+                len(self._finished) > self.max_jobs
+                or next(iter(self._finished.values())) < expired
+            ):
+                job_id, _ = self._finished.popitem(last=False)
+                self.jobs.pop(job_id, None)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ScoringHandler(BaseHTTPRequestHandler):
+    """
+    Request handler for the scoring server
+    """
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            self._send(200, {"status": "ok"})
+        else:
+            self._job_request(url, self.server.status)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/jobs":
+            self._send(404, {"error": f"Unknown path {url.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            job_id = self.server.submit(json.loads(self.rfile.read(length)))
+        except ValueError as e:
+            # includes JSON decoding errors
+            self._send(400, {"error": str(e)})
+            return
+        if parse_qs(url.query).get("wait", ["0"])[0] not in ("", "0"):
+            self._send(200, self.server.status(job_id, block=True))
+        else:
+            self._send(202, self.server.status(job_id))
+
+    def do_DELETE(self):
+        url = urlparse(self.path)
+        self._job_request(
+            url,
+            lambda job_id: {
+                "id": job_id,
+                "cancelled": self.server.cancel(job_id),
+            },
+        )
+
+    def _job_request(self, url, method):
+        """
+        Call `method` with the job ID in a /jobs/<id> path
+        """
+        parts = url.path.strip("/").split("/")
+        if len(parts) != 2 or parts[0] != "jobs":
+            self._send(404, {"error": f"Unknown path {url.path}"})
+            return
+        try:
+            body = method(parts[1])
+        except KeyError:
+            # the job never existed or has been dropped
+            self._send(404, {"error": f"Unknown job {parts[1]}"})
+            return
+        self._send(200, body)
+
+    def _send(self, code, body):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # requests are not logged
+        pass
+
+
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    num_workers: int = 1,
+    microdata: list = ["CPS"],
+    processes: bool = True,
+    results_dir=None,
+    job_ttl: float = 3600,
+    max_jobs: int = 1000,
+    baseline_cache_size: int = BASELINE_CACHE_SIZE,
+):
+    """
+    Run a scoring server until it is interrupted
+
+    Parameters
+    ----------
+    host: str
+        address to listen on
+    port: int
+        port to listen on
+    num_workers: int
+        number of jobs to run at once
+    microdata: list
+        microdata sources each worker loads before taking jobs
+    processes: bool
+        if True, jobs run in worker processes. Otherwise they run in
+        threads of the server process
+    results_dir: str or Path
+        directory to save the full results of each job in
+    job_ttl: float
+        seconds a finished job and its results are kept
+    max_jobs: int
+        maximum number of finished jobs to keep
+    baseline_cache_size: int
+        number of years of baseline results each worker keeps for later
+        static jobs. A year of CPS results takes about 51 MB with the
+        default variables
+
+    Returns
+    -------
+    None
+    """
+    server = ScoringServer(
+        (host, port),
+        num_workers,
+        microdata,
+        processes,
+        results_dir,
+        job_ttl,
+        max_jobs,
+        baseline_cache_size,
+    )
+    print(f"Serving Tax-Brain on http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def _policy_json(policy):
+    """
+    Years are strings in decoded JSON objects. Tax-Calculator converts them
+    when it reads a reform from JSON text, so Tax-Calculator style reforms
+    are passed to TaxBrain as JSON
+    """
+    if not isinstance(policy, dict) or not policy:
+        return policy
+    if is_paramtools_format(policy):
+        return policy
+    if "policy" not in policy:
+        policy = {"policy": policy}
+    return json.dumps(policy)
+
+
+def _frame_json(df):
+    return json.loads(df.to_json(orient="split"))
+
+
+def _init_worker(microdata, baseline_cache_size=BASELINE_CACHE_SIZE):
+    """
+    Load the records for each microdata source and compile Tax-Calculator's
+    functions before the worker takes any jobs
+    """
+    from taxbrain import TaxBrain
+
+    _baseline_cache.maxsize = baseline_cache_size
+
+    for data in microdata:
+        tb = TaxBrain(TaxBrain.FIRST_BUDGET_YEAR, microdata=data)
+        base_calc, _ = tb._make_calculators(_records_cache)
+        base_calc.calc_all()
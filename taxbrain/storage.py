@@ -0,0 +1,579 @@
+"""
+Functions for saving TaxBrain results to disk in a compressed columnar
+format and reading them back
+"""
+
+import json
+import os
+import threading
+import uuid
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from pathlib import Path
+
+# name of the column used to hold the index in formats that don't store it
+INDEX_COLUMN = "__index__"
+METADATA_FILE = "metadata.json"
+PARAMS_FILE = "params.json"
+CHECKPOINT_FILE = "checkpoint.json"
+# checkpoints are always written as parquet
+CHECKPOINT_FORMAT = "parquet"
+
+
+def _write_parquet(df, path):
+    df.to_parquet(path, compression="zstd")
+
+
+def _read_parquet(path, columns=None):
+    return pd.read_parquet(path, columns=columns)
+
+
+def _write_feather(df, path):
+    # Arrow IPC files can't hold an index so it is saved as a column
+    df.reset_index(names=INDEX_COLUMN).to_feather(path, compression="zstd")
+
+
+def _read_feather(path, columns=None):
+    if columns is not None:
+        columns = [INDEX_COLUMN] + list(columns)
+    df = pd.read_feather(path, columns=columns)
+    return df.set_index(INDEX_COLUMN).rename_axis(None)
+
+
+def _write_hdf5(df, path):
+    df.to_hdf(path, key="data", mode="w", complevel=5, complib="blosc:lz4")
+
+
+def _read_hdf5(path, columns=None):
+    df = pd.read_hdf(path, key="data")
+    if columns is not None:
+        df = df[list(columns)]
+    return df
+
+
+# file extension, writer, and reader for each supported storage format
+FORMATS = {
+    "parquet": (".parquet", _write_parquet, _read_parquet),
+    "feather": (".arrow", _write_feather, _read_feather),
+    "hdf5": (".h5", _write_hdf5, _read_hdf5),
+}
+
+
+def _check_format(format):
+    """
+    Raise an error if the storage format isn't supported
+    """
+    if format not in FORMATS:
+        msg = f"'{format}' is not a valid format. Options are {list(FORMATS)}"
+        raise ValueError(msg)
+
+
+def partition_path(path, calc: str, year: int, format: str = "parquet"):
+    """
+    Path to the file holding one year of results for one calculator
+
+    Parameters
+    ----------
+    path: str or Path
+        directory holding the results
+    calc: str
+        'base' or 'reform'
+    year: int
+        year of results
+    format: str
+        storage format
+
+    Returns
+    -------
+    Path
+        path to the file
+    """
+    _check_format(format)
+    return Path(path, calc, f"{year}{FORMATS[format][0]}")
+
+
+def write_frame(df, path, format: str = "parquet"):
+    """
+    Write a DataFrame to disk. The file is written to a temporary location
+    first and moved into place once complete so that a partially written
+    file is never left at `path`.
+
+    Parameters
+    ----------
+    df: Pandas DataFrame
+        data to write
+    path: str or Path
+        final location of the file
+    format: str
+        storage format. Options are the keys of FORMATS
+
+    Returns
+    -------
+    None
+    """
+    _check_format(format)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # the temporary name is unique so that concurrent writes of the same
+    # file don't move each other's temporary files
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    FORMATS[format][1](df, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def read_frame(path, format: str = "parquet", columns: list = None):
+    """
+    Read a DataFrame written with `write_frame`
+
+    Parameters
+    ----------
+    path: str or Path
+        location of the file
+    format: str
+        storage format. Options are the keys of FORMATS
+    columns: list
+        columns to read. Defaults to all columns
+
+    Returns
+    -------
+    Pandas DataFrame
+        data stored in the file
+    """
+    _check_format(format)
+    return FORMATS[format][2](path, columns=columns)
+
+
+def write_json(obj, path):
+    """
+    Write an object to a JSON file, converting NumPy values to their
+    Python equivalents
+
+    Parameters
+    ----------
+    obj: dict
+        object to write
+    path: str or Path
+        location of the file
+
+    Returns
+    -------
+    None
+    """
+
+    def default(value):
+        if isinstance(value, np.generic):
+            return value.item()
+        elif isinstance(value, np.ndarray):
+            return value.tolist()
+        raise TypeError(f"{type(value)} is not JSON serializable")
+
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp_path.write_text(json.dumps(obj, indent=2, default=default))
+    os.replace(tmp_path, path)
+
+
+def read_json(path, year_level: int = None):
+    """
+    Read a JSON file written with `write_json`. Years used as dictionary
+    keys, such as those in a reform, were converted to strings when the
+    file was written. They are converted back in the dictionaries at
+    `year_level`.
+
+    Parameters
+    ----------
+    path: str or Path
+        location of the file
+    year_level: int
+        depth of the dictionaries keyed by year, where the top level
+        dictionary is at depth 0. For example, the years in parameters
+        saved by `save_results` are at depth 2, under each section and
+        parameter name. If None, no keys are converted
+
+    Returns
+    -------
+    dict
+        contents of the file
+    """
+
+    def restore_keys(obj, level):
+        if isinstance(obj, dict):
+            return {
+                (
+                    int(key) if level == year_level and key.isdigit() else key
+                ): restore_keys(value, level + 1)
+                for key, value in obj.items()
+            }
+        return obj
+
+    return restore_keys(json.loads(Path(path).read_text()), 0)
+
+
+class YearPartitions(MutableMapping):
+    """
+    Dictionary-like container of yearly results that reads each year from
+    disk the first time it is accessed. Used for TaxBrain objects loaded
+    from saved results and for TaxBrain objects that spill results to
+    disk. If the number of years held in memory is capped, the least
+    recently used years are dropped from memory once the cap is reached,
+    after being written to disk if they aren't already there.
+    """
+
+    def __init__(
+        self,
+        path,
+        calc: str,
+        years: list,
+        format="parquet",
+        max_in_memory: int = None,
+    ):
+        """
+        Parameters
+        ----------
+        path: str or Path
+            directory holding the results
+        calc: str
+            'base' or 'reform'
+        years: list
+            years available in the results
+        format: str
+            storage format of the results
+        max_in_memory: int
+            maximum number of years to hold in memory. If None, every year
+            that has been accessed is kept in memory
+
+        Returns
+        -------
+        None
+        """
+        _check_format(format)
+        if max_in_memory is not None and max_in_memory < 1:
+            raise ValueError("'max_in_memory' must be at least 1")
+        self.path = Path(path)
+        self.calc = calc
+        self.format = format
+        self.max_in_memory = max_in_memory
+        self._years = list(years)
+        # years in memory, ordered from least to most recently used
+        self._loaded = OrderedDict()
+        # years whose data on disk matches the data in memory
+        self._on_disk = set(years)
+        # tables read years from several threads at once
+        self._lock = threading.RLock()
+
+    def __getitem__(self, year):
+        with self._lock:
+            if year in self._loaded:
+                self._loaded.move_to_end(year)
+                return self._loaded[year]
+            if year not in self._years:
+                raise KeyError(year)
+            df = read_frame(
+                partition_path(self.path, self.calc, year, self.format),
+                self.format,
+            )
+            self._loaded[year] = df
+            self._evict()
+            return df
+
+    def __setitem__(self, year, df):
+        with self._lock:
+            if year not in self._years:
+                self._years.append(year)
+            self._loaded[year] = df
+            self._loaded.move_to_end(year)
+            self._on_disk.discard(year)
+            self._evict()
+
+    def __delitem__(self, year):
+        with self._lock:
+            self._years.remove(year)
+            self._loaded.pop(year, None)
+            self._on_disk.discard(year)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def is_loaded(self, year) -> bool:
+        """
+        Whether a year has been read into memory
+        """
+        with self._lock:
+            return year in self._loaded
+
+    def release(self, year):
+        """
+        Drop a year from memory. It is written to disk first if needed and
+        will be read from disk again the next time it is accessed.
+        """
+        with self._lock:
+            if year not in self._loaded:
+                return
+            if year not in self._on_disk:
+                write_frame(
+                    self._loaded[year],
+                    partition_path(self.path, self.calc, year, self.format),
+                    self.format,
+                )
+                self._on_disk.add(year)
+            del self._loaded[year]
+
+    def _evict(self):
+        """
+        Release the least recently used years until the number of years in
+        memory is within the cap. Called with the lock held
+        """
+        if self.max_in_memory is None:
+            return
+        while len(self._loaded) > self.max_in_memory:
+            self.release(next(iter(self._loaded)))
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._years))
+
+    def __len__(self):
+        return len(self._years)
+
+
+def load_results(path, max_years_in_memory: int = None):
+    """
+    Read the metadata, parameters, and stacked revenue table saved with
+    `save_results` and set up lazy access to the yearly data
+
+    Parameters
+    ----------
+    path: str or Path
+        directory holding the results
+    max_years_in_memory: int
+        maximum number of years of each calculator's data to hold in
+        memory at once. If None, there is no limit
+
+    Returns
+    -------
+    results: dict
+        dictionary with the metadata, parameters, stacked table (None if
+        it wasn't saved), and YearPartitions for the baseline and reform
+    """
+    path = Path(path)
+    metadata_path = Path(path, METADATA_FILE)
+    if not metadata_path.exists():
+        raise FileNotFoundError(f"No saved TaxBrain results found in {path}")
+    metadata = read_json(metadata_path)
+    format = metadata["format"]
+    years = list(range(metadata["start_year"], metadata["end_year"] + 1))
+    stacked_path = Path(path, f"stacked_table{FORMATS[format][0]}")
+    stacked_table = None
+    if stacked_path.exists():
+        stacked_table = read_frame(stacked_path, format)
+        stacked_table.columns = [
+            int(col) if col.isdigit() else col for col in stacked_table.columns
+        ]
+    results = {
+        "metadata": metadata,
+        "params": read_json(Path(path, PARAMS_FILE), year_level=2),
+        "stacked_table": stacked_table,
+        "base_data": YearPartitions(
+            path, "base", years, format, max_years_in_memory
+        ),
+        "reform_data": YearPartitions(
+            path, "reform", years, format, max_years_in_memory
+        ),
+    }
+    return results
+
+
+def save_results(tb, path, format: str = "parquet"):
+    """
+    Save the results of a TaxBrain run. The baseline and reform data are
+    written one year at a time to a file for each year and calculator,
+    along with the stacked revenue table, if there is one, and the
+    parameters used for the run.
+
+    Parameters
+    ----------
+    tb: TaxBrain object
+        TaxBrain object with results to save
+    path: str or Path
+        directory to save the results in. It will be created if it
+        doesn't exist
+    format: str
+        storage format. Options are 'parquet', 'feather' (Arrow IPC), and
+        'hdf5'
+
+    Returns
+    -------
+    None
+        results are saved to disk
+    """
+    _check_format(format)
+    if not tb.has_run:
+        raise ValueError("TaxBrain.run() must be called before saving")
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    years = list(range(tb.start_year, tb.end_year + 1))
+    for year in years:
+        write_frame(
+            tb.base_data[year],
+            partition_path(path, "base", year, format),
+            format,
+        )
+        write_frame(
+            tb.reform_data[year],
+            partition_path(path, "reform", year, format),
+            format,
+        )
+    write_metadata(tb, path, format)
+
+
+def write_metadata(tb, path, format: str = "parquet"):
+    """
+    Write the metadata, parameters, and stacked revenue table, if there is
+    one, for a set of results whose yearly data is already on disk
+
+    Parameters
+    ----------
+    tb: TaxBrain object
+        TaxBrain object the results came from
+    path: str or Path
+        directory holding the results
+    format: str
+        storage format of the results
+
+    Returns
+    -------
+    None
+    """
+    stacked_table = getattr(tb, "stacked_table", None)
+    if stacked_table is not None:
+        # columnar formats require string column names
+        stacked_table = stacked_table.rename(columns=str)
+        write_frame(
+            stacked_table,
+            Path(path, f"stacked_table{FORMATS[format][0]}"),
+            format,
+        )
+    metadata = {
+        "format": format,
+        "start_year": tb.start_year,
+        "end_year": tb.end_year,
+        "microdata": tb.microdata if isinstance(tb.microdata, str) else None,
+        "stacked": tb.stacked,
+        "corp_revenue": tb.corp_revenue,
+        "corp_incidence_assumptions": tb.ci_params,
+        "versions": tb.VERSIONS,
+        "memory_usage": getattr(tb, "memory_usage", None),
+    }
+    write_json(metadata, Path(path, METADATA_FILE))
+    write_json(tb.params, Path(path, PARAMS_FILE))
+
+
+def open_checkpoint(path, input_hash: str, varlist: list) -> list:
+    """
+    Start a checkpoint for a run or pick up an existing one. A checkpoint
+    can only be resumed by a run with the same inputs and variables.
+
+    Parameters
+    ----------
+    path: str or Path
+        directory holding the checkpoint. It will be created if it
+        doesn't exist
+    input_hash: str
+        hash of the run's inputs, from TaxBrain.input_hash
+    varlist: list
+        variables stored in each year
+
+    Returns
+    -------
+    list
+        years already completed
+    """
+    path = Path(path)
+    manifest_path = Path(path, CHECKPOINT_FILE)
+    varlist = sorted(set(varlist))
+    if manifest_path.exists():
+        manifest = read_json(manifest_path)
+        if manifest["input_hash"] != input_hash:
+            msg = (
+                f"The checkpoint in {path} was created by a run with "
+                "different inputs. Use a different checkpoint directory."
+            )
+            raise ValueError(msg)
+        if manifest["varlist"] != varlist:
+            msg = (
+                f"The checkpoint in {path} stores different variables. "
+                "Use a different checkpoint directory."
+            )
+            raise ValueError(msg)
+        return manifest["completed"]
+    path.mkdir(parents=True, exist_ok=True)
+    manifest = {"input_hash": input_hash, "varlist": varlist, "completed": []}
+    write_json(manifest, manifest_path)
+    return []
+
+
+def write_checkpoint_year(path, year: int, base_df, reform_df):
+    """
+    Save one finished year of a run to a checkpoint. The year is only
+    marked as completed once both frames are on disk.
+
+    Parameters
+    ----------
+    path: str or Path
+        directory holding the checkpoint
+    year: int
+        year of results
+    base_df: Pandas DataFrame
+        baseline data for the year
+    reform_df: Pandas DataFrame
+        reform data for the year
+
+    Returns
+    -------
+    None
+    """
+    for calc, df in [("base", base_df), ("reform", reform_df)]:
+        write_frame(
+            df,
+            partition_path(path, calc, year, CHECKPOINT_FORMAT),
+            CHECKPOINT_FORMAT,
+        )
+    manifest_path = Path(path, CHECKPOINT_FILE)
+    manifest = read_json(manifest_path)
+    manifest["completed"] = sorted(set(manifest["completed"]) | {year})
+    write_json(manifest, manifest_path)
+
+
+def read_checkpoint_year(path, year: int):
+    """
+    Read one completed year of a run from a checkpoint
+
+    Parameters
+    ----------
+    path: str or Path
+        directory holding the checkpoint
+    year: int
+        year of results
+
+    Returns
+    -------
+    base_df: Pandas DataFrame
+        baseline data for the year
+    reform_df: Pandas DataFrame
+        reform data for the year
+    """
+    return tuple(
+        read_frame(
+            partition_path(path, calc, year, CHECKPOINT_FORMAT),
+            CHECKPOINT_FORMAT,
+        )
+        for calc in ["base", "reform"]
+    )
@@ -0,0 +1,114 @@
+"""
+Synthetic microdata for testing and benchmarking Tax-Brain at scale without
+access to the PUF or TMD files. Records are resampled from the CPS file
+installed with Tax-Calculator, so their joint distribution is close to the
+CPS, and each record's income and benefits are scaled by a random factor so
+that no two copies of a CPS record are identical.
+"""
+
+import json
+import os
+import numpy as np
+import pandas as pd
+import taxcalc as tc
+
+# variables that are the sum of a taxpayer and spouse variable
+SPLIT_VARIABLES = ["e00200", "e00900", "e02100"]
+
+
+def synthetic_microdata(
+    scale: float = 1, seed: int = 0, sigma: float = 0.1
+) -> dict:
+    """
+    Create synthetic Tax-Calculator records by resampling the CPS. Each
+    CPS record is copied `scale` times, rounded down, and the remaining
+    records are sampled without replacement. Weights are divided by
+    `scale` so that weighted totals match the CPS.
+
+    Parameters
+    ----------
+    scale: float
+        number of synthetic records for each CPS record. 1 creates as many
+        records as the CPS, 50 creates 50 times as many
+    seed: int
+        seed for the random number generator. The same seed and scale
+        always create the same records
+    sigma: float
+        standard deviation of the log of the factor each record's dollar
+        amounts are multiplied by. The factors have a mean of 1. If 0, the
+        dollar amounts aren't changed
+
+    Returns
+    -------
+    microdata: dict
+        dictionary with the records ("data"), their "weights", the
+        "start_year" of the data, and the "growfactors" used to
+        extrapolate them, which can be passed to TaxBrain as `microdata`.
+        The default Tax-Calculator growth factors are used, as they are
+        for the CPS
+    """
+    if scale <= 0:
+        raise ValueError("scale must be greater than 0")
+    if sigma < 0:
+        raise ValueError("sigma must not be negative")
+    cps = pd.read_csv(os.path.join(tc.Records.CODE_PATH, "cps.csv.gz"))
+    weights = pd.read_csv(
+        os.path.join(tc.Records.CODE_PATH, "cps_weights.csv.gz")
+    )
+    rng = np.random.default_rng(seed)
+    num_records = len(cps)
+    copies = int(scale)
+    extra = int(round((scale - copies) * num_records))
+    index = np.concatenate(
+        [
+            np.tile(np.arange(num_records), copies),
+            np.sort(rng.choice(num_records, extra, replace=False)),
+        ]
+    )
+    if not len(index):
+        raise ValueError("scale is too small to create any records")
+    data = cps.iloc[index].reset_index(drop=True)
+    weights = weights.iloc[index].reset_index(drop=True) / scale
+    data["s006"] = data["s006"] / scale
+    data["RECID"] = np.arange(1, len(data) + 1)
+    # scale every dollar amount in a record by the same factor so that
+    # relationships between them, such as e00600 >= e00650, still hold
+    factor = rng.lognormal(-(sigma**2) / 2, sigma, len(data))
+    for var in dollar_variables(data.columns):
+        data[var] = np.round(data[var] * factor)
+    for var in SPLIT_VARIABLES:
+        data[var] = data[f"{var}p"] + data[f"{var}s"]
+    return {
+        "data": data,
+        "weights": weights,
+        "start_year": tc.Records.CPSCSV_YEAR,
+        "growfactors": None,
+    }
+
+
+def dollar_variables(columns) -> list:
+    """
+    Variables in a set of Tax-Calculator input columns that hold dollar
+    amounts
+
+    Parameters
+    ----------
+    columns: list
+        names of the input variables
+
+    Returns
+    -------
+    list
+        names of the variables that hold dollar amounts, which excludes
+        the sample weight
+    """
+    path = os.path.join(tc.Records.CODE_PATH, "records_variables.json")
+    with open(path) as f:
+        read_vars = json.load(f)["read"]
+    return [
+        var
+        for var in columns
+        if var in read_vars
+        and read_vars[var]["type"] == "float"
+        and var != "s006"
+    ]
@@ -8,15 +8,122 @@ from taxcalc.utils import (
     create_distribution_table,
     create_difference_table,
 )
-from dask import compute, delayed
-import dask.multiprocessing
+import asyncio
+import copy
+import functools
+import inspect
+import shutil
+import tempfile
+import weakref
 from collections import defaultdict
-from taxbrain.utils import weighted_sum, update_policy
+from taxbrain.utils import weighted_sum, update_policy, hash_inputs
+from taxbrain.aio import run_in_process
+from taxbrain.progress import ProgressTracker
+from taxbrain.timing import (
+    stage,
+    timed,
+    track_memory,
+    memory_usage,
+    worker_options,
+    worker_call,
+    worker_result,
+)
+from taxbrain.quantiles import distribution_stats
+from taxbrain.storage import (
+    save_results,
+    read_frame,
+    partition_path,
+    load_results,
+    YearPartitions,
+    write_metadata,
+    open_checkpoint,
+    write_checkpoint_year,
+    read_checkpoint_year,
+    CHECKPOINT_FORMAT,
+)
 from taxbrain.corporate_incidence import distribute as dist_corp
 from typing import Union
 from paramtools import ValidationError
 from pathlib import Path
 
+# attributes set by TaxBrain.run, other than the yearly results
+RUN_ATTRIBUTES = ["has_run", "memory_usage", "stacked_table"]
+
+
+def _cache_key(value):
+    """
+    Convert an argument to a TaxBrain table method into a hashable value
+    that can be used as part of a cache key
+    """
+    if isinstance(value, (list, tuple)):
+        return tuple(_cache_key(v) for v in value)
+    elif isinstance(value, (set, frozenset)):
+        return frozenset(_cache_key(v) for v in value)
+    return value
+
+
+def _memoize_table(method):
+    """
+    Decorator that caches the tables returned by a TaxBrain method. Tables
+    are keyed by the method name and its arguments and a copy is returned
+    on each call so callers cannot modify the cached table. The cache is
+    cleared whenever TaxBrain.run() is called.
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        key = (method.__name__,) + tuple(
+            _cache_key(value)
+            for name, value in bound.arguments.items()
+            if name != "self"
+        )
+        with stage(method.__name__):
+            try:
+                hash(key)
+            except TypeError:
+                # arguments that can't be hashed are never cached
+                return method(self, *args, **kwargs)
+            if key not in self._table_cache:
+                self._table_cache[key] = method(self, *args, **kwargs)
+            return self._table_cache[key].copy()
+
+    return wrapper
+
+
+def _run_copy(
+    tb,
+    path,
+    varlist,
+    num_workers,
+    checkpoint_dir,
+    memory=False,
+    progress=None,
+):
+    """
+    Run a copy of a TaxBrain object in a worker process. Each year's results
+    are written to `path` as soon as they are finished instead of being
+    sent back to the parent process, which only receives the other
+    attributes set by `run`.
+    """
+    tb.base_data = YearPartitions(path, "base", [], max_in_memory=1)
+    tb.reform_data = YearPartitions(path, "reform", [], max_in_memory=1)
+    tb.run(
+        varlist,
+        num_workers=num_workers,
+        checkpoint_dir=checkpoint_dir,
+        progress=progress,
+        memory=memory,
+    )
+    for data in [tb.base_data, tb.reform_data]:
+        for year in data:
+            data.release(year)
+    return {
+        attr: getattr(tb, attr) for attr in RUN_ATTRIBUTES if hasattr(tb, attr)
+    }
+
 
 class TaxBrain:
 
@@ -36,6 +143,15 @@ class TaxBrain:
     TMD_WEIGHTS_FILE = "tmd_weights.csv.gz"
     TMD_GROWFACTORS_FILE = "tmd_growfactors.csv"
 
+    # methods that can be called with atable
+    TABLE_METHODS = [
+        "weighted_totals",
+        "multi_var_table",
+        "distribution_table",
+        "differences_table",
+        "inequality_table",
+    ]
+
     def __init__(
         self,
         start_year: int,
@@ -49,6 +165,8 @@ class TaxBrain:
         corp_incidence_assumptions: dict = None,
         verbose=False,
         stacked=False,
+        max_years_in_memory: int = None,
+        spill_dir: Union[str, Path] = None,
     ):
         """
         Constructor for the TaxBrain class
@@ -98,6 +216,15 @@ class TaxBrain:
         stacked: bool
             A boolean value indicating weather the provided reform is in the
             format used for stacked reform analysis
+        max_years_in_memory: int
+            Maximum number of years of baseline and reform results to
+            hold in memory at once. Other years are written to compressed
+            files in `spill_dir` and read back when they are used. If
+            None, all results are held in memory.
+        spill_dir: str or Path
+            Directory to write results to when `max_years_in_memory` is
+            set. Defaults to a temporary directory that is removed when
+            the TaxBrain object is deleted.
 
         Returns
         -------
@@ -125,13 +252,34 @@ class TaxBrain:
         self.microdata = microdata
         self.start_year = start_year
         self.end_year = end_year
-        self.base_data = {yr: {} for yr in range(start_year, end_year + 1)}
-        self.reform_data = {yr: {} for yr in range(start_year, end_year + 1)}
+        if max_years_in_memory is None:
+            self.base_data = {yr: {} for yr in range(start_year, end_year + 1)}
+            self.reform_data = {
+                yr: {} for yr in range(start_year, end_year + 1)
+            }
+        else:
+            if spill_dir is None:
+                spill_dir = tempfile.mkdtemp(prefix="taxbrain-")
+                weakref.finalize(
+                    self, shutil.rmtree, spill_dir, ignore_errors=True
+                )
+            self.base_data = YearPartitions(
+                spill_dir, "base", [], max_in_memory=max_years_in_memory
+            )
+            self.reform_data = YearPartitions(
+                spill_dir, "reform", [], max_in_memory=max_years_in_memory
+            )
         self.corp_revenue = corp_revenue
         self.ci_params = corp_incidence_assumptions
         self.verbose = verbose
         self.stacked = stacked
         self.stacked_reforms = None  # only used if stacked is true
+        # sort permutations shared by the quantile functions
+        self._sort_orders = {}
+        # tables created by the table methods, keyed by method and arguments
+        self._table_cache = {}
+        # objects loaded from saved results can't be run again
+        self._read_only = False
 
         # Process user inputs early to throw any errors quickly
         self.params = self._process_user_mods(reform, assump)
@@ -143,9 +291,19 @@ class TaxBrain:
             self.params["base_policy"] = None
 
         self.has_run = False
+        # memory used by each stage of the last run, if it was recorded
+        self.memory_usage = None
 
     def run(
-        self, varlist: list = DEFAULT_VARIABLES, client=None, num_workers=1
+        self,
+        varlist: list = DEFAULT_VARIABLES,
+        client=None,
+        num_workers=1,
+        checkpoint_dir: Union[str, Path] = None,
+        records_cache: dict = None,
+        progress=None,
+        memory: bool = False,
+        baseline_cache: dict = None,
     ):
         """
         Run the calculators. TaxBrain will determine whether to do a static or
@@ -156,6 +314,41 @@ class TaxBrain:
         ----------
         varlist: list
             variables from the microdata to be stored in each year
+        checkpoint_dir: str or Path
+            directory to save each year's results in as soon as it is
+            finished. If a previous run with the same inputs was
+            interrupted, the years it completed are read from the
+            directory instead of being run again. Once the run is complete
+            the directory can be opened with TaxBrain.load. Not supported
+            for stacked reforms.
+        records_cache: dict
+            records and current law policies created in earlier runs, keyed
+            by microdata source and growth assumptions. Long running
+            processes can pass the same dictionary to each run so that
+            records for "CPS", "PUF", and "TMD" are only created once. New
+            records are added to it.
+        progress: function
+            called with a dictionary describing each progress event. The
+            run is split into tasks for each year and calculator ("side"),
+            or for each year and "provision" of a stacked reform, and an
+            event is sent when each one starts and finishes. Events also
+            include the number of tasks "completed" out of the "total",
+            the seconds "elapsed", and an "eta" in seconds. See
+            taxbrain.progress
+        memory: bool
+            whether to record the peak memory allocated and the peak
+            resident set size of each stage of the run, such as creating
+            the records and each year's calculations. The results are
+            saved in the `memory_usage` attribute and in the metadata of
+            saved results and checkpoints. Tracing allocations slows the
+            run down. See taxbrain.timing
+        baseline_cache: dict
+            baseline results from earlier static runs, keyed by the inputs
+            that determine them and the year. Long running processes can
+            pass the same dictionary to each run so that the baseline for a
+            year is only calculated once for each microdata source,
+            baseline policy, and set of growth assumptions. New results are
+            added to it. Dynamic and stacked runs don't use it.
 
         Returns
         -------
@@ -164,30 +357,183 @@ class TaxBrain:
         if not isinstance(varlist, list):
             msg = f"'varlist' is of type {type(varlist)}. Must be a list."
             raise TypeError(msg)
-        if self.stacked:
-            base_calc, policy, records = self._make_stacked_objects()
-            self._stacked_run(
-                varlist, base_calc, policy, records, client, num_workers
+        if self._read_only:
+            msg = (
+                "This TaxBrain object was loaded from saved results and "
+                "can't be run"
             )
-            del base_calc
-        else:
-            base_calc, reform_calc = self._make_calculators()
-            if self.params["behavior"]:
-                if self.verbose:
-                    print("Running dynamic simulations")
-                self._dynamic_run(
-                    varlist, base_calc, reform_calc, client, num_workers
+            raise ValueError(msg)
+        with track_memory(memory) as spans, stage("run"):
+            completed_years = []
+            if checkpoint_dir is not None:
+                if self.stacked:
+                    msg = "Checkpoints are not supported for stacked reforms"
+                    raise ValueError(msg)
+                checkpoint_vars = varlist + ["s006"]
+                completed_years = open_checkpoint(
+                    checkpoint_dir, self.input_hash(), checkpoint_vars
                 )
-            else:
-                if self.verbose:
-                    print("Running static simulations")
-                self._static_run(
-                    varlist, base_calc, reform_calc, client, num_workers
+            # results are about to change so cached values are stale
+            self.clear_cache()
+            num_years = self.end_year - self.start_year + 1
+            if self.stacked:
+                tracker = ProgressTracker(
+                    progress, num_years * (len(self.stacked_reforms) + 1)
+                )
+                base_calc, policy, records = self._make_stacked_objects()
+                self._stacked_run(
+                    varlist,
+                    base_calc,
+                    policy,
+                    records,
+                    client,
+                    num_workers,
+                    tracker,
                 )
-            del base_calc, reform_calc
+                del base_calc
+            else:
+                base_calc, reform_calc = self._make_calculators(records_cache)
+                if self.params["behavior"]:
+                    tracker = ProgressTracker(progress, num_years)
+                    if self.verbose:
+                        print("Running dynamic simulations")
+                    self._dynamic_run(
+                        varlist,
+                        base_calc,
+                        reform_calc,
+                        client,
+                        num_workers,
+                        checkpoint_dir,
+                        completed_years,
+                        tracker,
+                    )
+                else:
+                    tracker = ProgressTracker(progress, 2 * num_years)
+                    if self.verbose:
+                        print("Running static simulations")
+                    self._static_run(
+                        varlist,
+                        base_calc,
+                        reform_calc,
+                        client,
+                        num_workers,
+                        checkpoint_dir,
+                        completed_years,
+                        tracker,
+                        baseline_cache,
+                    )
+                del base_calc, reform_calc
+        self.memory_usage = memory_usage(spans) if memory else None
 
         setattr(self, "has_run", True)
+        if checkpoint_dir is not None:
+            write_metadata(self, checkpoint_dir, CHECKPOINT_FORMAT)
+
+    async def arun(
+        self,
+        varlist: list = DEFAULT_VARIABLES,
+        num_workers=1,
+        checkpoint_dir: Union[str, Path] = None,
+        timeout: float = None,
+        progress=None,
+        memory: bool = False,
+    ):
+        """
+        Run the calculators in a separate process without blocking the
+        event loop. The process writes each year's results to a temporary
+        directory, and they are read back once the run is finished. If the
+        awaiting task is cancelled or the timeout passes, the process is
+        stopped and the TaxBrain object is left as it was.
+
+        Parameters
+        ----------
+        varlist: list
+            variables from the microdata to be stored in each year
+        num_workers: int
+            number of workers passed to `run`
+        checkpoint_dir: str or Path
+            checkpoint directory passed to `run`. Years completed before a
+            run was cancelled are not run again
+        timeout: float
+            seconds to wait for the run before raising TimeoutError
+        progress: function or coroutine function
+            called in the event loop with each progress event. See `run`
+        memory: bool
+            whether to record the memory used by each stage. See `run`
+
+        Returns
+        -------
+        None
+        """
+        if isinstance(self.base_data, YearPartitions):
+            msg = "arun is not supported with max_years_in_memory"
+            raise ValueError(msg)
+        path = tempfile.mkdtemp(prefix="taxbrain-")
+        try:
+            # stages timed in the worker process are added to the current
+            # timer
+            result = await run_in_process(
+                worker_call,
+                worker_options(),
+                _run_copy,
+                self,
+                path,
+                varlist,
+                num_workers,
+                checkpoint_dir,
+                memory,
+                timeout=timeout,
+                progress=progress,
+            )
+            attributes = worker_result(result)
+            # read the results one year at a time in a separate thread so
+            # that the event loop isn't blocked. They replace the current
+            # results only once all of them are read, so a cancelled read
+            # leaves the object as it was
+            results = {"base": {}, "reform": {}}
+            for yr in range(self.start_year, self.end_year + 1):
+                for calc, data in results.items():
+                    data[yr] = await asyncio.to_thread(
+                        read_frame, partition_path(path, calc, yr)
+                    )
+            self.clear_cache()
+            self.base_data.update(results["base"])
+            self.reform_data.update(results["reform"])
+            self.__dict__.update(attributes)
+        finally:
+            await asyncio.to_thread(shutil.rmtree, path, ignore_errors=True)
 
+    async def atable(
+        self, method: str, *args, timeout: float = None, **kwargs
+    ) -> pd.DataFrame:
+        """
+        Create a table in a separate thread without blocking the event loop.
+        Tables are created from the results held by this object, which
+        would have to be copied to use another process.
+
+        Parameters
+        ----------
+        method: str
+            name of the table method to call. One of TABLE_METHODS
+        args: positional arguments
+            arguments passed to the method
+        timeout: float
+            seconds to wait for the table before raising TimeoutError
+        kwargs: keyword arguments
+            additional arguments passed to the method
+
+        Returns
+        -------
+        Pandas DataFrame
+            table returned by the method
+        """
+        if method not in self.TABLE_METHODS:
+            msg = f"method must be one of {self.TABLE_METHODS}, not {method}"
+            raise ValueError(msg)
+        table = asyncio.to_thread(getattr(self, method), *args, **kwargs)
+        return await asyncio.wait_for(table, timeout)
+
+    @_memoize_table
     def weighted_totals(
         self, var: str, include_total: bool = False
     ) -> pd.DataFrame:
@@ -228,6 +574,7 @@ class TaxBrain:
             table["Total"] = table.sum(axis=1)
         return table
 
+    @_memoize_table
     def multi_var_table(
         self, varlist: list, calc: str, include_total: bool = False
     ) -> pd.DataFrame:
@@ -273,6 +620,7 @@ class TaxBrain:
             table["Total"] = table.sum(axis=1)
         return table
 
+    @_memoize_table
     def distribution_table(
         self,
         year: int,
@@ -334,6 +682,7 @@ class TaxBrain:
         )
         return table
 
+    @_memoize_table
     def differences_table(
         self,
         year: int,
@@ -370,7 +719,178 @@ class TaxBrain:
         )
         return table
 
+    @_memoize_table
+    def inequality_table(
+        self,
+        var: str = "aftertax_income",
+        metrics: list = ["gini", "top_1_share", "palma"],
+        poverty_line: float = None,
+        num_workers: int = None,
+    ) -> pd.DataFrame:
+        """
+        Create a table of inequality metrics for the baseline and reform
+        in each year of the analysis. Years are computed in parallel
+        threads and share the sort orders cached on the TaxBrain object.
+
+        Parameters
+        ----------
+        var: str
+            Variable used to measure inequality
+        metrics: list
+            Metrics to include in the table. Options are 'gini', 'theil',
+            'top_1_share', 'top_10_share', 'bottom_40_share', 'palma',
+            'poverty_rate', and 'poverty_gap'
+        poverty_line: float
+            Poverty threshold. Required for 'poverty_rate' and
+            'poverty_gap'
+        num_workers: int
+            Number of threads to use. If None, one thread is used for
+            each year, up to the default size of a Python thread pool
+
+        Returns
+        -------
+        table: Pandas DataFrame
+            A Pandas DataFrame with rows for the baseline value, reform
+            value, and difference of each metric and a column for each
+            year in the analysis.
+        """
+        if not isinstance(metrics, list):
+            msg = f"'metrics' is of type {type(metrics)}. Must be a list."
+            raise TypeError(msg)
+        table = distribution_stats(
+            self,
+            var,
+            stats=metrics,
+            poverty_line=poverty_line,
+            num_workers=num_workers,
+        )
+        return table
+
+    def input_hash(self) -> str:
+        """
+        Create a hash of every input that affects the results of the
+        analysis: the microdata, years, parameters, corporate incidence
+        inputs, and model versions. Two TaxBrain objects with the same
+        hash will produce the same results.
+
+        Returns
+        -------
+        str
+            hexadecimal SHA-256 hash of the inputs
+        """
+        inputs = {
+            "microdata": self.microdata,
+            "start_year": self.start_year,
+            "end_year": self.end_year,
+            "params": self.params,
+            "stacked": self.stacked,
+            "stacked_reforms": self.stacked_reforms,
+            "corp_revenue": self.corp_revenue,
+            "corp_incidence_assumptions": self.ci_params,
+            "versions": self.VERSIONS,
+        }
+        return hash_inputs(inputs)
+
+    def save(self, path: Union[str, Path], format: str = "parquet"):
+        """
+        Save the results of the analysis to a compressed columnar store.
+        The baseline and reform data are written one year at a time, along
+        with the stacked revenue table and the parameters used in the run.
+
+        Parameters
+        ----------
+        path: str or Path
+            Directory to save the results in
+        format: str
+            Storage format. Options are 'parquet', 'feather' (Arrow IPC),
+            and 'hdf5'
+
+        Returns
+        -------
+        None
+            results are saved to disk
+        """
+        save_results(self, path, format)
+
+    @classmethod
+    def load(cls, path: Union[str, Path], max_years_in_memory: int = None):
+        """
+        Create a read-only TaxBrain object from results saved with
+        `TaxBrain.save()`. The data for each year is read from disk the
+        first time it is used, so tables, plots, and reports can be
+        created without running the analysis again.
+
+        Parameters
+        ----------
+        path: str or Path
+            Directory the results were saved in
+        max_years_in_memory: int
+            Maximum number of years of baseline and reform results to
+            hold in memory at once. If None, every year that is used stays
+            in memory.
+
+        Returns
+        -------
+        tb: TaxBrain object
+            TaxBrain object holding the saved results
+        """
+        results = load_results(path, max_years_in_memory)
+        metadata = results["metadata"]
+        tb = cls.__new__(cls)
+        tb.microdata = metadata["microdata"]
+        tb.start_year = metadata["start_year"]
+        tb.end_year = metadata["end_year"]
+        tb.base_data = results["base_data"]
+        tb.reform_data = results["reform_data"]
+        tb.corp_revenue = metadata["corp_revenue"]
+        tb.ci_params = metadata["corp_incidence_assumptions"]
+        tb.verbose = False
+        tb.stacked = metadata["stacked"]
+        tb.stacked_reforms = None
+        if results["stacked_table"] is not None:
+            tb.stacked_table = results["stacked_table"]
+        tb._sort_orders = {}
+        tb._table_cache = {}
+        tb._read_only = True
+        tb.params = results["params"]
+        tb.memory_usage = metadata.get("memory_usage")
+        tb.has_run = True
+        return tb
+
+    def clear_cache(self):
+        """
+        Clear the tables and sort orders cached on the TaxBrain object.
+        This is done automatically each time `run()` is called and only
+        needs to be called directly if `base_data` or `reform_data` are
+        modified by hand.
+
+        Returns
+        -------
+        None
+        """
+        self._table_cache.clear()
+        self._sort_orders.clear()
+
     # ----- private methods -----
+    def _advance_calc(self, calc, year, reform=False):
+        """
+        Advance a calculator to a given year without computing taxes. In
+        the reform calculator, corporate income tax revenue is distributed
+        to individuals.
+        """
+        with stage("advance_to_year", year=year):
+            calc.advance_to_year(year)
+        if self.corp_revenue is not None and reform:
+            with stage("distribute", year=year):
+                calc = dist_corp(
+                    calc,
+                    self.corp_revenue,
+                    year,
+                    self.start_year,
+                    self.ci_params,
+                )
+        return calc
+
     def _taxcalc_advance(self, calc, varlist, year, reform=False):
         """
         This function advances the year used in Tax-Calculator, computes
@@ -385,18 +905,12 @@ class TaxBrain:
             tax_dict (dict): a dictionary of microdata with marginal tax
                 rates and other information computed in TC
         """
-        calc.advance_to_year(year)
-        if self.corp_revenue is not None:
-            if reform:
-                calc = dist_corp(
-                    calc,
-                    self.corp_revenue,
-                    year,
-                    self.start_year,
-                    self.ci_params,
-                )
-        calc.calc_all()
-        df = calc.dataframe(varlist)
+        side = "reform" if reform else "base"
+        calc = self._advance_calc(calc, year, reform)
+        with stage("calc_all", year=year, side=side):
+            calc.calc_all()
+        with stage("dataframe", year=year, side=side):
+            df = calc.dataframe(varlist)
 
         return df
 
@@ -411,53 +925,116 @@ class TaxBrain:
             tax_dict (dict): a dictionary of microdata with marginal tax
                 rates and other information computed in TC
         """
-        base_calc.advance_to_year(year)
-        reform_calc.advance_to_year(year)
-        if self.corp_revenue is not None:
-            reform_calc = dist_corp(
-                reform_calc,
-                self.corp_revenue,
-                year,
-                self.start_year,
-                self.ci_params,
+        base_calc = self._advance_calc(base_calc, year)
+        reform_calc = self._advance_calc(reform_calc, year, reform=True)
+        with stage("behresp.response", year=year):
+            base, reform = behresp.response(
+                base_calc, reform_calc, self.params["behavior"], dump=True
             )
-        base, reform = behresp.response(
-            base_calc, reform_calc, self.params["behavior"], dump=True
-        )
         base_df = base[varlist]
         reform_df = reform[varlist]
 
         return [base_df, reform_df]
 
+    def _gather(self, lazy_values, client, num_workers):
+        """
+        Gather the results of each year with dask
+        """
+        from dask import compute
+        import dask.multiprocessing
+
+        with stage("gather"):
+            if client:
+                futures = client.compute(lazy_values, num_workers=num_workers)
+                return client.gather(futures)
+            return compute(
+                *lazy_values,
+                scheduler=dask.multiprocessing.get,
+                num_workers=num_workers,
+            )
+
     def _static_run(
-        self, varlist, base_calc, reform_calc, client, num_workers
+        self,
+        varlist,
+        base_calc,
+        reform_calc,
+        client,
+        num_workers,
+        checkpoint_dir=None,
+        completed_years=None,
+        tracker=None,
+        baseline_cache=None,
     ):
         """
         Run the calculator for a static analysis
         """
+        if tracker is None:
+            tracker = ProgressTracker()
+        if completed_years is None:
+            completed_years = []
+        from dask import delayed
+
         if "s006" not in varlist:  # ensure weight is always included
             varlist.append("s006")
+        spill = isinstance(self.base_data, YearPartitions)
+        baseline_key = None
+        if baseline_cache is not None and isinstance(self.microdata, str):
+            baseline_inputs = {
+                "base_policy": self.params["base_policy"],
+                "growdiff_baseline": self.params["growdiff_baseline"],
+                "varlist": sorted(set(varlist)),
+            }
+            baseline_key = (self.microdata, hash_inputs(baseline_inputs))
         lazy_values = []
         for yr in range(self.start_year, self.end_year + 1):
-            lazy_values.extend(
-                [
-                    delayed(self._taxcalc_advance(base_calc, varlist, yr)),
-                    delayed(
-                        self._taxcalc_advance(
-                            reform_calc, varlist, yr, reform=True
-                        )
-                    ),
-                ]
-            )
-        if client:
-            futures = client.compute(lazy_values, num_workers=num_workers)
-            results = client.gather(futures)
-        else:
-            results = results = compute(
-                *lazy_values,
-                scheduler=dask.multiprocessing.get,
-                num_workers=num_workers,
-            )
+            if yr in completed_years:
+                # keep the calculators in step with the skipped year.
+                # Corporate income is only distributed to the copy of the
+                # reform calculator used in each year, so it isn't here
+                self._advance_calc(base_calc, yr)
+                self._advance_calc(reform_calc, yr)
+                base_df, reform_df = read_checkpoint_year(checkpoint_dir, yr)
+                tracker.skip(year=yr, side="base")
+                tracker.skip(year=yr, side="reform")
+            else:
+                cache_key = (baseline_key, yr)
+                # look the year up once so that another thread can't drop
+                # it from the cache in between
+                cached = (
+                    None
+                    if baseline_key is None
+                    else baseline_cache.get(cache_key)
+                )
+                if cached is not None:
+                    # keep the calculator in step with the cached year
+                    self._advance_calc(base_calc, yr)
+                    # some tables add columns to the data, so each run
+                    # gets its own copy of the cached results
+                    base_df = cached.copy()
+                    tracker.skip(year=yr, side="base")
+                else:
+                    with tracker.task(year=yr, side="base"):
+                        base_df = self._taxcalc_advance(base_calc, varlist, yr)
+                    if baseline_key is not None:
+                        baseline_cache[cache_key] = base_df.copy()
+                with tracker.task(year=yr, side="reform"):
+                    reform_df = self._taxcalc_advance(
+                        reform_calc, varlist, yr, reform=True
+                    )
+                if checkpoint_dir is not None:
+                    write_checkpoint_year(
+                        checkpoint_dir, yr, base_df, reform_df
+                    )
+            if spill:
+                # store each year as soon as it is finished so that only
+                # max_years_in_memory years are held at once
+                self.base_data[yr] = base_df
+                self.reform_data[yr] = reform_df
+            else:
+                lazy_values.extend([delayed(base_df), delayed(reform_df)])
+        if spill:
+            return
+        results = self._gather(lazy_values, client, num_workers)
 
         # add results to base and reform data
         yr = self.start_year
@@ -469,33 +1046,54 @@ class TaxBrain:
         del results
 
     def _dynamic_run(
-        self, varlist, base_calc, reform_calc, client, num_workers
+        self,
+        varlist,
+        base_calc,
+        reform_calc,
+        client,
+        num_workers,
+        checkpoint_dir=None,
+        completed_years=None,
+        tracker=None,
     ):
         """
         Run a dynamic response
         """
+        if tracker is None:
+            tracker = ProgressTracker()
+        if completed_years is None:
+            completed_years = []
+        from dask import delayed
+
         if "s006" not in varlist:  # ensure weight is always included
             varlist.append("s006")
+        spill = isinstance(self.base_data, YearPartitions)
         lazy_values = []
         for yr in range(self.start_year, self.end_year + 1):
-            lazy_values.extend(
-                [
-                    delayed(
-                        self._behresp_advance(
-                            base_calc, reform_calc, varlist, yr
-                        )
+            if yr in completed_years:
+                # keep the calculators in step with the skipped year.
+                # Corporate income is only distributed to the copy of the
+                # reform calculator used in each year, so it isn't here
+                self._advance_calc(base_calc, yr)
+                self._advance_calc(reform_calc, yr)
+                year_results = list(read_checkpoint_year(checkpoint_dir, yr))
+                tracker.skip(year=yr, side="both")
+            else:
+                # the behavioral response runs both calculators together
+                with tracker.task(year=yr, side="both"):
+                    year_results = self._behresp_advance(
+                        base_calc, reform_calc, varlist, yr
                     )
-                ]
-            )
-        if client:
-            futures = client.compute(lazy_values, num_workers=num_workers)
-            results = client.gather(futures)
-        else:
-            results = results = compute(
-                *lazy_values,
-                scheduler=dask.multiprocessing.get,
-                num_workers=num_workers,
-            )
+                if checkpoint_dir is not None:
+                    write_checkpoint_year(checkpoint_dir, yr, *year_results)
+            if spill:
+                # store each year as soon as it is finished
+                self.base_data[yr], self.reform_data[yr] = year_results
+            else:
+                lazy_values.append(delayed(year_results))
+        if spill:
+            return
+        results = self._gather(lazy_values, client, num_workers)
 
         # add results to base and reform data
         for i in range(len(results)):
@@ -506,34 +1104,41 @@ class TaxBrain:
         del results
 
     def _stacked_run(
-        self, varlist, base_calc, policy, records, client, num_workers
+        self,
+        varlist,
+        base_calc,
+        policy,
+        records,
+        client,
+        num_workers,
+        tracker=None,
     ):
+        from dask import delayed
+
+        if tracker is None:
+            tracker = ProgressTracker()
+
         revenue_output = {}
         BW_len = self.end_year - self.start_year + 1
+        spill = isinstance(self.base_data, YearPartitions)
         # run the base calc first to get baseline results
+        revenue_output["Baseline"] = np.zeros(BW_len)
         lazy_values = []
         for yr in range(self.start_year, self.end_year + 1):
-            lazy_values.append(
-                delayed(self._taxcalc_advance(base_calc, varlist, yr))
-            )
-        if client:
-            futures = client.compute(lazy_values, num_workers=num_workers)
-            results = client.gather(futures)
-        else:
-            results = results = compute(
-                *lazy_values,
-                scheduler=dask.multiprocessing.get,
-                num_workers=num_workers,
-            )
-        # add results to data and revenue outputs
-        revenue_output["Baseline"] = np.zeros(BW_len)
-        yr = self.start_year
-        # for i in np.arange(0, len(results), 2):
-        for i, res in enumerate(results):
-            self.base_data[yr] = res
-            combined = (res["combined"] * res["s006"]).sum()
+            with tracker.task(year=yr, side="base"):
+                base_df = self._taxcalc_advance(base_calc, varlist, yr)
+            combined = (base_df["combined"] * base_df["s006"]).sum()
             revenue_output["Baseline"][yr - self.start_year] = combined
-            yr += 1
+            if spill:
+                # store each year as soon as it is finished
+                self.base_data[yr] = base_df
+            else:
+                lazy_values.append(delayed(base_df))
+        if not spill:
+            results = self._gather(lazy_values, client, num_workers)
+            for i, res in enumerate(results):
+                self.base_data[self.start_year + i] = res
+            del results
         reform_list = list(self.stacked_reforms.keys())
         # Loop over different provisions
         for k, v in self.stacked_reforms.items():
@@ -547,26 +1152,31 @@ class TaxBrain:
             calc = tc.calculator.Calculator(policy=policy, records=records)
             # loop over each year in budget window
             for yr in np.arange(self.start_year, self.end_year + 1):
-                calc.advance_to_year(yr)
-                # change income in accordance with corp income tax
-                # distributed across individual taxpayers
-                if self.corp_revenue is not None:
-                    calc = dist_corp(
-                        calc,
-                        self.corp_revenue,
-                        yr,
-                        self.start_year,
-                        self.ci_params,
+                with tracker.task(year=int(yr), side="reform", provision=k):
+                    with stage("advance_to_year", year=int(yr), provision=k):
+                        calc.advance_to_year(yr)
+                    # change income in accordance with corp income tax
+                    # distributed across individual taxpayers
+                    if self.corp_revenue is not None:
+                        with stage("distribute", year=int(yr), provision=k):
+                            calc = dist_corp(
+                                calc,
+                                self.corp_revenue,
+                                yr,
+                                self.start_year,
+                                self.ci_params,
+                            )
+                    # makes calculations on microdata
+                    with stage("calc_all", year=int(yr), provision=k):
+                        calc.calc_all()
+                    # compute total revenue
+                    revenue_output[k][yr - self.start_year] = (
+                        calc.weighted_total("combined")
                     )
-                # makes calculations on microdata
-                calc.calc_all()
-                # compute total revenue
-                revenue_output[k][yr - self.start_year] = calc.weighted_total(
-                    "combined"
-                )
-                # if we're on the last reform piece, save the data
-                if k == reform_list[-1]:
-                    self.reform_data[yr] = calc.dataframe(varlist)
+                    # if we're on the last reform piece, save the data
+                    if k == reform_list[-1]:
+                        with stage("dataframe", year=int(yr), provision=k):
+                            self.reform_data[yr] = calc.dataframe(varlist)
         df = pd.DataFrame.from_dict(
             revenue_output,
             orient="Index",
@@ -674,63 +1284,16 @@ class TaxBrain:
 
         return params
 
-    def _make_calculators(self):
+    def _make_calculators(self, records_cache=None):
         """
         This function creates the baseline and reform calculators used when
         the `run()` method is called
         """
         # Create two microsimulation calculators
         # Baseline calculator
-        gd_base = tc.GrowDiff()
-        gf_base = tc.GrowFactors()
-        # apply user specified growdiff
-        if self.params["growdiff_baseline"]:
-            gd_base.update_growdiff(self.params["growdiff_baseline"])
-            gd_base.apply_to(gf_base)
-        if self.microdata == "CPS":
-            records = tc.Records.cps_constructor(data=None, gfactors=gf_base)
-        elif self.microdata == "PUF":
-            records = tc.Records.puf_constructor(
-                data="puf.csv",
-                gfactors=gf_base,
-                # weights=tc.Records.PUF_WEIGHTS_FILENAME,
-            )
-        elif self.microdata == "TMD":
-            gf_base = tc.GrowFactors(self.TMD_GROWFACTORS_FILE)
-            if self.params["growdiff_baseline"]:
-                gd_base.apply_to(gf_base)
-
-            records = tc.Records.tmd_constructor(
-                data_path=Path(self.TMD_DATA_FILE),
-                weights_path=Path(self.TMD_WEIGHTS_FILE),
-                growfactors=gf_base,
-            )
-        elif isinstance(self.microdata, dict):
-            if self.microdata["growfactors"] is None:
-                gd_base = tc.GrowDiff()
-                gf_base = tc.GrowFactors()
-                # apply user specified growdiff
-                if self.params["growdiff_baseline"]:
-                    gd_base.update_growdiff(self.params["growdiff_baseline"])
-                    gd_base.apply_to(gf_base)
-            else:
-                gd_base = tc.GrowDiff()
-                gf_base = tc.GrowFactors(self.microdata["growfactors"])
-                # apply user specified growdiff
-                if self.params["growdiff_baseline"]:
-                    gd_base.update_growdiff(self.params["growdiff_baseline"])
-                    gd_base.apply_to(gf_base)
-            records = tc.Records(
-                self.microdata["data"],
-                start_year=self.microdata["start_year"],
-                gfactors=gf_base,
-                weights=self.microdata["weights"],
-            )
-        else:
-            raise ValueError(
-                "microdata must be 'CPS', 'PUF', 'TMD', or a dictionary"
-            )
-        policy = tc.Policy(gf_base)
+        records, policy = self._make_records(
+            self.params["growdiff_baseline"], records_cache
+        )
         if self.params["base_policy"]:
             update_policy(policy, self.params["base_policy"])
         base_calc = tc.Calculator(
@@ -738,70 +1301,84 @@ class TaxBrain:
         )
 
         # Reform calculator
-        gd_reform = tc.GrowDiff()
-        gf_reform = tc.GrowFactors()
+        records, policy = self._make_records(
+            self.params["growdiff_response"], records_cache
+        )
+        if self.params["base_policy"]:
+            update_policy(policy, self.params["base_policy"])
+        update_policy(policy, self.params["policy"])
+
+        # Initialize Calculator
+        reform_calc = tc.Calculator(
+            policy=policy, records=records, verbose=self.verbose
+        )
+        # delete all unneeded variables
+        del records, policy
+        return base_calc, reform_calc
+
+    @timed("records")
+    def _make_records(self, growdiff, records_cache=None):
+        """
+        Create the records for one of the calculators and a current law
+        policy using the same growth factors. If a cache is given, they are
+        only created once for each microdata source and set of growth
+        assumptions. Calculators copy the records they are given, so cached
+        records are never changed.
+        """
+        key = None
+        if records_cache is not None and isinstance(self.microdata, str):
+            key = (self.microdata, hash_inputs(growdiff))
+            if key in records_cache:
+                records, policy = records_cache[key]
+                return records, copy.deepcopy(policy)
+        gd = tc.GrowDiff()
+        gf = tc.GrowFactors()
         # apply user specified growdiff
-        if self.params["growdiff_response"]:
-            gd_reform.update_growdiff(self.params["growdiff_response"])
-            gd_reform.apply_to(gf_reform)
+        if growdiff:
+            gd.update_growdiff(growdiff)
+            gd.apply_to(gf)
         if self.microdata == "CPS":
-            records = tc.Records.cps_constructor(data=None, gfactors=gf_reform)
+            records = tc.Records.cps_constructor(data=None, gfactors=gf)
         elif self.microdata == "PUF":
             records = tc.Records.puf_constructor(
                 data="puf.csv",
-                gfactors=gf_reform,
+                gfactors=gf,
                 # weights=tc.Records.PUF_WEIGHTS_FILENAME,
             )
         elif self.microdata == "TMD":
-            gf_reform = tc.GrowFactors(self.TMD_GROWFACTORS_FILE)
-            if self.params["growdiff_response"]:
-                gd_reform.apply_to(gf_reform)
+            gf = tc.GrowFactors(self.TMD_GROWFACTORS_FILE)
+            if growdiff:
+                gd.apply_to(gf)
 
             records = tc.Records.tmd_constructor(
                 data_path=Path(self.TMD_DATA_FILE),
                 weights_path=Path(self.TMD_WEIGHTS_FILE),
-                growfactors=gf_reform,
+                growfactors=gf,
             )
         elif isinstance(self.microdata, dict):
-            if self.microdata["growfactors"] is None:
-                gd_reform = tc.GrowDiff()
-                gf_reform = tc.GrowFactors()
+            if self.microdata["growfactors"] is not None:
+                gf = tc.GrowFactors(self.microdata["growfactors"])
                 # apply user specified growdiff
-                if self.params["growdiff_response"]:
-                    gd_reform.update_growdiff(self.params["growdiff_response"])
-                    gd_reform.apply_to(gf_reform)
-            else:
-                gd_reform = tc.GrowDiff()
-                gf_reform = tc.GrowFactors(self.microdata["growfactors"])
-                # apply user specified growdiff
-                if self.params["growdiff_response"]:
-                    gd_reform.update_growdiff(self.params["growdiff_response"])
-                    gd_reform.apply_to(gf_reform)
+                if growdiff:
+                    gd.apply_to(gf)
             records = tc.Records(
                 self.microdata["data"],
                 start_year=self.microdata["start_year"],
-                gfactors=gf_reform,
+                gfactors=gf,
                 weights=self.microdata["weights"],
             )
         else:
             raise ValueError(
                 "microdata must be 'CPS', 'PUF', 'TMD', or a dictionary"
             )
-        policy = tc.Policy(gf_reform)
-        if self.params["base_policy"]:
-            update_policy(policy, self.params["base_policy"])
-        update_policy(policy, self.params["policy"])
-
-        # Initialize Calculator
-        reform_calc = tc.Calculator(
-            policy=policy, records=records, verbose=self.verbose
-        )
-        # delete all unneeded variables
-        del gd_base, gd_reform, records, gf_base, gf_reform, policy
-        return base_calc, reform_calc
+        policy = tc.Policy(gf)
+        if key is not None:
+            records_cache[key] = (records, copy.deepcopy(policy))
+        return records, policy
 
     # TODO: update these method to allow for different microdata as above
     # but code becoming cumbersome, so should probably streamline in a single get calculator function
+    @timed("records")
     def _make_stacked_objects(self):
         """
         This method makes the base calculator and policy and records objects
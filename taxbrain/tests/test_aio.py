@@ -0,0 +1,70 @@
+import asyncio
+import multiprocessing
+import signal
+import time
+import pytest
+from taxbrain.aio import run_in_process, _call
+
+
+def count(n, progress=None):
+    for i in range(n):
+        progress(i)
+    return n
+
+
+def fail():
+    raise ValueError("bad input")
+
+
+def ignore_sigterm(seconds):
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    time.sleep(seconds)
+
+
+async def cancel_and_count_ticks():
+    task = asyncio.create_task(run_in_process(ignore_sigterm, 1))
+    await asyncio.sleep(0.3)
+    task.cancel()
+    ticks = 0
+    while not task.done():
+        await asyncio.sleep(0.01)
+        ticks += 1
+    return ticks
+
+
+async def cancel_after(seconds):
+    task = asyncio.create_task(run_in_process(time.sleep, 60))
+    await asyncio.sleep(seconds)
+    task.cancel()
+    await task
+
+
+def test_run_in_process():
+    events = []
+
+    async def record(event):
+        events.append(event)
+
+    assert asyncio.run(run_in_process(count, 3, progress=record)) == 3
+    assert events == [0, 1, 2]
+    with pytest.raises(ValueError, match="bad input"):
+        asyncio.run(run_in_process(fail))
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        asyncio.run(run_in_process(time.sleep, 60, timeout=0.2))
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(cancel_after(0.2))
+    assert time.monotonic() - start < 10
+
+
+def test_call_without_reader():
+    # the worker closes its copy of the read end, so once no other process
+    # holds it, sending results fails instead of blocking
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    with pytest.raises(BrokenPipeError):
+        _call(count, (3,), {}, sender, receiver, True)
+
+
+def test_cancel_does_not_block():
+    # the event loop keeps running while a cancelled process exits
+    assert asyncio.run(cancel_and_count_ticks()) > 10
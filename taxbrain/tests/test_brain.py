@@ -1,8 +1,12 @@
+import asyncio
+import json
 import os
 import pytest
 import pandas as pd
 import numpy as np
+import taxcalc as tc
 from taxbrain import TaxBrain
+from taxbrain.synthetic import synthetic_microdata
 
 
 def test_arg_validation():
@@ -109,9 +113,19 @@ def test_stacked_run():
     tb = TaxBrain(
         2021, 2022, reform=reform_dict, stacked=True, microdata="CPS"
     )
-    tb.run()
+    events = []
+    tb.run(progress=events.append)
     # check that there is a stacked table now
     assert isinstance(tb.stacked_table, pd.DataFrame)
+    # baseline and each provision are reported for every year
+    started = {
+        (event.get("provision"), event["side"], event["year"])
+        for event in events
+        if event["event"] == "start"
+    }
+    assert len(started) == 6
+    assert ("Capital Gains Tax Changes", "reform", 2022) in started
+    assert events[-1]["completed"] == events[-1]["total"] == 6
 
 
 def test_stacked_run_corporate():
@@ -245,3 +259,226 @@ def test_user_input(reform_json_str, assump_json_str):
         TaxBrain(2018, 2020, microdata="CPS", reform=True)
     with pytest.raises(TypeError):
         TaxBrain(2018, 2020, microdata="CPS", assump=True)
+
+
+def test_inequality_table(tb_static):
+    tb_static.run()
+    metrics = ["gini", "top_1_share", "palma", "poverty_gap"]
+    table = tb_static.inequality_table(metrics=metrics, poverty_line=15000)
+    assert isinstance(table, pd.DataFrame)
+    assert list(table.columns) == [2018, 2019]
+    assert list(table.index.get_level_values(0).unique()) == metrics
+    assert (table.xs("Base", level=1) > 0).all().all()
+    with pytest.raises(ValueError):
+        tb_static.inequality_table(metrics=["poverty_rate"])
+    with pytest.raises(TypeError):
+        tb_static.inequality_table(metrics="gini")
+
+
+def test_table_cache(tb_static):
+    tb_static.run()
+    table = tb_static.differences_table(2019, "weighted_deciles", "combined")
+    cached = tb_static.differences_table(
+        2019, groupby="weighted_deciles", tax_to_diff="combined"
+    )
+    # the same arguments hit the cache, but callers get their own copy
+    assert table.equals(cached)
+    assert table is not cached
+    num_cached = len(tb_static._table_cache)
+    cached.iloc[0, 0] = -1
+    assert tb_static.differences_table(
+        2019, "weighted_deciles", "combined"
+    ).equals(table)
+    assert len(tb_static._table_cache) == num_cached
+    tb_static.multi_var_table(["iitax", "combined"], "base")
+    assert len(tb_static._table_cache) == num_cached + 1
+    tb_static.clear_cache()
+    assert not tb_static._table_cache
+
+
+def test_checkpoint(reform_json_str, tmp_path):
+    tb = TaxBrain(2018, 2019, microdata="CPS", reform=reform_json_str)
+    tb.run(checkpoint_dir=tmp_path)
+    totals = tb.weighted_totals("combined")
+    # simulate a run that stopped after the first year
+    manifest = json.loads((tmp_path / "checkpoint.json").read_text())
+    assert manifest["completed"] == [2018, 2019]
+    manifest["completed"] = [2018]
+    (tmp_path / "checkpoint.json").write_text(json.dumps(manifest))
+    resumed = TaxBrain(2018, 2019, microdata="CPS", reform=reform_json_str)
+    resumed.run(checkpoint_dir=tmp_path)
+    pd.testing.assert_frame_equal(resumed.weighted_totals("combined"), totals)
+    pd.testing.assert_frame_equal(
+        resumed.reform_data[2019], tb.reform_data[2019]
+    )
+    # the finished checkpoint can be opened like saved results
+    loaded = TaxBrain.load(tmp_path)
+    pd.testing.assert_frame_equal(loaded.weighted_totals("combined"), totals)
+    # runs with different inputs can't use the checkpoint
+    other = TaxBrain(2018, 2019, microdata="CPS")
+    with pytest.raises(ValueError):
+        other.run(checkpoint_dir=tmp_path)
+
+
+def test_checkpoint_dynamic(reform_json_str, tmp_path):
+    behavior = {"sub": 0.25}
+    tb = TaxBrain(
+        2018, 2019, microdata="CPS", reform=reform_json_str, behavior=behavior
+    )
+    tb.run(checkpoint_dir=tmp_path)
+    # simulate a run that stopped after the first year
+    manifest = json.loads((tmp_path / "checkpoint.json").read_text())
+    manifest["completed"] = [2018]
+    (tmp_path / "checkpoint.json").write_text(json.dumps(manifest))
+    resumed = TaxBrain(
+        2018, 2019, microdata="CPS", reform=reform_json_str, behavior=behavior
+    )
+    resumed.run(checkpoint_dir=tmp_path)
+    for year in [2018, 2019]:
+        pd.testing.assert_frame_equal(
+            resumed.base_data[year], tb.base_data[year]
+        )
+        pd.testing.assert_frame_equal(
+            resumed.reform_data[year], tb.reform_data[year]
+        )
+    # only the years in the parameters are converted back to integers
+    loaded = TaxBrain.load(tmp_path)
+    assert loaded.params["behavior"] == behavior
+    assert loaded.params["policy"] == resumed.params["policy"]
+
+
+def test_baseline_cache(tb_static, reform_json_str):
+    if not tb_static.has_run:
+        tb_static.run()
+    cache = {}
+    tb = TaxBrain(2018, 2019, microdata="CPS", reform=reform_json_str)
+    tb.run(baseline_cache=cache)
+    assert sorted(year for _, year in cache) == [2018, 2019]
+    # a later run with the same baseline doesn't calculate it again
+    events = []
+    tb = TaxBrain(2018, 2019, microdata="CPS", reform=reform_json_str)
+    tb.run(baseline_cache=cache, progress=events.append)
+    skipped = [event for event in events if event["event"] == "skip"]
+    assert [(event["year"], event["side"]) for event in skipped] == [
+        (2018, "base"),
+        (2019, "base"),
+    ]
+    pd.testing.assert_frame_equal(
+        tb.weighted_totals("combined"), tb_static.weighted_totals("combined")
+    )
+    # runs get a copy of the cached results
+    key, _ = next(iter(cache))
+    assert tb.base_data[2019] is not cache[(key, 2019)]
+
+
+@pytest.mark.parametrize("behavior", [None, {"sub": 0.25}])
+def test_checkpoint_corporate(behavior, tmp_path):
+    """
+    Ensure corporate income is distributed once in each year of a run
+    resumed from a checkpoint
+    """
+    kwargs = {
+        "microdata": synthetic_microdata(0.05),
+        "reform": {"II_em": {2019: 2000}},
+        "behavior": behavior,
+        "corp_revenue": [1e9, 2e9, 3e9],
+    }
+    tb = TaxBrain(2018, 2020, **kwargs)
+    tb.run(checkpoint_dir=tmp_path)
+    # simulate a run that stopped after the first year
+    manifest = json.loads((tmp_path / "checkpoint.json").read_text())
+    manifest["completed"] = [2018]
+    (tmp_path / "checkpoint.json").write_text(json.dumps(manifest))
+    resumed = TaxBrain(2018, 2020, **kwargs)
+    resumed.run(checkpoint_dir=tmp_path)
+    for year in [2019, 2020]:
+        pd.testing.assert_frame_equal(
+            resumed.base_data[year], tb.base_data[year]
+        )
+        pd.testing.assert_frame_equal(
+            resumed.reform_data[year], tb.reform_data[year]
+        )
+
+
+def test_max_years_in_memory(tb_static, reform_json_str, tmp_path):
+    tb_static.run()
+    tb = TaxBrain(
+        2018,
+        2019,
+        microdata="CPS",
+        reform=reform_json_str,
+        max_years_in_memory=1,
+        spill_dir=tmp_path,
+    )
+    tb.run()
+    assert not tb.base_data.is_loaded(2018)
+    assert (tmp_path / "base" / "2018.parquet").exists()
+    pd.testing.assert_frame_equal(
+        tb.weighted_totals("combined"), tb_static.weighted_totals("combined")
+    )
+
+
+def test_max_years_in_memory_peak(reform_json_str):
+    """
+    Ensure the memory used by a run that spills results doesn't grow with
+    the number of years
+    """
+    microdata = synthetic_microdata(0.02)
+    path = os.path.join(tc.Records.CODE_PATH, "records_variables.json")
+    with open(path) as f:
+        # store every calculated variable so that each year's results are
+        # large compared to the memory the calculators use
+        varlist = sorted(json.load(f)["calc"])
+    peaks = {}
+    for end_year in [2019, 2022]:
+        tb = TaxBrain(
+            2018,
+            end_year,
+            microdata=microdata,
+            reform=reform_json_str,
+            max_years_in_memory=1,
+        )
+        tb.run(list(varlist), memory=True)
+        run = [entry for entry in tb.memory_usage if entry["stage"] == "run"]
+        peaks[end_year] = run[0]["alloc_peak"]
+    year_size = sum(
+        df.memory_usage(deep=True).sum()
+        for df in [tb.base_data[2018], tb.reform_data[2018]]
+    )
+    assert peaks[2022] - peaks[2019] < year_size
+
+
+def test_arun(tb_static, reform_json_str):
+    if not tb_static.has_run:
+        tb_static.run()
+    tb = TaxBrain(2018, 2019, microdata="CPS", reform=reform_json_str)
+    events = []
+    asyncio.run(tb.arun(progress=events.append))
+    finished = [event for event in events if event["event"] == "finish"]
+    assert [(event["year"], event["side"]) for event in finished] == [
+        (2018, "base"),
+        (2018, "reform"),
+        (2019, "base"),
+        (2019, "reform"),
+    ]
+    assert events[-1]["completed"] == events[-1]["total"] == 4
+    assert events[-1]["eta"] == 0
+    assert tb.has_run
+    pd.testing.assert_frame_equal(
+        tb.weighted_totals("combined"), tb_static.weighted_totals("combined")
+    )
+    # the results are read back into memory, as they are by run
+    assert isinstance(tb.reform_data, dict)
+    pd.testing.assert_frame_equal(
+        tb.reform_data[2019], tb_static.reform_data[2019]
+    )
+    args = (2019, "weighted_deciles", "combined")
+    table = asyncio.run(tb.atable("differences_table", *args))
+    pd.testing.assert_frame_equal(table, tb_static.differences_table(*args))
+    with pytest.raises(ValueError):
+        asyncio.run(tb.atable("run"))
+    # runs that time out leave the object unchanged
+    tb = TaxBrain(2018, 2019, microdata="CPS", reform=reform_json_str)
+    with pytest.raises(TimeoutError):
+        asyncio.run(tb.arun(timeout=0.1))
+    assert not tb.has_run
@@ -0,0 +1,34 @@
+import copy
+import pytest
+import taxbrain
+
+
+def test_compare(tb_static, tmp_path):
+    tb_static.run()
+    tb_static.save(tmp_path, format="feather")
+    loaded = taxbrain.TaxBrain.load(tmp_path)
+    results = taxbrain.compare(tb_static, loaded)
+    assert (results["summary"]["max_abs_diff"] == 0).all()
+    assert results["records"].empty
+    assert (results["unmatched"] == 0).all().all()
+    # years read from disk for the comparison are released afterwards
+    assert not loaded.base_data.is_loaded(2019)
+    # change one record and drop another
+    changed = copy.copy(tb_static)
+    reform_data = {yr: df.copy() for yr, df in tb_static.reform_data.items()}
+    reform_data[2019].loc[5, "iitax"] += 100
+    reform_data[2019] = reform_data[2019].drop(index=7)
+    changed.reform_data = reform_data
+    results = taxbrain.compare(
+        tb_static, changed, variables=["iitax", "s006"], top_k=3
+    )
+    summary = results["summary"]
+    assert summary.loc[("reform", 2019, "iitax"), "max_abs_diff"] == 100
+    assert summary.loc[("reform", 2019, "iitax"), "n_changed"] == 1
+    assert summary.loc[("reform", 2018, "iitax"), "n_changed"] == 0
+    records = results["records"]
+    assert records.shape[0] == 1
+    assert records["record"].iat[0] == 5
+    assert results["unmatched"].loc[("reform", 2019), "only_a"] == 1
+    with pytest.raises(ValueError):
+        taxbrain.compare(tb_static, changed, variables=["not_a_var"])
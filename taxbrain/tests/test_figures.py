@@ -0,0 +1,37 @@
+import pandas as pd
+from taxbrain import figures
+from taxbrain.utils import draw_differences_plot, draw_distribution_plot
+
+
+def test_render_figures(tmp_path):
+    agg_diff = pd.DataFrame(
+        {2018: [1e9, -2e9, -1e9], 2019: [2e9, -1e9, 1e9]},
+        index=["iitax", "payrolltax", "combined"],
+    )
+    dist_data = pd.DataFrame(
+        [[0.1, 0.2, 0.7], [0.5, 0.5, 0.0]],
+        index=["All", "Less than 10k"],
+        columns=["Decrease", "No Change", "Increase"],
+    )
+    specs = {
+        "diff": figures.figure_spec(
+            draw_differences_plot, agg_diff, tax_type="combined"
+        ),
+        "dist": figures.figure_spec(
+            draw_distribution_plot, dist_data, year=2018
+        ),
+    }
+    figures.clear_figure_cache()
+    images = figures.render_figures(
+        specs, dpi=50, num_workers=2, cache_dir=tmp_path
+    )
+    assert set(images) == {"diff", "dist"}
+    assert images["diff"].startswith(b"\x89PNG")
+    assert len(list(tmp_path.iterdir())) == 2
+    # unchanged figures come from the cache, even in a new process
+    figures.clear_figure_cache()
+    assert figures.render_figures(specs, dpi=50, cache_dir=tmp_path) == images
+    # changing the options renders a new figure
+    specs["diff"]["options"]["title"] = "New title"
+    images = figures.render_figures(specs, dpi=50, format="pdf")
+    assert images["diff"].startswith(b"%PDF")
@@ -0,0 +1,46 @@
+import importlib
+import subprocess
+import sys
+import pytest
+import taxbrain
+
+# modules only needed to run in parallel, plot, or create reports
+HEAVY_MODULES = ["dask", "matplotlib", "pypandoc", "markdown"]
+
+
+def loaded_modules(code):
+    """
+    Run code in a new interpreter and return the heavy modules it loaded
+    """
+    code += (
+        "\nimport sys"
+        f"\nprint(' '.join(m for m in {HEAVY_MODULES} if m in sys.modules))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True
+    )
+    assert out.returncode == 0, out.stderr
+    return out.stdout.split()
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        "import taxbrain",
+        "import taxbrain.cli",
+        "from taxbrain import TaxBrain",
+        "from taxbrain import cli_main",
+    ],
+)
+def test_lazy_imports(code):
+    assert loaded_modules(code) == []
+
+
+def test_lazy_attributes():
+    for name in taxbrain._ATTR_SUBMODULES:
+        assert name in dir(taxbrain)
+        getattr(taxbrain, name)
+    importlib.import_module("taxbrain.report")
+    assert callable(taxbrain.report)
+    with pytest.raises(AttributeError):
+        taxbrain.not_an_attribute
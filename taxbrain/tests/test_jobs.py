@@ -0,0 +1,119 @@
+import time
+import pytest
+from taxbrain.jobs import JobScheduler
+
+
+def sleep_job(job):
+    time.sleep(job.get("seconds", 0))
+    if job.get("fail"):
+        raise ValueError("job failed")
+    return {"value": job["value"]}
+
+
+def wait_for(scheduler, job_id, status):
+    for _ in range(200):
+        if scheduler.status(job_id)["status"] == status:
+            return
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} never became {status}")
+
+
+def test_job_scheduler(tmp_path):
+    limits = {"interactive": 2, "batch": 1}
+    with JobScheduler(
+        tmp_path / "jobs.db", limits, runner=sleep_job, poll_interval=0.02
+    ) as scheduler:
+        batch = [
+            scheduler.submit({"value": i, "seconds": 0.5}) for i in range(2)
+        ]
+        interactive = scheduler.submit(
+            {"value": 2, "seconds": 0.5}, priority="interactive"
+        )
+        # identical jobs in flight are only run once
+        assert scheduler.submit({"value": 0, "seconds": 0.5}) == batch[0]
+        wait_for(scheduler, interactive, "running")
+        running = scheduler.jobs("running")
+        assert [job["priority"] for job in running].count("batch") == 1
+        assert scheduler.result(interactive) == {"value": 2}
+        assert [scheduler.result(job_id) for job_id in batch] == [
+            {"value": 0},
+            {"value": 1},
+        ]
+        assert scheduler.status(batch[1])["priority"] == "batch"
+        # finished jobs are run again when resubmitted
+        assert scheduler.submit({"value": 0, "seconds": 0.5}) != batch[0]
+        failed = scheduler.submit({"value": 3, "fail": True})
+        with pytest.raises(RuntimeError, match="job failed"):
+            scheduler.result(failed)
+        assert scheduler.status(failed)["status"] == "failed"
+        with pytest.raises(ValueError):
+            scheduler.submit({"value": 4}, priority="urgent")
+        with pytest.raises(KeyError):
+            scheduler.status("missing")
+
+
+def test_job_scheduler_max_workers(tmp_path):
+    limits = {"interactive": 1, "batch": 1}
+    with JobScheduler(
+        tmp_path / "jobs.db",
+        limits,
+        runner=sleep_job,
+        poll_interval=0.02,
+        max_workers=1,
+    ) as scheduler:
+        first = scheduler.submit(
+            {"value": 0, "seconds": 0.5}, priority="interactive"
+        )
+        wait_for(scheduler, first, "running")
+        batch = scheduler.submit({"value": 1})
+        interactive = scheduler.submit({"value": 2}, priority="interactive")
+        # the batch job waits for the only slot, which then goes to the
+        # interactive job that was queued later
+        assert scheduler.result(interactive) == {"value": 2}
+        assert scheduler.result(batch) == {"value": 1}
+        assert (
+            scheduler.status(interactive)["started"]
+            < scheduler.status(batch)["started"]
+        )
+        with pytest.raises(ValueError):
+            JobScheduler(tmp_path / "other.db", limits, sleep_job, 0.02, 0)
+
+
+def test_job_scheduler_cancel(tmp_path):
+    with JobScheduler(
+        tmp_path / "jobs.db", {"batch": 1}, sleep_job, poll_interval=0.02
+    ) as scheduler:
+        running = scheduler.submit({"value": 0, "seconds": 60})
+        pending = scheduler.submit({"value": 1, "seconds": 60})
+        wait_for(scheduler, running, "running")
+        assert scheduler.cancel(pending)
+        assert scheduler.cancel(running)
+        for job_id in [running, pending]:
+            assert scheduler.status(job_id)["status"] == "cancelled"
+            with pytest.raises(RuntimeError, match="cancelled"):
+                scheduler.result(job_id)
+        assert not scheduler.cancel(running)
+        with pytest.raises(TimeoutError):
+            scheduler.result(
+                scheduler.submit({"value": 2, "seconds": 60}), 0.1
+            )
+
+
+def test_job_scheduler_restart(tmp_path):
+    path = tmp_path / "jobs.db"
+    scheduler = JobScheduler(path, {"batch": 1}, sleep_job, 0.02)
+    first = scheduler.submit({"value": 0})
+    assert scheduler.result(first) == {"value": 0}
+    interrupted = scheduler.submit({"value": 1, "seconds": 60})
+    queued = scheduler.submit({"value": 2})
+    wait_for(scheduler, interrupted, "running")
+    scheduler.close()
+    # queued and interrupted jobs are run by the next scheduler
+    with JobScheduler(path, {"batch": 2}, sleep_job, 0.02) as scheduler:
+        assert scheduler.status(interrupted)["status"] in (
+            "pending",
+            "running",
+        )
+        assert scheduler.result(queued, timeout=30) == {"value": 2}
+        assert scheduler.result(first) == {"value": 0}
+        assert scheduler.cancel(interrupted)
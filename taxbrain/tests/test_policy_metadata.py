@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+import taxcalc as tc
+from taxbrain.report_utils import convert_params
+from taxbrain.policy_metadata import (
+    policy_metadata,
+    param_default,
+    _policy_metadata,
+)
+
+
+def test_policy_metadata(tmp_path):
+    index = policy_metadata()
+    assert policy_metadata() is index
+    pol = tc.Policy()
+    pol.set_year(2019)
+    assert index["STD"]["title"] == pol.metadata()["STD"]["title"]
+    assert index["STD"]["vi_name"] == "MARS"
+    assert index["EITC_c"]["vi_name"] == "EIC"
+    assert index["ID_Charity_hc"]["vi_name"] is None
+    assert index["STD"]["vi_labels"] == tuple(pol.label_grid["MARS"])
+    # the shared index can't be changed by callers
+    with pytest.raises(TypeError):
+        index["STD"]["title"] = "changed"
+    for param in ["STD", "EITC_c", "II_em", "ID_Charity_hc"]:
+        np.testing.assert_array_equal(
+            param_default(param, 2019), getattr(pol, param)
+        )
+    # the index is saved to and read back from the cache directory
+    cached = policy_metadata(cache_dir=tmp_path)
+    path = tmp_path / f"policy_metadata-{tc.__version__}.json"
+    assert path.exists()
+    _policy_metadata.cache_clear()
+    assert policy_metadata(cache_dir=tmp_path) == cached == index
+
+
+def test_convert_params():
+    params = {
+        "STD": [
+            {"year": 2019, "value": 10000},
+            {"year": 2021, "MARS": "single", "value": 12000},
+        ],
+        "EITC_c": [
+            {"year": 2020, "EIC": eic, "value": 1000 * (i + 1)}
+            for i, eic in enumerate(["0kids", "1kid", "2kids", "3+kids"])
+        ],
+        "II_em": [{"year": 2020, "value": 1000}],
+        "STD-indexed": [{"year": 2020, "value": False}],
+    }
+    reform = convert_params(params)
+    assert reform["EITC_c"] == {2020: [1000.0, 2000.0, 3000.0, 4000.0]}
+    assert reform["II_em"] == {2020: 1000.0}
+    assert reform["STD-indexed"] == {2019: False}
+    # values the reform doesn't set are those of a Policy object
+    pol = tc.Policy()
+    pol.adjust(params)
+    for year in [2019, 2021]:
+        np.testing.assert_allclose(
+            reform["STD"][year], pol._STD[year - pol.JSON_START_YEAR]
+        )
@@ -0,0 +1,51 @@
+import pytest
+from taxbrain.progress import ProgressTracker, print_progress
+
+
+def test_progress_tracker():
+    events = []
+    tracker = ProgressTracker(events.append, total=3)
+    assert tracker.eta() is None
+    with tracker.task(year=2018, side="base"):
+        pass
+    tracker.skip(year=2018, side="reform")
+    with pytest.raises(ValueError):
+        with tracker.task(year=2019, side="base"):
+            raise ValueError()
+    assert [event["event"] for event in events] == [
+        "start",
+        "finish",
+        "skip",
+        "start",
+        "error",
+    ]
+    assert events[0]["eta"] is None
+    assert events[1]["year"] == 2018
+    assert events[1]["side"] == "base"
+    assert events[1]["duration"] >= 0
+    assert events[2]["completed"] == 2
+    assert events[2]["total"] == 3
+    # one task left at the average time of the single task that ran
+    assert events[2]["eta"] == pytest.approx(tracker.durations[0])
+
+
+def test_progress_tracker_no_callback():
+    tracker = ProgressTracker()
+    with tracker.task(year=2018):
+        pass
+    assert tracker.completed == 1
+
+
+def test_print_progress(capsys):
+    events = []
+    tracker = ProgressTracker(events.append, total=2)
+    with tracker.task(year=2018, side="base"):
+        pass
+    tracker.skip(year=2019, side="base", provision="Payroll")
+    for event in events:
+        print_progress(event)
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 2
+    assert lines[0].startswith("[1/2] base 2018 finished after")
+    assert lines[1].startswith("[2/2] Payroll base 2019 skipped after")
+    assert lines[1].endswith("about 0s left")
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+from taxbrain import quantiles
+
+
+def test_weighted_percentiles():
+    values = np.arange(1.0, 11.0)
+    weights = np.ones(10)
+    result = quantiles.weighted_percentiles(values, weights, [10, 50, 100])
+    assert np.allclose(result, [1.0, 5.0, 10.0])
+    # a heavy weight on the largest value moves the median to it
+    weights[-1] = 10.0
+    result = quantiles.weighted_percentiles(values, weights, [50])
+    assert np.allclose(result, [10.0])
+
+
+def test_inequality_statistics():
+    weights = np.array([1.0, 2.0, 3.0, 4.0])
+    equal = np.full(4, 100.0)
+    assert np.isclose(quantiles.gini(equal, weights), 0.0)
+    assert np.isclose(quantiles.theil(equal, weights), 0.0)
+    assert np.isclose(quantiles.top_share(equal, weights, 0.1), 0.1)
+    # one tax unit holds all of the income
+    values = np.array([0.0, 0.0, 0.0, 100.0])
+    weights = np.ones(4)
+    assert np.isclose(quantiles.gini(values, weights), 0.75)
+    assert np.isclose(quantiles.top_share(values, weights, 0.25), 1.0)
+    population, share = quantiles.lorenz_points(values, weights, bins=4)
+    assert np.allclose(population, [0.25, 0.5, 0.75, 1.0])
+    assert np.allclose(share, [0.0, 0.0, 0.0, 1.0])
+
+
+def test_distribution_stats(tb_static):
+    tb_static.run()
+    table = quantiles.distribution_stats(tb_static, percentiles=[50])
+    assert isinstance(table, pd.DataFrame)
+    assert list(table.columns) == [2018, 2019]
+    assert ("gini", "Difference") in table.index
+    assert ("p50", "Base") in table.index
+    # the sort for each year is cached and shared with other callers
+    assert (2019, "aftertax_income", "base") in tb_static._sort_orders
+    order = quantiles.sort_order(tb_static, 2019, "aftertax_income")
+    assert order is tb_static._sort_orders[(2019, "aftertax_income", "base")]
+    with pytest.raises(ValueError):
+        quantiles.distribution_stats(tb_static, stats=["mean"])
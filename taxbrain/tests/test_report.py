@@ -1,6 +1,12 @@
+import asyncio
+import json
 import shutil
+import pytest
+import numpy as np
 from pathlib import Path
-from taxbrain import report
+from taxbrain import areport, report, report_many
+from taxbrain.report_utils import notable_changes, notable_vars
+from taxbrain.report_utils import _notable_aggregates, data_uri, md_to_html
 
 
 def test_report(tb_static):
@@ -20,5 +26,92 @@ def test_report(tb_static):
     assert dist_png.exists()
     shutil.rmtree(dir_path)
     # test clean report
-    _content = report(tb_static, name=name, outdir=outdir, clean=True)
+    content = report(tb_static, name=name, outdir=outdir, clean=True)
     assert not dir_path.exists()
+    assert set(content) == {"Test-Report.md", "Test-Report.pdf"}
+    assert content["Test-Report.pdf"].startswith(b"%PDF")
+    # figures are embedded in the markdown
+    assert "data:image/png;base64," in content["Test-Report.md"]
+
+
+def test_html_report(tb_static):
+    """
+    Ensure the HTML report can be created without creating a PDF
+    """
+    content = report(
+        tb_static, name="Test Report", clean=True, formats=["html"], dpi=100
+    )
+    assert list(content) == ["Test-Report.html"]
+    assert content["Test-Report.html"].count("data:image/png;base64,") == 3
+    with pytest.raises(ValueError):
+        report(tb_static, clean=True, formats=["docx"])
+
+
+def test_areport(tb_static):
+    content = asyncio.run(
+        areport(tb_static, name="Test Report", clean=True, formats=["md"])
+    )
+    assert list(content) == ["Test-Report.md"]
+    with pytest.raises(TimeoutError):
+        asyncio.run(areport(tb_static, clean=True, timeout=0.01))
+
+
+def test_report_many(tb_static, tmp_path):
+    """
+    Ensure reports are created for each set of results along with an index
+    """
+    tb_static.run()
+    tb_static.save(tmp_path / "saved")
+    index = report_many(
+        [tmp_path / "saved", tmp_path / "saved"],
+        names=["Report A", "Report B"],
+        outdir=tmp_path / "reports",
+        num_workers=2,
+        formats=["md", "html"],
+        dpi=100,
+    )
+    assert [entry["name"] for entry in index] == ["Report A", "Report B"]
+    assert "Report-B.html" in index[1]["files"]
+    assert Path(tmp_path, "reports", "Report-A", "Report-A.md").exists()
+    assert json.loads(Path(tmp_path, "reports", "index.json").read_text())
+    assert "Report-B/Report-B.html" in (
+        Path(tmp_path, "reports", "index.md").read_text()
+    )
+
+
+def test_notable_changes(tb_static):
+    """
+    Ensure notable changes are found in the single pass over the data
+    """
+    tb_static.run()
+    section = notable_changes(tb_static, 0.05)
+    assert isinstance(section, list)
+    base, reform = _notable_aggregates(tb_static)
+    assert list(base.columns) == list(notable_vars.keys())
+    assert list(base.index) == [2018, 2019]
+    assert np.isclose(
+        base.loc[2019, "c00100"],
+        tb_static.weighted_totals("c00100").loc["Base", 2019],
+    )
+
+
+def test_data_uri():
+    uri = data_uri(b"\x89PNG", "png")
+    assert uri == "data:image/png;base64,iVBORw=="
+
+
+def test_md_to_html():
+    md_text = (
+        "% Title\n% Author\n% Date\n\n## Section\n\n"
+        "Text with a note.^[The note.]\n\n"
+        "![]({{ logo }}){.center}\n\\pagebreak\n\n"
+        "| a | b |\n|--:|--:|\n| 1 | 2 |\n"
+    ).replace("{{ logo }}", "logo-image")
+    html = md_to_html(md_text, images={"logo-image": "data:image/png;x"})
+    assert html.startswith("<!DOCTYPE html>")
+    assert "<title>Title</title>" in html
+    assert "<h2>Section</h2>" in html
+    assert "<table>" in html
+    assert 'src="data:image/png;x"' in html
+    assert "The note." in html and "^[" not in html
+    assert "\\pagebreak" not in html and "{.center}" not in html
@@ -0,0 +1,37 @@
+import pandas as pd
+import pytest
+from taxbrain.results_db import ResultsDB
+from taxbrain.utils import hash_inputs
+
+
+def test_results_db(tb_static, tmp_path):
+    tb_static.run()
+    path = tmp_path / "results.db"
+    with ResultsDB(path) as db:
+        run_id = db.add_run(tb_static, name="static")
+        assert run_id == tb_static.input_hash()
+        # adding the same run again doesn't duplicate it
+        assert db.add_run(tb_static) == run_id
+        assert list(db.runs().index) == [run_id]
+        reform_hash = db.runs().loc[run_id, "reform_hash"]
+        assert reform_hash == hash_inputs(tb_static.params["policy"])
+    # results persist after the database is closed
+    with ResultsDB(path) as db:
+        table = db.revenue_change("combined", 2019, 2019)
+        expected = tb_static.weighted_totals("combined")
+        assert table.loc[(run_id, "static"), 2019] == pytest.approx(
+            expected.loc["Difference", 2019]
+        )
+        assert list(table.columns) == [2019, "Total"]
+        # the reform changes whether STD is indexed
+        assert list(db.revenue_change(param="STD").index) == [
+            (run_id, "static")
+        ]
+        assert db.revenue_change(param="II_em").empty
+        assert db.runs(microdata="CPS").shape[0] == 1
+        stored = db.differences_table(run_id, 2018)
+        pd.testing.assert_frame_equal(
+            stored,
+            tb_static.differences_table(2018, "weighted_deciles", "combined"),
+            check_dtype=False,
+        )
@@ -0,0 +1,119 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+import pandas as pd
+import pytest
+from taxbrain import server
+
+
+@pytest.fixture
+def scoring_server(tmp_path):
+    srv = server.ScoringServer(
+        ("127.0.0.1", 0), microdata=[], processes=False, results_dir=tmp_path
+    )
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{srv.server_port}"
+    srv.shutdown()
+    srv.server_close()
+
+
+def request(url, method="GET", body=None):
+    data = None if body is None else json.dumps(body).encode()
+    req = urllib.request.Request(url, data=data, method=method)
+    try:
+        with urllib.request.urlopen(req) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+def test_server(scoring_server, tb_static, reform_json_str):
+    assert request(f"{scoring_server}/health") == (200, {"status": "ok"})
+    job = {
+        "start_year": 2018,
+        "end_year": 2019,
+        "reform": json.loads(reform_json_str)["policy"],
+        "tables": ["weighted_totals", "differences_table"],
+    }
+    code, status = request(f"{scoring_server}/jobs?wait=1", "POST", job)
+    assert code == 200
+    assert status["status"] == "done", status.get("error")
+    result = status["result"]
+    if not tb_static.has_run:
+        tb_static.run()
+    totals = result["weighted_totals"]["combined"]
+    pd.testing.assert_frame_equal(
+        pd.DataFrame(**totals),
+        tb_static.weighted_totals("combined"),
+        check_column_type=False,
+    )
+    assert set(result["differences_table"]) == {"2018", "2019"}
+    assert request(f"{scoring_server}/jobs/{status['id']}")[1] == status
+    # the full results are saved for each job
+    assert Path(result["path"], "metadata.json").exists()
+    # records and baseline results are kept for later jobs
+    assert [key[0] for key in server._records_cache] == ["CPS"]
+    assert sorted(year for _, year in server._baseline_cache) == [2018, 2019]
+
+
+def test_server_errors(scoring_server):
+    code, body = request(f"{scoring_server}/jobs", "POST", {"year": 2019})
+    assert code == 400
+    assert "Unknown job fields" in body["error"]
+    job = {"start_year": 2019, "tables": ["volcano_plot"]}
+    assert request(f"{scoring_server}/jobs", "POST", job)[0] == 400
+    assert request(f"{scoring_server}/jobs/missing")[0] == 404
+    assert request(f"{scoring_server}/jobs/missing", "DELETE")[0] == 404
+    job = {"start_year": 2019, "reform": {"NOT_A_PARAM": {"2019": 1}}}
+    code, status = request(f"{scoring_server}/jobs?wait=1", "POST", job)
+    assert status["status"] == "failed"
+
+
+def test_server_drops_finished_jobs():
+    srv = server.ScoringServer(
+        ("127.0.0.1", 0), microdata=[], processes=False, max_jobs=1
+    )
+    job = {"start_year": 2019, "reform": {"NOT_A_PARAM": {"2019": 1}}}
+    first = srv.submit(job)
+    srv.status(first, block=True)
+    second = srv.submit(job)
+    srv.status(second, block=True)
+    # jobs are dropped once they finish, which is just after waiting ends
+    for _ in range(500):
+        if first not in srv.jobs:
+            break
+        time.sleep(0.01)
+    assert list(srv.jobs) == [second]
+    srv.server_close()
+
+
+def test_baseline_cache_size(monkeypatch):
+    monkeypatch.setattr(
+        server, "_baseline_cache", server._LRUCache(server.BASELINE_CACHE_SIZE)
+    )
+    srv = server.ScoringServer(
+        ("127.0.0.1", 0),
+        microdata=[],
+        processes=False,
+        baseline_cache_size=2,
+    )
+    # wait for the worker to start
+    srv.executor.submit(int).result()
+    cache = server._baseline_cache
+    assert cache.maxsize == 2
+    cache["a"] = 1
+    cache["b"] = 2
+    # looking an item up keeps it in the cache
+    assert cache.get("a") == 1
+    cache["c"] = 3
+    assert list(cache) == ["a", "c"]
+    assert cache.get("b") is None
+    srv.server_close()
+    with pytest.raises(ValueError):
+        server.ScoringServer(
+            ("127.0.0.1", 0), microdata=[], baseline_cache_size=-1
+        )
@@ -0,0 +1,116 @@
+import json
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from pathlib import Path
+from taxbrain import TaxBrain, storage
+
+
+@pytest.mark.parametrize("format", ["parquet", "feather", "hdf5"])
+def test_write_read_frame(tmp_path, format):
+    df = pd.DataFrame(
+        {"s006": [1.5, 2.5, 3.5], "iitax": [100.0, -20.0, 0.0]},
+        index=[10, 11, 12],
+    )
+    path = Path(tmp_path, f"data{storage.FORMATS[format][0]}")
+    storage.write_frame(df, path, format)
+    assert path.exists()
+    # no temporary files are left behind
+    assert [p.name for p in tmp_path.iterdir()] == [path.name]
+    pd.testing.assert_frame_equal(storage.read_frame(path, format), df)
+    pd.testing.assert_frame_equal(
+        storage.read_frame(path, format, columns=["iitax"]), df[["iitax"]]
+    )
+    with pytest.raises(ValueError):
+        storage.write_frame(df, path, "csv")
+
+
+def test_year_partitions_spill(tmp_path):
+    data = storage.YearPartitions(tmp_path, "base", [], max_in_memory=2)
+    frames = {
+        year: pd.DataFrame({"s006": [1.0, 2.0], "iitax": [year, -year]})
+        for year in [2018, 2019, 2020]
+    }
+    for year, df in frames.items():
+        data[year] = df
+    # the least recently used year was written to disk and dropped
+    assert list(data) == [2018, 2019, 2020]
+    assert not data.is_loaded(2018)
+    assert storage.partition_path(tmp_path, "base", 2018).exists()
+    assert not storage.partition_path(tmp_path, "base", 2020).exists()
+    pd.testing.assert_frame_equal(
+        data[2018], frames[2018], check_column_type=False
+    )
+    assert data.is_loaded(2018) and not data.is_loaded(2019)
+    # a replaced year is written again when it is next dropped
+    data[2018] = frames[2020]
+    data.release(2018)
+    pd.testing.assert_frame_equal(
+        data[2018], frames[2020], check_column_type=False
+    )
+    with pytest.raises(ValueError):
+        storage.YearPartitions(tmp_path, "base", [], max_in_memory=0)
+
+
+def test_year_partitions_threads(tmp_path):
+    data = storage.YearPartitions(tmp_path, "base", [], max_in_memory=1)
+    frames = {
+        year: pd.DataFrame({"s006": [1.0] * 100, "iitax": [year] * 100})
+        for year in range(2018, 2028)
+    }
+    for year, df in frames.items():
+        data[year] = df
+
+    def use(task):
+        # threads replace and read years, evicting each other's years
+        year = 2018 + task % len(frames)
+        if task % 3 == 0:
+            data[year] = frames[year]
+            return True
+        return data[year]["iitax"].eq(year).all()
+
+    with ThreadPoolExecutor(8) as executor:
+        assert all(executor.map(use, range(400)))
+    # no temporary files are left behind
+    assert sorted(path.name for path in Path(tmp_path, "base").iterdir()) == [
+        f"{year}.parquet" for year in frames
+    ]
+
+
+def test_save(tb_static, tmp_path):
+    tb_static.run()
+    tb_static.save(tmp_path)
+    for year in [2018, 2019]:
+        for calc, data in [
+            ("base", tb_static.base_data),
+            ("reform", tb_static.reform_data),
+        ]:
+            path = storage.partition_path(tmp_path, calc, year)
+            pd.testing.assert_frame_equal(storage.read_frame(path), data[year])
+    metadata = json.loads(Path(tmp_path, storage.METADATA_FILE).read_text())
+    assert metadata["start_year"] == 2018
+    assert metadata["format"] == "parquet"
+    params = json.loads(Path(tmp_path, storage.PARAMS_FILE).read_text())
+    assert set(params.keys()) == set(tb_static.params.keys())
+
+
+def test_load(tb_static, tmp_path):
+    tb_static.run()
+    tb_static.save(tmp_path, "feather")
+    tb = TaxBrain.load(tmp_path)
+    assert tb.has_run
+    assert tb.params == tb_static.params
+    # years are only read from disk once they are used
+    assert not tb.base_data._loaded
+    pd.testing.assert_frame_equal(
+        tb.weighted_totals("combined"), tb_static.weighted_totals("combined")
+    )
+    assert set(tb.base_data._loaded.keys()) == {2018, 2019}
+    pd.testing.assert_frame_equal(
+        tb.differences_table(2019, "weighted_deciles", "combined"),
+        tb_static.differences_table(2019, "weighted_deciles", "combined"),
+    )
+    with pytest.raises(ValueError):
+        tb.run()
+    with pytest.raises(FileNotFoundError):
+        TaxBrain.load(Path(tmp_path, "base"))
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from taxbrain import TaxBrain
+from taxbrain.synthetic import synthetic_microdata
+
+
+def test_synthetic_microdata():
+    cps = synthetic_microdata(1, sigma=0)
+    microdata = synthetic_microdata(2.5, seed=1)
+    data = microdata["data"]
+    assert len(data) == round(2.5 * len(cps["data"]))
+    assert data["RECID"].is_unique
+    assert len(microdata["weights"]) == len(data)
+    assert microdata["start_year"] == 2014
+    for var in ["e00200", "e00900", "e02100"]:
+        np.testing.assert_array_equal(
+            data[var], data[f"{var}p"] + data[f"{var}s"]
+        )
+    assert (data["e00600"] >= data["e00650"]).all()
+    # weighted totals are close to those of the CPS
+    assert data["s006"].sum() == pytest.approx(
+        cps["data"]["s006"].sum(), rel=0.01
+    )
+    for var in ["e00200", "e00300"]:
+        total = (data[var] * data["s006"]).sum()
+        cps_total = (cps["data"][var] * cps["data"]["s006"]).sum()
+        assert total == pytest.approx(cps_total, rel=0.02)
+    wt = microdata["weights"]["WT2018"].sum()
+    assert wt == pytest.approx(cps["weights"]["WT2018"].sum(), rel=0.01)
+    # the same seed creates the same records
+    assert synthetic_microdata(0.01, seed=1)["data"].equals(
+        synthetic_microdata(0.01, seed=1)["data"]
+    )
+    with pytest.raises(ValueError):
+        synthetic_microdata(0)
+
+
+def test_synthetic_run(tb_static, reform_json_str):
+    if not tb_static.has_run:
+        tb_static.run()
+    tb = TaxBrain(
+        2018,
+        2018,
+        microdata=synthetic_microdata(0.2),
+        reform=reform_json_str,
+    )
+    tb.run()
+    assert len(tb.base_data[2018]) == round(
+        0.2 * len(tb_static.base_data[2018])
+    )
+    totals = tb.weighted_totals("combined")
+    expected = tb_static.weighted_totals("combined")
+    for calc in ["Base", "Reform"]:
+        assert totals.loc[calc, 2018] == pytest.approx(
+            expected.loc[calc, 2018], rel=0.1
+        )
@@ -0,0 +1,118 @@
+import json
+import os
+import tracemalloc
+import numpy as np
+import pandas as pd
+from taxbrain import TaxBrain
+from taxbrain import figures
+from taxbrain.timing import stage, timing, current_timer, memory_usage
+from taxbrain.utils import draw_differences_plot
+
+
+def test_stage():
+    # stages aren't recorded without a timer
+    with stage("untimed"):
+        pass
+    assert current_timer() is None
+    with timing() as timer:
+        with stage("outer", year=2018):
+            with stage("inner", year=2018):
+                pass
+        with stage("inner", year=2019):
+            pass
+    assert current_timer() is None
+    assert [span["stage"] for span in timer.spans] == [
+        "inner",
+        "outer",
+        "inner",
+    ]
+    assert timer.spans[1]["wall"] >= timer.spans[0]["wall"]
+    assert timer.spans[0]["worker"] == os.getpid()
+    summary = timer.summary()
+    assert summary.loc["inner", "calls"] == 2
+    assert set(summary.columns) == {"calls", "wall", "cpu", "mean_wall"}
+    by_year = timer.summary(["stage", "year"])
+    assert by_year.loc[("inner", 2019), "calls"] == 1
+
+
+def test_trace(tmp_path):
+    with timing() as timer:
+        with stage("outer", side="base"):
+            pass
+    path = tmp_path / "trace.json"
+    timer.write_trace(path)
+    trace = json.loads(path.read_text())
+    event = trace["traceEvents"][0]
+    assert event["name"] == "outer"
+    assert event["ph"] == "X"
+    assert event["args"]["side"] == "base"
+    assert event["pid"] == os.getpid()
+    assert trace["traceEvents"][1]["ph"] == "M"
+
+
+def test_worker_stages():
+    data = pd.DataFrame(
+        {2018: [1e9, -2e9, -1e9]}, index=["iitax", "payrolltax", "combined"]
+    )
+    specs = {
+        title: figures.figure_spec(
+            draw_differences_plot, data, tax_type="combined", title=title
+        )
+        for title in ["a", "b"]
+    }
+    figures.clear_figure_cache()
+    with timing() as timer:
+        figures.render_figures(specs, dpi=50, num_workers=2)
+    workers = {
+        span["worker"]
+        for span in timer.spans
+        if span["stage"] == "render_figure"
+    }
+    # figures drawn in worker processes are added to the timer
+    assert len(workers) > 0
+    assert os.getpid() not in workers
+
+
+def test_memory():
+    with timing(memory=True) as timer:
+        with stage("outer"):
+            with stage("inner"):
+                data = np.ones(10_000_000)
+            del data
+        with stage("small"):
+            pass
+    spans = {span["stage"]: span for span in timer.spans}
+    assert spans["inner"]["alloc_peak"] >= 80_000_000
+    assert spans["outer"]["alloc_peak"] >= spans["inner"]["alloc_peak"]
+    assert spans["small"]["alloc_peak"] < 1_000_000
+    assert spans["outer"]["rss_peak"] > 0
+    assert not tracemalloc.is_tracing()
+    assert "alloc_peak" in timer.summary().columns
+    usage = memory_usage(timer.spans)
+    assert usage[0]["stage"] == "inner"
+    assert usage[0]["worker"] == os.getpid()
+    assert [
+        event
+        for event in timer.trace()["traceEvents"]
+        if event["name"] == "rss"
+    ]
+
+
+def test_run_stages(reform_json_str, tmp_path):
+    tb = TaxBrain(2018, 2018, microdata="CPS", reform=reform_json_str)
+    with timing() as timer:
+        tb.run(memory=True)
+        tb.weighted_totals("combined")
+    # the memory used by the run is saved with its results
+    stages = {entry["stage"] for entry in tb.memory_usage}
+    assert {"run", "records", "calc_all", "dataframe"} <= stages
+    assert all(entry["alloc_peak"] >= 0 for entry in tb.memory_usage)
+    tb.save(tmp_path)
+    assert TaxBrain.load(tmp_path).memory_usage == tb.memory_usage
+    summary = timer.summary(["stage", "side"])
+    for stage_name in ["calc_all", "dataframe"]:
+        assert summary.loc[(stage_name, "base"), "calls"] == 1
+        assert summary.loc[(stage_name, "reform"), "calls"] == 1
+    stages = set(timer.summary().index)
+    assert {"run", "records", "advance_to_year", "gather"} <= stages
+    assert "weighted_totals" in stages
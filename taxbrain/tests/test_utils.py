@@ -1,4 +1,5 @@
 import taxbrain
+import pandas as pd
 import pytest
 
 
@@ -41,3 +42,29 @@ def test_revenue_plot(tb_static):
         taxbrain.revenue_plot(tb_static, tax_vars=["income", "combined"])
     with pytest.raises(AssertionError):
         taxbrain.revenue_plot(tb_static, tax_vars=[])
+
+
+def test_winners_losers_data(tb_static):
+    tb_static.run()
+    table = taxbrain.winners_losers_data(tb_static)
+    assert list(table.index.get_level_values(0).unique()) == [2018, 2019]
+    assert len(table.loc[2019]) == 12
+    assert table.loc[(2019, "All")].sum() == pytest.approx(1.0)
+    assert list(table.columns) == taxbrain.utils.WINNERS_LOSERS_LABELS
+
+
+def test_hash_inputs():
+    reform = {"STD": {2019: [1, 2, 3, 4, 5]}, "II_em": {2019: 0}}
+    reordered = {"II_em": {"2019": 0}, "STD": {"2019": [1, 2, 3, 4, 5]}}
+    assert taxbrain.hash_inputs(reform) == taxbrain.hash_inputs(reordered)
+    assert taxbrain.hash_inputs(reform) != taxbrain.hash_inputs({})
+    frame = pd.DataFrame({"a": [1, 2], "b": [3, 4]})
+    renamed = frame.rename(columns={"a": "c"})
+    assert taxbrain.hash_inputs(frame) == taxbrain.hash_inputs(frame.copy())
+    assert taxbrain.hash_inputs(frame) != taxbrain.hash_inputs(renamed)
+    assert taxbrain.hash_inputs(frame) != taxbrain.hash_inputs(
+        frame.astype(float)
+    )
+    assert taxbrain.hash_inputs(frame["a"]) != taxbrain.hash_inputs(
+        renamed["c"]
+    )
@@ -0,0 +1,502 @@
+"""
+Opt-in timing of the stages of TaxBrain runs and reports. Stages are only
+recorded while a timer is active:
+
+    with timing() as timer:
+        tb.run()
+        report(tb)
+    timer.summary()
+    timer.write_trace("trace.json")
+
+The trace can be opened in chrome://tracing or https://ui.perfetto.dev.
+With `timing(memory=True)`, the peak memory of each stage is recorded too.
+"""
+
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import pandas as pd
+from contextlib import contextmanager
+
+# timer recording stages in the current context, if any
+_timer = contextvars.ContextVar("taxbrain_timer", default=None)
+# seconds between samples of the resident set size when recording memory
+RSS_INTERVAL = 0.1
+# memory recorded for each stage
+_MEMORY_KEYS = ["alloc_peak", "rss_peak"]
+
+
+class StageTimer:
+    """
+    Wall and CPU time, and optionally peak memory, of each stage run while
+    the timer was active
+    """
+
+    def __init__(self, memory: bool = False, interval: float = RSS_INTERVAL):
+        """
+        Parameters
+        ----------
+        memory: bool
+            whether to record the memory used by each stage. Allocations
+            are traced with tracemalloc, which slows Python code down, and
+            the resident set size is sampled every `interval` seconds
+        interval: float
+            seconds between samples of the resident set size
+
+        Returns
+        -------
+        None
+        """
+        self.memory = memory
+        self.interval = interval
+        # one dictionary for each time a stage was run
+        self.spans = []
+        # time, process ID, and resident set size of each sample
+        self.rss_samples = []
+        self.pid = os.getpid()
+        self._origin = time.time()
+        self._lock = threading.Lock()
+        # peaks of the stages that are running
+        self._frames = []
+        self._started_tracing = False
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def start(self):
+        """
+        Start tracing allocations and sampling the resident set size if
+        memory is being recorded. Called by `timing`
+        """
+        if not self.memory:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        """
+        Stop recording memory. Called by `timing`
+        """
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def record(self, span: dict):
+        """
+        Add a stage to the timer. Stages are recorded by `stage`
+        """
+        with self._lock:
+            self.spans.append(span)
+
+    def extend(self, spans: list, rss_samples: list = []):
+        """
+        Add stages recorded by another timer, such as one in a worker
+        process
+        """
+        with self._lock:
+            self.spans.extend(spans)
+            self.rss_samples.extend(rss_samples)
+
+    def summary(self, by: list = ["stage"]) -> pd.DataFrame:
+        """
+        Total time spent in each stage. Stages are nested, so the time of
+        a stage includes the time of the stages run inside it.
+
+        Parameters
+        ----------
+        by: list
+            fields to group stages by. Along with "stage", these can be
+            "worker", the process ID, or any field passed to `stage`, such
+            as "year" or "side"
+
+        Returns
+        -------
+        Pandas DataFrame
+            number of "calls", total "wall" and "cpu" seconds, and the
+            "mean_wall" seconds of each group, slowest first. If memory was
+            recorded, the largest "alloc_peak" and "rss_peak" in bytes are
+            included as well
+        """
+        return summarize(self.spans, by)
+
+    def trace(self) -> dict:
+        """
+        Timeline of the stages in Chrome's trace event format
+
+        Returns
+        -------
+        dict
+            trace with a complete event for each stage, timed in
+            microseconds from when the timer was created
+        """
+        events = []
+        for span in self.spans:
+            args = {
+                key: _json_value(value)
+                for key, value in span.items()
+                if key not in ("stage", "start", "wall", "worker", "thread")
+            }
+            events.append(
+                {
+                    "name": span["stage"],
+                    "ph": "X",
+                    "ts": (span["start"] - self._origin) * 1e6,
+                    "dur": span["wall"] * 1e6,
+                    "pid": span["worker"],
+                    "tid": span["thread"],
+                    "args": args,
+                }
+            )
+        for sample_time, pid, rss in self.rss_samples:
+            events.append(
+                {
+                    "name": "rss",
+                    "ph": "C",
+                    "ts": (sample_time - self._origin) * 1e6,
+                    "pid": pid,
+                    "args": {"rss": rss},
+                }
+            )
+        for pid in sorted({span["worker"] for span in self.spans}):
+            name = "taxbrain" if pid == self.pid else f"worker {pid}"
+            events.append(
+                {
+                    "name": "process_name",
+                    "ph": "M",
+                    "pid": pid,
+                    "args": {"name": name},
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_trace(self, path):
+        """
+        Write the trace returned by `trace` to a JSON file
+
+        Parameters
+        ----------
+        path: str or Path
+            file to write
+
+        Returns
+        -------
+        None
+        """
+        with open(path, "w") as f:
+            json.dump(self.trace(), f)
+
+    def _enter(self):
+        """
+        Start tracking the memory peaks of a stage
+        """
+        with self._lock:
+            # the allocation peak is reset for the new stage, so the stages
+            # already running take the peak reached so far first
+            self._update_peaks()
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            frame = {
+                "start": current,
+                "alloc_peak": current,
+                "rss_peak": current_rss() or 0,
+            }
+            self._frames.append(frame)
+        return frame
+
+    def _exit(self, frame):
+        """
+        Stop tracking the memory peaks of a stage and return them
+        """
+        with self._lock:
+            self._update_peaks()
+            self._frames.remove(frame)
+        return {
+            "alloc_peak": frame["alloc_peak"] - frame["start"],
+            "rss_peak": frame["rss_peak"],
+        }
+
+    def _update_peaks(self, rss=None):
+        _, peak = tracemalloc.get_traced_memory()
+        if rss is None:
+            rss = current_rss() or 0
+        for frame in self._frames:
+            frame["alloc_peak"] = max(frame["alloc_peak"], peak)
+            frame["rss_peak"] = max(frame["rss_peak"], rss)
+
+    def _sample(self):
+        """
+        Sample the resident set size until the timer is stopped
+        """
+        while not self._stop.is_set():
+            rss = current_rss()
+            if rss is not None:
+                with self._lock:
+                    self.rss_samples.append((time.time(), os.getpid(), rss))
+                    for frame in self._frames:
+                        frame["rss_peak"] = max(frame["rss_peak"], rss)
+            self._stop.wait(self.interval)
+
+
+@contextmanager
+def timing(memory: bool = False, interval: float = RSS_INTERVAL):
+    """
+    Record the stages run in this context
+
+    Parameters
+    ----------
+    memory: bool
+        whether to record the peak memory of each stage as well. See
+        StageTimer
+    interval: float
+        seconds between samples of the resident set size
+
+    Returns
+    -------
+    StageTimer
+        timer holding the stages once the context exits
+    """
+    timer = StageTimer(memory, interval)
+    timer.start()
+    token = _timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _timer.reset(token)
+        timer.stop()
+
+
+@contextmanager
+def track_memory(enabled: bool = True):
+    """
+    Record the memory used by the stages run in this context. The active
+    timer is used if it already records memory. Otherwise a new timer is
+    used and its stages are added to the active timer, if there is one,
+    when the context exits.
+
+    Parameters
+    ----------
+    enabled: bool
+        if False, nothing is recorded
+
+    Returns
+    -------
+    list
+        stages recorded in the context, filled in once it exits
+    """
+    spans = []
+    outer = _timer.get()
+    if not enabled:
+        yield spans
+    elif outer is not None and outer.memory:
+        first = len(outer.spans)
+        try:
+            yield spans
+        finally:
+            spans.extend(outer.spans[first:])
+    else:
+        with timing(memory=True) as timer:
+            try:
+                yield spans
+            finally:
+                spans.extend(timer.spans)
+        if outer is not None:
+            outer.extend(timer.spans, timer.rss_samples)
+
+
+def current_timer():
+    """
+    Timer recording stages in the current context, or None
+    """
+    return _timer.get()
+
+
+@contextmanager
+def stage(name: str, **fields):
+    """
+    Time a stage if a timer is active. Otherwise this does nothing.
+
+    Parameters
+    ----------
+    name: str
+        name of the stage
+    fields: keyword arguments
+        fields identifying this run of the stage, such as "year"
+
+    Returns
+    -------
+    None
+    """
+    timer = _timer.get()
+    if timer is None:
+        yield
+        return
+    frame = timer._enter() if timer.memory else None
+    start = time.time()
+    wall = time.perf_counter()
+    # CPU time of the thread running the stage so that concurrent stages in
+    # other threads aren't counted
+    cpu = time.thread_time()
+    try:
+        yield
+    finally:
+        span = {
+            "stage": name,
+            **fields,
+            "start": start,
+            "wall": time.perf_counter() - wall,
+            "cpu": time.thread_time() - cpu,
+            "worker": os.getpid(),
+            "thread": threading.get_native_id(),
+        }
+        if frame is not None:
+            span.update(timer._exit(frame))
+        timer.record(span)
+
+
+def timed(name: str):
+    """
+    Decorator that runs a function as a stage
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def worker_options():
+    """
+    Options for recording stages in worker processes the same way as the
+    active timer, or None if there is no active timer. Pass them to
+    `worker_call`
+    """
+    timer = _timer.get()
+    if timer is None:
+        return None
+    return {"memory": timer.memory, "interval": timer.interval}
+
+
+def worker_call(options: dict, func, *args, **kwargs):
+    """
+    Call a function in a worker process, recording its stages if `options`
+    from `worker_options` are given. Pass the value returned to
+    `worker_result` in the parent process.
+    """
+    if options is None:
+        return func(*args, **kwargs), None
+    with timing(**options) as timer:
+        value = func(*args, **kwargs)
+    return value, (timer.spans, timer.rss_samples)
+
+
+def worker_result(result):
+    """
+    Add the stages recorded by `worker_call` to the current timer and
+    return the value of the function that was called
+    """
+    value, recorded = result
+    timer = _timer.get()
+    if timer is not None and recorded is not None:
+        timer.extend(*recorded)
+    return value
+
+
+def summarize(spans: list, by: list = ["stage"]) -> pd.DataFrame:
+    """
+    Total time and peak memory of a list of stages. See StageTimer.summary
+    """
+    columns = ["calls", "wall", "cpu", "mean_wall"]
+    if not spans:
+        return pd.DataFrame(columns=columns)
+    spans = pd.DataFrame(spans)
+    for field in by:
+        if field not in spans:
+            spans[field] = None
+    aggregations = {
+        "calls": ("wall", "size"),
+        "wall": ("wall", "sum"),
+        "cpu": ("cpu", "sum"),
+    }
+    for key in _MEMORY_KEYS:
+        if key in spans:
+            aggregations[key] = (key, "max")
+            columns.append(key)
+    table = spans.groupby(by, dropna=False, sort=False).agg(**aggregations)
+    table["mean_wall"] = table["wall"] / table["calls"]
+    return table.sort_values("wall", ascending=False)[columns]
+
+
+def memory_usage(spans: list) -> list:
+    """
+    Memory used by each stage in a list of stages, in a form that can be
+    saved as JSON
+
+    Parameters
+    ----------
+    spans: list
+        stages recorded with memory
+
+    Returns
+    -------
+    list
+        dictionary for each stage with its name and fields, the "worker"
+        process ID, the "wall" seconds, the "alloc_peak" in bytes
+        allocated above the amount at the start of the stage, and the
+        "rss_peak", the largest resident set size in bytes
+    """
+    usage = []
+    for span in spans:
+        if "alloc_peak" not in span:
+            continue
+        entry = {
+            key: _json_value(value)
+            for key, value in span.items()
+            if key not in ("start", "cpu", "thread")
+        }
+        usage.append(entry)
+    return usage
+
+
+def current_rss():
+    """
+    Resident set size of this process in bytes. Where it can't be read
+    from /proc, the peak resident set size is used. Returns None if
+    neither is available.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # reported in bytes on macOS and kilobytes elsewhere
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def _json_value(value):
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if hasattr(value, "item"):
+        # numpy scalars
+        return value.item()
+    return str(value)
@@ -2,16 +2,15 @@
 Helper functions for the various taxbrain modules
 """
 
+import hashlib
+import json
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib as mpl
-import matplotlib.ticker as ticker
-from collections import defaultdict
 from typing import Union, Tuple
 
 import taxcalc as tc
 from .typing import ParamToolsAdjustment, TaxcalcReform, PlotColors
+from .quantiles import sort_order, lorenz_points, LORENZ_BINS
 
 
 def weighted_sum(df, var, wt="s006"):
@@ -35,6 +34,146 @@ def weighted_sum(df, var, wt="s006"):
     return (df[var] * df[wt]).sum()
 
 
+# income groups used for the winners and losers table. Each group holds
+# tax units with baseline income above the previous edge and at or below
+# the edge listed for it. The last group is open ended
+WINNERS_LOSERS_GROUPS = [
+    (10000, "Less than $10K"),
+    (20000, "$10K-20K"),
+    (30000, "$20K-30K"),
+    (40000, "$30K-40K"),
+    (50000, "$40K-50K"),
+    (75000, "$50K-75K"),
+    (100000, "$75K-100K"),
+    (200000, "$100K-200K"),
+    (500000, "$200K-500K"),
+    (1e6, "$500K-1M"),
+    (np.inf, "$1M or More"),
+]
+WINNERS_LOSERS_LABELS = [
+    "Increase of > 5%",
+    "Increase 1-5%",
+    "Change < 1%",
+    "Decrease of 1-5%",
+    "Decrease > 5%",
+]
+
+
+def hash_inputs(obj) -> str:
+    """
+    Create a stable hash of a set of inputs, such as a reform or the full
+    set of parameters used in an analysis. Dictionaries are hashed without
+    regard to the order of their keys and DataFrames and Series are hashed
+    by their contents, index, column names or name, and dtypes.
+
+    Parameters
+    ----------
+    obj: dict, list, or scalar
+        inputs to hash
+
+    Returns
+    -------
+    str
+        hexadecimal SHA-256 hash of the inputs
+    """
+
+    def hash_rows(value):
+        row_hashes = pd.util.hash_pandas_object(value, index=True)
+        return hashlib.sha256(row_hashes.to_numpy().tobytes()).hexdigest()
+
+    def normalize(value):
+        if isinstance(value, dict):
+            return {str(key): normalize(val) for key, val in value.items()}
+        elif isinstance(value, (list, tuple)):
+            return [normalize(val) for val in value]
+        elif isinstance(value, np.ndarray):
+            return value.tolist()
+        elif isinstance(value, np.generic):
+            return value.item()
+        elif isinstance(value, pd.DataFrame):
+            return {
+                "columns": [str(col) for col in value.columns],
+                "dtypes": [str(dtype) for dtype in value.dtypes],
+                "rows": hash_rows(value),
+            }
+        elif isinstance(value, pd.Series):
+            return {
+                "name": str(value.name),
+                "dtype": str(value.dtype),
+                "rows": hash_rows(value),
+            }
+        return value
+
+    text = json.dumps(normalize(obj), sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def winners_losers_data(tb, years: list = None, var: str = "aftertax_income"):
+    """
+    Find the share of tax units in each income group whose income
+    increases or decreases by a given percentage. Every record is assigned
+    to an (income group, percentage change) cell in a single pass and the
+    weights in each cell are summed with one bincount per year.
+
+    Parameters
+    ----------
+    tb: TaxBrain object
+        TaxBrain object for analysis
+    years: list
+        years to include. Defaults to every year in the analysis
+    var: str
+        income variable used to group tax units and measure the change
+
+    Returns
+    -------
+    table: Pandas DataFrame
+        table indexed by year and income group, listed from the highest
+        income group to the lowest after an "All" row, with a column for
+        each percentage change bucket
+    """
+    if years is None:
+        years = range(tb.start_year, tb.end_year + 1)
+    edges = [edge for edge, _ in WINNERS_LOSERS_GROUPS[:-1]]
+    num_groups = len(WINNERS_LOSERS_GROUPS)
+    num_buckets = len(WINNERS_LOSERS_LABELS)
+    results = []
+    for year in years:
+        base = np.nan_to_num(tb.base_data[year][var].to_numpy(), nan=0.0)
+        reform = np.nan_to_num(tb.reform_data[year][var].to_numpy(), nan=0.0)
+        weight = tb.base_data[year]["s006"].to_numpy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct_change = (reform - base) / base * 100
+        pct_change = np.nan_to_num(
+            pct_change, nan=0.0, posinf=np.inf, neginf=-np.inf
+        )
+        # count the bucket edges each change passes: 0 for a decrease of
+        # more than 5% through 4 for an increase of more than 5%
+        passed = np.digitize(pct_change, [-5, -1]) + np.digitize(
+            pct_change, [1, 5], right=True
+        )
+        bucket = num_buckets - 1 - passed
+        group = np.digitize(base, edges, right=True)
+        cells = np.bincount(
+            group * num_buckets + bucket,
+            weights=weight,
+            minlength=num_groups * num_buckets,
+        ).reshape(num_groups, num_buckets)
+        # highest income group first with all tax units on top
+        cells = np.vstack([cells.sum(axis=0), cells[::-1]])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            results.append(cells / cells.sum(axis=1, keepdims=True))
+    group_names = ["All"] + [name for _, name in WINNERS_LOSERS_GROUPS[::-1]]
+    index = pd.MultiIndex.from_product([list(years), group_names])
+    table = pd.DataFrame(
+        np.vstack(results), index=index, columns=WINNERS_LOSERS_LABELS
+    )
+    return table
+
+
+# taxes shown in the differences plot
+DIFFERENCES_PLOT_VARS = ["iitax", "payrolltax", "combined"]
+
+
 def distribution_plot(
     tb,
     year: int,
@@ -64,88 +203,49 @@ def distribution_plot(
     fig: Matplotlib.pyplot figure object
         distribution plot
     """
+    plot_data = winners_losers_data(tb, [year]).loc[year]
+    return draw_distribution_plot(
+        plot_data, year, figsize, title, include_text
+    )
 
-    def find_percs(data, group):
-        """
-        Find the percentage of people in the data set that saw
-        their income change by the given percentages
-        """
-        pop = data["s006"].sum()
-        large_pos_chng = data["s006"][data["pct_change"] > 5].sum() / pop
-        small_pos_chng = (
-            data["s006"][
-                (data["pct_change"] <= 5) & (data["pct_change"] > 1)
-            ].sum()
-            / pop
-        )
-        small_chng = (
-            data["s006"][
-                (data["pct_change"] <= 1) & (data["pct_change"] >= -1)
-            ].sum()
-            / pop
-        )
-        small_neg_change = (
-            data["s006"][
-                (data["pct_change"] < -1) & (data["pct_change"] > -5)
-            ].sum()
-            / pop
-        )
-        large_neg_change = data["s006"][data["pct_change"] < -5].sum() / pop
-
-        return (
-            large_pos_chng,
-            small_pos_chng,
-            small_chng,
-            small_neg_change,
-            large_neg_change,
-        )
 
-    # extract needed data from the TaxBrain object
-    ati_data = pd.DataFrame(
-        {
-            "base": tb.base_data[year]["aftertax_income"],
-            "reform": tb.reform_data[year]["aftertax_income"],
-            "s006": tb.base_data[year]["s006"],
-        }
-    )
-    ati_data["diff"] = ati_data["reform"] - ati_data["base"]
-    ati_data["pct_change"] = (ati_data["diff"] / ati_data["base"]) * 100
-    ati_data = ati_data.fillna(0.0)  # fill in NaNs for graphing
-    # group tupules: (low income, high income, income group name)
-    groups = [
-        (-9e99, 9e99, "All"),
-        (1e6, 9e99, "$1M or More"),
-        (500000, 1e6, "$500K-1M"),
-        (200000, 500000, "$200K-500K"),
-        (100000, 200000, "$100K-200K"),
-        (75000, 100000, "$75K-100K"),
-        (50000, 75000, "$50K-75K"),
-        (40000, 50000, "$40K-50K"),
-        (30000, 40000, "$30K-40K"),
-        (20000, 30000, "$20K-30K"),
-        (10000, 20000, "$10K-20K"),
-        (-9e99, 10000, "Less than $10K"),
-    ]
-
-    plot_data = defaultdict(list)
-    # traverse list in reverse to get the axis of the plot in correct order
-    for low, high, grp in groups:
-        # find income changes by group
-        sub_data = ati_data[
-            (ati_data["base"] <= high) & (ati_data["base"] > low)
-        ]
-        results = find_percs(sub_data, grp)
-        plot_data[grp] = results
-
-    legend_labels = [
-        "Increase of > 5%",
-        "Increase 1-5%",
-        "Change < 1%",
-        "Decrease of 1-5%",
-        "Decrease > 5%",
-    ]
-    labels = list(plot_data.keys())
-    data = np.array(list(plot_data.values()))
+def draw_distribution_plot(
+    plot_data: pd.DataFrame,
+    year: int,
+    figsize: Tuple[Union[int, float], Union[int, float]] = (6, 4),
+    title: str = "default",
+    include_text: bool = False,
+):
+    """
+    Draw the distribution plot from the data for a single year created by
+    `winners_losers_data`. Separating the drawing from the data lets the
+    plot be drawn in another process.
+
+    Parameters
+    ----------
+    plot_data: Pandas DataFrame
+        share of tax units in each income group by change in after tax
+        income
+    year: int
+        year the data is for
+    figsize: tuple
+        representing the size of the figure (width, height) in inches
+    title: str
+        title for plot
+    include_text: bool
+        whether to include text for labels
+
+    Returns
+    -------
+    fig: Matplotlib.pyplot figure object
+        distribution plot
+    """
+    import matplotlib.pyplot as plt
+    import matplotlib.ticker as ticker
+
+    legend_labels = list(plot_data.columns)
+    labels = list(plot_data.index)
+    data = plot_data.to_numpy()
     data_cumsum = data.cumsum(axis=1)
     category_colors = plt.get_cmap("GnBu")(
         np.linspace(0.15, 0.85, data.shape[1])
@@ -179,7 +279,7 @@ def distribution_plot(
     ax.set_xlabel("Portion of Bin", fontweight="bold")
     ax.set_ylabel("Expanded Income Bin", fontweight="bold")
     ax.get_xaxis().set_major_formatter(
-        mpl.ticker.FuncFormatter(lambda x, p: format(f"{int(x * 100)}%"))
+        ticker.FuncFormatter(lambda x, p: format(f"{int(x * 100)}%"))
     )
     if title == "default":
         title = f"Percentage Change In After Tax Income - {year}"
@@ -218,6 +318,44 @@ def differences_plot(
     fig: Matplotlib.pyplot figure object
         differences plot
     """
+    # find change in each tax variable
+    agg_base = tb.multi_var_table(DIFFERENCES_PLOT_VARS, "base")
+    agg_reform = tb.multi_var_table(DIFFERENCES_PLOT_VARS, "reform")
+    agg_diff = agg_reform - agg_base
+    return draw_differences_plot(agg_diff, tax_type, figsize, title)
+
+
+def draw_differences_plot(
+    agg_diff: pd.DataFrame,
+    tax_type: str,
+    figsize: Tuple[Union[int, float], Union[int, float]] = (6, 4),
+    title: str = "default",
+):
+    """
+    Draw the differences plot from the change in the aggregate liability
+    of each tax in DIFFERENCES_PLOT_VARS. Separating the drawing from the
+    data lets the plot be drawn in another process.
+
+    Parameters
+    ----------
+    agg_diff: Pandas DataFrame
+        change in aggregate liability with a row for each tax and a
+        column for each year
+    tax_type: str
+        tax for which to show the change in liability
+        options: 'income', 'payroll', 'combined'
+    figsize: tuple
+        representing the size of the figure (width, height) in inches
+    title: str
+        title for plot
+
+    Returns
+    -------
+    fig: Matplotlib.pyplot figure object
+        differences plot
+    """
+    import matplotlib.pyplot as plt
+    import matplotlib.ticker as ticker
 
     def axis_formatter(x, p):
         if x >= 0:
@@ -228,12 +366,7 @@ def differences_plot(
     acceptable_taxes = ["income", "payroll", "combined"]
     msg = f"tax_type must be one of the following: {acceptable_taxes}"
     assert tax_type in acceptable_taxes, msg
-
-    # find change in each tax variable
-    tax_vars = ["iitax", "payrolltax", "combined"]
-    agg_base = tb.multi_var_table(tax_vars, "base")
-    agg_reform = tb.multi_var_table(tax_vars, "reform")
-    agg_diff = agg_reform - agg_base
+    tax_vars = DIFFERENCES_PLOT_VARS
 
     # transpose agg_diff to make plotting easier
     plot_data = agg_diff.transpose()
@@ -253,11 +386,9 @@ def differences_plot(
     ax.set_title(title)
     ax.spines["top"].set_visible(False)
     ax.spines["right"].set_visible(False)
-    ax.get_yaxis().set_major_formatter(
-        mpl.ticker.FuncFormatter(axis_formatter)
-    )
+    ax.get_yaxis().set_major_formatter(ticker.FuncFormatter(axis_formatter))
     ax.xaxis.set_ticks(list(plot_data.index))
-    ax.xaxis.set_major_formatter(mpl.ticker.ScalarFormatter(useOffset=False))
+    ax.xaxis.set_major_formatter(ticker.ScalarFormatter(useOffset=False))
 
     return fig
 
@@ -339,32 +470,16 @@ def lorenz_data(tb, year: int, var: str = "aftertax_income"):
     final_data: Pandas DataFrame
         DataFrame with Lorenz curve for baseline and reform
     """
-    data = pd.DataFrame(
-        {
-            "base": tb.base_data[year][var],
-            "reform": tb.reform_data[year][var],
-            "wt": tb.base_data[year]["s006"],
-        }
-    )
-    data["wt_base"] = data["base"] * data["wt"]
-    data["wt_reform"] = data["reform"] * data["wt"]
-    data.sort_values("base", inplace=True)
-    data["cwt"] = data["wt"].cumsum()
-    data["percentile"] = data["cwt"] / data["wt"].sum()
-    # each bin has 1% of the population
-    _bins = np.arange(0, 1.01, step=0.01)
-    data["bin"] = pd.cut(data["percentile"], bins=_bins)
-    gdf = data.groupby("bin", observed=False)
-    base = gdf["wt_base"].sum()
-    base = np.where(base < 0, 0, base)
-    reform = gdf["wt_reform"].sum()
-    reform = np.where(reform < 0, 0, reform)
+    order = sort_order(tb, year, var, "base")
+    weights = tb.base_data[year]["s006"].to_numpy()[order]
+    base = tb.base_data[year][var].to_numpy()[order]
+    reform = tb.reform_data[year][var].to_numpy()[order]
+    # both curves rank tax units by their baseline value
+    population, base_share = lorenz_points(base, weights)
+    _, reform_share = lorenz_points(reform, weights)
     final_data = pd.DataFrame(
-        {
-            "Base": base.cumsum() / data["wt_base"].sum(),
-            "Reform": reform.cumsum() / data["wt_reform"].sum(),
-            "Population": gdf["wt"].sum().cumsum() / data["wt"].sum(),
-        }
+        {"Base": base_share, "Reform": reform_share, "Population": population},
+        index=pd.IntervalIndex.from_breaks(np.linspace(0, 1, LORENZ_BINS + 1)),
     )
 
     return final_data
@@ -415,6 +530,8 @@ def lorenz_curve(
     -------
     None
     """
+    import matplotlib.pyplot as plt
+
     plot_data = lorenz_data(tb, year, var)
     fig, ax = plt.subplots(figsize=figsize)
     ax.plot([0, 1], [0, 1], c="black", alpha=0.5)  # 45 degree line
@@ -500,6 +617,8 @@ def volcano_plot(
     fig: Matplotlib.pyplot figure object
         volcano plot figure
     """
+    import matplotlib.pyplot as plt
+    import matplotlib.ticker as ticker
 
     def log_axis(x, pos):
         """
@@ -554,6 +673,8 @@ def revenue_plot(
     tax_vars: list
         List of tax varaibles to include on the graph
     """
+    import matplotlib.pyplot as plt
+    import matplotlib.ticker as ticker
 
     def axis_formatter(x, p):
         if x >= 0:
@@ -609,7 +730,5 @@ def revenue_plot(
     ax.spines["top"].set_visible(False)
     ax.spines["right"].set_visible(False)
     # convert y axis to billions
-    ax.get_yaxis().set_major_formatter(
-        mpl.ticker.FuncFormatter(axis_formatter)
-    )
+    ax.get_yaxis().set_major_formatter(ticker.FuncFormatter(axis_formatter))
     return fig